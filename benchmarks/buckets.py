@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import random
+import statistics
+from dataclasses import dataclass
+from typing import cast
+
+from benchmarks import fakes, fixtures
+from src import metrics
+from src.location_buckets import (
+    LocationBuckets,
+    distance_km,
+    geohash_cell_size_km,
+)
+from src.models import Coordinates
+from src.subscriptions import SubscriptionStore
+from src.weather_client import AsyncYrWeatherClient, YrWeatherClient
+from src.weather_service import WeatherService
+
+# Compares resolutions of the location buckets (see src/location_buckets.py) for a set of locations:
+# - Hit rate: Share of the forecast lookups served without requesting YR, when every location is checked once (like a daily check of all subscriptions)
+# - Distance from each location to the point its forecast is for (the canonical coordinates of its bucket), i.e. what the hit rate costs in accuracy
+# The lookups go through WeatherService with a fake YR, such that the hit rate is as counted by the bot (weatherbot_forecast_bucket_lookups_total).
+# Run from the project root with the stored subscriptions, or with generated locations clustered in cities:
+#   python -m benchmarks.buckets --subscriptions-db ./data/subscriptions.sqlite
+#   python -m benchmarks.buckets --locations 1000
+
+DEFAULT_GEOHASH_PRECISIONS = (7, 6, 5, 4)
+
+# Cities (lat, lon, share of the generated locations) in Denmark
+CITIES = (
+    (55.6761, 12.5683, 0.5),  # Copenhagen
+    (56.1629, 10.2039, 0.2),  # Aarhus
+    (55.4038, 10.4024, 0.15),  # Odense
+    (57.0488, 9.9217, 0.15),  # Aalborg
+)
+
+
+@dataclass(frozen=True)
+class BucketReport:
+    resolution: str
+    cell_size_km: tuple[float, float] | None  # Height and width. None: Not a cell
+    locations: int
+    buckets: int
+    yr_requests: int
+    hits: int  # Incl. shared
+    shared: int  # Served by the fetch of another location of the bucket
+    distances_km: list[float]
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.locations if self.locations else 0
+
+    def format(self) -> str:
+        cell = (
+            f"{self.cell_size_km[0]:.2f} x {self.cell_size_km[1]:.2f}"
+            if self.cell_size_km
+            else "-"
+        )
+        return (
+            f"{self.resolution:<12} {cell:>13} {self.buckets:>8} {self.yr_requests:>8} {self.hits:>6} {self.shared:>7}"
+            f" {self.hit_rate * 100:>7.1f}% {statistics.fmean(self.distances_km):>9.3f} {max(self.distances_km):>9.3f}"
+        )
+
+
+async def measure(
+    buckets: LocationBuckets, locations: list[Coordinates]
+) -> BucketReport:
+    yr_client = fakes.FakeYrClient(
+        fixtures.build_payload("complete", "patchy"),
+        fixtures.build_payload("compact", "patchy"),
+    )
+    weather_service = WeatherService(
+        cast(YrWeatherClient, None),  # Sync client not used by the bot
+        cast(AsyncYrWeatherClient, yr_client),
+        buckets=buckets,
+    )
+    lookups_before = {
+        result: metrics.FORECAST_BUCKET_LOOKUPS.get(
+            resolution=buckets.resolution, result=result
+        )
+        for result in ("hit", "shared")
+    }
+    time_zone = fakes.load_config().time_zone
+    for coordinates in locations:
+        await weather_service.get_rainy_forecast_tomorrow(coordinates, time_zone)
+
+    def count(result: str) -> int:
+        return int(
+            metrics.FORECAST_BUCKET_LOOKUPS.get(
+                resolution=buckets.resolution, result=result
+            )
+            - lookups_before[result]
+        )
+
+    mean_lat = statistics.fmean(coordinates.lat for coordinates in locations)
+    return BucketReport(
+        buckets.resolution,
+        (
+            geohash_cell_size_km(buckets.geohash_precision, mean_lat)
+            if buckets.geohash_precision
+            else None
+        ),
+        len(locations),
+        len({buckets.key(coordinates) for coordinates in locations}),
+        yr_client.request_count,
+        count("hit") + count("shared"),
+        count("shared"),
+        [
+            distance_km(coordinates, buckets.canonical(coordinates))
+            for coordinates in locations
+        ],
+    )
+
+
+# Locations spread around the centers of cities as picked on a map (6 decimals), and some city centers as typed by users (2-4 decimals)
+def generate_locations(count: int, seed: int = 42) -> list[Coordinates]:
+    rng = random.Random(seed)
+    locations: list[Coordinates] = []
+    for _ in range(count):
+        lat, lon, _ = rng.choices(CITIES, weights=[city[2] for city in CITIES])[0]
+        if rng.random() < 0.2:
+            decimals = rng.choice((2, 3, 4))
+            locations.append(Coordinates(round(lat, decimals), round(lon, decimals)))
+        else:
+            locations.append(
+                Coordinates(
+                    round(rng.gauss(lat, 0.05), 6), round(rng.gauss(lon, 0.08), 6)
+                )
+            )
+    return locations
+
+
+def load_locations(subscriptions_db: str) -> list[Coordinates]:
+    store = SubscriptionStore(subscriptions_db)
+    try:
+        return [subscription.coordinates for subscription in store.get_all()]
+    finally:
+        store.close()
+
+
+async def main():
+    args = _parse_args()
+    locations = (
+        load_locations(args.subscriptions_db)
+        if args.subscriptions_db
+        else generate_locations(args.locations)
+    )
+    if not locations:
+        raise Exception("No locations")
+    print(f"{len(locations)} locations")
+
+    print(
+        f"\n{'resolution':<12} {'cell (km)':>13} {'buckets':>8} {'requests':>8} {'hits':>6} {'shared':>7} {'hit rate':>8} {'mean (km)':>9} {'max (km)':>9}"
+    )
+    for precision in [None, *args.precisions]:
+        report = await measure(LocationBuckets(precision), locations)
+        print(report.format())
+    print("\nmean/max: Distance from the locations to the point their forecast is for")
+
+
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(
+        description="Compare hit rates of location bucket resolutions"
+    )
+    ap.add_argument(
+        "--subscriptions-db",
+        help="Use the locations of the subscriptions in this db. Default: Generated locations",
+    )
+    ap.add_argument(
+        "--locations",
+        type=int,
+        default=1000,
+        help="Number of generated locations. Default: 1000",
+    )
+    ap.add_argument(
+        "--precisions",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_GEOHASH_PRECISIONS),
+        help="Geohash precisions to compare with the default (4 decimals). Default: 7 6 5 4",
+    )
+    return ap.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+import json
+import sys
+from dataclasses import replace
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks import fixtures
+from benchmarks.fixtures import ResponseKind
+from benchmarks.forecast_stream import ForecastStreamDecoder
+from src.dtos.yr_compact_decoder import decode_compact_response
+from src.dtos.yr_compact_response import YrCompactResponse
+from src.dtos.yr_complete_decoder import decode_complete_response
+from src.dtos.yr_complete_response import YrCompleteResponse
+from src.models import TimePeriod
+
+# Checks that the fast decoders produce the same DTOs as the generated from_dict, i.e. that the bot sees the same forecasts as before the fast decoders.
+# Also checks that the experimental streamed decoding of a time period (see forecast_stream.py) produces the same DTO as the full parse, limited to the period.
+# Checked for the recorded example responses in src/dtos and for the benchmark payloads of each scenario (see fixtures.py).
+# Also checked before each benchmark run. Run from the project root:
+#   python -m benchmarks.equivalence
+
+_examples_dir = Path(__file__).parent.parent / "src" / "dtos"
+
+# Small and uneven chunks split time steps (and multi-byte characters) between chunks. The largest is the size read from the network by aiohttp
+STREAM_CHUNK_SIZES = (1000, 16 * 1024)
+
+# Fast decoder and generated from_dict of each endpoint
+DECODERS: dict[ResponseKind, tuple[Callable[[Any], Any], Callable[[Any], Any]]] = {
+    "complete": (decode_complete_response, YrCompleteResponse.from_dict),
+    "compact": (decode_compact_response, YrCompactResponse.from_dict),
+}
+
+
+# Payloads to check, by name
+def load_payloads() -> dict[str, tuple[ResponseKind, bytes]]:
+    payloads: dict[str, tuple[ResponseKind, bytes]] = {}
+    for kind in fixtures.RESPONSE_KINDS:
+        example_path = _examples_dir / f"yr_{kind}_response.example.json"
+        payloads[f"{kind}/example"] = (kind, example_path.read_bytes())
+        for scenario in fixtures.SCENARIOS:
+            payloads[f"{kind}/{scenario}"] = (
+                kind,
+                fixtures.build_payload(kind, scenario),
+            )
+    return payloads
+
+
+# Returns the names of the payloads where the fast decoder differs from from_dict
+def check_decoders(payloads: dict[str, tuple[ResponseKind, bytes]]) -> list[str]:
+    differences: list[str] = []
+    for name, (kind, payload) in payloads.items():
+        data = json.loads(payload)
+        decode, from_dict = DECODERS[kind]
+        if decode(data) != from_dict(data):
+            differences.append(name)
+    return differences
+
+
+# Decodes the time period from the payload fed in chunks, like when downloaded. Returns the DTO and the number of bytes fed
+def decode_streamed(
+    payload: bytes, time_period: TimePeriod, chunk_size: int
+) -> tuple[YrCompleteResponse, int]:
+    decoder = ForecastStreamDecoder(time_period)
+    fed = 0
+    while fed < len(payload):
+        chunk = payload[fed : fed + chunk_size]
+        fed += len(chunk)
+        if decoder.feed(chunk):
+            break
+    return decoder.result(), fed
+
+
+# Full parse, limited to the time period
+def decode_full(payload: bytes, time_period: TimePeriod) -> YrCompleteResponse:
+    response = decode_complete_response(json.loads(payload))
+    time_steps = [
+        time_step
+        for time_step in response.properties.timeseries
+        if time_period.start <= time_step.time <= time_period.end
+    ]
+    return replace(
+        response, properties=replace(response.properties, timeseries=time_steps)
+    )
+
+
+# Periods to decode from the payload: A day from the second time step (the period of the daily check), and everything from the second time step
+def stream_periods(payload: bytes) -> dict[str, TimePeriod]:
+    start = decode_complete_response(json.loads(payload)).properties.timeseries[1].time
+    return {
+        "day": TimePeriod(start, start + timedelta(days=1, microseconds=-1)),
+        "rest": TimePeriod(start, start + timedelta(days=365)),
+    }
+
+
+# Returns the names of the payload, period and chunk size where the streamed decoding differs from the full parse
+def check_stream_decoder(payloads: dict[str, tuple[ResponseKind, bytes]]) -> list[str]:
+    differences: list[str] = []
+    for name, (kind, payload) in payloads.items():
+        if kind != "complete":
+            continue  # Only the complete forecast is streamed
+        for period_name, time_period in stream_periods(payload).items():
+            expected = decode_full(payload, time_period)
+            for chunk_size in STREAM_CHUNK_SIZES:
+                streamed, _ = decode_streamed(payload, time_period, chunk_size)
+                if streamed != expected:
+                    differences.append(f"{name}/{period_name}/{chunk_size}")
+    return differences
+
+
+def main() -> int:
+    payloads = load_payloads()
+    differences = check_decoders(payloads)
+    for name in payloads:
+        print(f"{name:<20} {'DIFFERS' if name in differences else 'ok'}")
+    if differences:
+        print(
+            f"\nFast decoder differs from from_dict for {len(differences)} payload(s)"
+        )
+
+    stream_differences = check_stream_decoder(payloads)
+    print(f"\n{'streamed':<30} {'time steps':>10} {'bytes read':>11}")
+    for name, (kind, payload) in payloads.items():
+        if kind != "complete":
+            continue
+        for period_name, time_period in stream_periods(payload).items():
+            streamed, fed = decode_streamed(
+                payload, time_period, STREAM_CHUNK_SIZES[-1]
+            )
+            print(
+                f"{name + '/' + period_name:<30} {len(streamed.properties.timeseries):>10} {fed / len(payload) * 100:>10.0f}%"
+            )
+    for difference in stream_differences:
+        print(f"{difference:<30} DIFFERS")
+    if stream_differences:
+        print(
+            f"\nStreamed decoding differs from the full parse in {len(stream_differences)} case(s)"
+        )
+
+    return 1 if differences or stream_differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Any
+
+import discord
+
+from src import time_utils
+from src.config import AppConfig
+from src.models import Coordinates
+from src.weather_client import YrResponse
+
+# Stand-ins for YR and Discord, such that the full rain check can be benchmarked without network access
+
+# Config used by the cogs in benchmarks (see load_config)
+BENCHMARK_ENV = {
+    "BOT_TOKEN": "benchmark",
+    "DEV_CHANNEL_ID": "1",
+    "TARGET_CHANNEL_ID": "2",
+    "TARGET_GUILD_ID": "3",
+    "LAT": "55.6761",
+    "LON": "12.5683",
+    "TIME_ZONE": "Europe/Copenhagen",
+    "NOTIFY_TIME_OF_DAY": "21:00",
+}
+
+
+# Replaces AsyncYrWeatherClient. Serves a fixed payload per endpoint, which is decoded per request like a real response
+class FakeYrClient:
+    def __init__(self, complete_payload: bytes, compact_payload: bytes) -> None:
+        self.complete_payload = complete_payload
+        self.compact_payload = compact_payload
+        self.request_count = 0
+
+    async def get_complete_forecast(
+        self, lat: float, lon: float, timeout_seconds: float | None = None
+    ) -> YrResponse:
+        return self._create_response(self.complete_payload)
+
+    async def get_compact_forecast(
+        self, lat: float, lon: float, timeout_seconds: float | None = None
+    ) -> YrResponse:
+        return self._create_response(self.compact_payload)
+
+    def _create_response(self, payload: bytes) -> YrResponse:
+        self.request_count += 1
+        return YrResponse(
+            data=json.loads(payload),
+            expires=time_utils.utc_now() + timedelta(minutes=30),
+            last_modified=None,
+            from_cache=False,
+        )
+
+    async def close(self):
+        pass
+
+
+# Replaces ReverseGeocoder. The city is always known, as if already looked up
+class FakeGeocoder:
+    async def get_city_async(
+        self, coordinates: Coordinates, wait_seconds: float = 0
+    ) -> str | None:
+        return "Copenhagen"
+
+
+_ids = itertools.count(1)  # Unique ids of messages and interactions
+
+
+@dataclass
+class FakeMessage:
+    content: str | None
+    embed: discord.Embed | None
+    channel: Any = None
+    id: int = field(default_factory=lambda: next(_ids))
+    sent_at: float = field(default_factory=time.perf_counter)
+
+
+# Records messages instead of sending them. Optionally waits before returning, like a request to Discord.
+# Messageable, such that it is accepted as a channel (or user) by the cogs
+@dataclass
+class FakeChannel(discord.abc.Messageable):
+    messages: list[FakeMessage] = field(default_factory=list[FakeMessage])
+    delay_seconds: float = 0
+    id: int = 0
+
+    async def send(  # type: ignore # Only the arguments used by the bot
+        self, content: str | None = None, *, embed: discord.Embed | None = None
+    ) -> FakeMessage:
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        message = FakeMessage(content, embed, channel=self)
+        self.messages.append(message)
+        return message
+
+    async def _get_channel(self) -> Any:
+        return self
+
+
+@dataclass
+class FakeInteractionResponse:
+    messages: list[FakeMessage] = field(default_factory=list[FakeMessage])
+    deferred: bool = False
+
+    async def send_message(
+        self, content: str | None = None, *, embed: discord.Embed | None = None
+    ):
+        self.messages.append(FakeMessage(content, embed))
+
+    async def defer(self, *, thinking: bool = False):
+        self.deferred = True
+
+
+@dataclass
+class FakeInteraction:
+    id: int = field(default_factory=lambda: next(_ids))
+    channel_id: int | None = None
+    response: FakeInteractionResponse = field(default_factory=FakeInteractionResponse)
+    followup: FakeChannel = field(default_factory=FakeChannel)
+
+
+# The bot as seen by the cogs: config, service container and channels.
+# Channels and users are created on first use
+class FakeBot:
+    def __init__(
+        self, config: Any, container: SimpleNamespace, send_delay_seconds: float = 0
+    ) -> None:
+        self.config = config
+        self.container = container
+        self.send_delay_seconds = send_delay_seconds
+        self.channels: dict[int, FakeChannel] = {}
+        self.target_channel = self.get_channel(config.target_channel_id)
+
+    async def wait_until_guild_ready(self, guild_id: int | None):
+        pass
+
+    # All shards are run by the benchmarks
+    def owns_guild(self, guild_id: int | None) -> bool:
+        return True
+
+    def get_channel(self, id: int) -> FakeChannel:
+        if id not in self.channels:
+            self.channels[id] = FakeChannel(
+                delay_seconds=self.send_delay_seconds, id=id
+            )
+        return self.channels[id]
+
+    async def fetch_channel(self, id: int) -> FakeChannel:
+        return self.get_channel(id)
+
+    # Users are channels (direct messages) too
+    def get_user(self, id: int) -> FakeChannel:
+        return self.get_channel(id)
+
+    async def fetch_user(self, id: int) -> FakeChannel:
+        return self.get_channel(id)
+
+    # All messages sent, except to the interactions
+    def get_messages(self) -> list[FakeMessage]:
+        return [
+            message
+            for channel in self.channels.values()
+            for message in channel.messages
+        ]
+
+    def clear_messages(self):
+        for channel in self.channels.values():
+            channel.messages.clear()
+
+
+# The app config with BENCHMARK_ENV, i.e. without the .env file
+def load_config() -> AppConfig:
+    os.environ.update(BENCHMARK_ENV)
+    return AppConfig()  # type: ignore
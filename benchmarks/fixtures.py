@@ -0,0 +1,190 @@
+import copy
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Literal
+
+from src import time_utils
+
+# YR payloads for benchmarks.
+# The payloads are built from the recorded example responses in src/dtos, but with as many time steps as a real response:
+# hourly time steps for the first 60 hours, then 6-hourly time steps up to 9 days ahead.
+# Precipitation is set according to the scenario, and times start at the current hour such that 'tomorrow' is always covered
+
+ResponseKind = Literal["complete", "compact"]
+Scenario = Literal["dry", "all_rain", "patchy"]
+
+RESPONSE_KINDS: tuple[ResponseKind, ...] = ("complete", "compact")
+SCENARIOS: tuple[Scenario, ...] = ("dry", "all_rain", "patchy")
+
+HOURLY_STEPS = 60
+FORECAST_LENGTH = timedelta(days=9)
+NOWCAST_STEPS = 25  # 5 minute time steps for the next 2 hours
+NOWCAST_STEP = timedelta(minutes=5)
+
+_examples_dir = Path(__file__).parent.parent / "src" / "dtos"
+
+
+# Returns the payload as received from YR, i.e. encoded json
+def build_payload(
+    kind: ResponseKind, scenario: Scenario, start: datetime | None = None
+) -> bytes:
+    return json.dumps(build_payload_dict(kind, scenario, start)).encode()
+
+
+def build_payload_dict(
+    kind: ResponseKind, scenario: Scenario, start: datetime | None = None
+) -> dict[str, Any]:
+    start = start or time_utils.utc_now().replace(minute=0, second=0, microsecond=0)
+    example = _load_example(kind)
+    timeseries = example["properties"]["timeseries"]
+    # The first time step of the example has forecasts for the next 1, 6 and 12 hours, the third only for the next 6 and 12 hours and the last has no forecasts
+    hourly_template, six_hourly_template, last_template = (
+        timeseries[0],
+        timeseries[2],
+        timeseries[-1],
+    )
+
+    time_steps: list[dict[str, Any]] = []
+    for hour in range(HOURLY_STEPS):
+        time_steps.append(
+            _hourly_time_step(kind, hourly_template, start, hour, scenario)
+        )
+    hour = HOURLY_STEPS
+    while timedelta(hours=hour) < FORECAST_LENGTH:
+        time_steps.append(
+            _six_hourly_time_step(six_hourly_template, start, hour, scenario)
+        )
+        hour += 6
+    last = copy.deepcopy(last_template)
+    last["time"] = _format_time(start + timedelta(hours=hour))
+    time_steps.append(last)
+
+    example["properties"]["meta"]["updated_at"] = _format_time(
+        start - timedelta(minutes=30)
+    )
+    example["properties"]["timeseries"] = time_steps
+    return example
+
+
+# Nowcast payload (see src/dtos/yr_nowcast_response.example.json) with time steps from the 5 minutes of 'updated_at'.
+# 'dry' has no rain, 'all_rain' is raining already and 'patchy' starts raining at 'onset_step' (e.g. 6: in 30 minutes)
+def build_nowcast_payload_dict(
+    scenario: Scenario, updated_at: datetime, onset_step: int = 6
+) -> dict[str, Any]:
+    with open(_examples_dir / "yr_nowcast_response.example.json") as file:
+        example = json.load(file)
+    template = example["properties"]["timeseries"][0]
+    start = updated_at.replace(
+        minute=updated_at.minute - updated_at.minute % 5, second=0, microsecond=0
+    )
+    time_steps: list[dict[str, Any]] = []
+    for step in range(NOWCAST_STEPS):
+        time_step = copy.deepcopy(template)
+        time_step["time"] = _format_time(start + step * NOWCAST_STEP)
+        time_step["data"]["instant"]["details"]["precipitation_rate"] = (
+            _precipitation_rate(scenario, step, onset_step)
+        )
+        time_steps.append(time_step)
+    example["properties"]["meta"]["updated_at"] = _format_time(updated_at)
+    example["properties"]["timeseries"] = time_steps
+    return example
+
+
+def _hourly_time_step(
+    kind: ResponseKind,
+    template: dict[str, Any],
+    start: datetime,
+    hour: int,
+    scenario: Scenario,
+) -> dict[str, Any]:
+    time_step = copy.deepcopy(template)
+    time_step["time"] = _format_time(start + timedelta(hours=hour))
+    data = time_step["data"]
+
+    amount = _precipitation_amount(scenario, hour)
+    next_1_hours = data["next_1_hours"]
+    next_1_hours["summary"]["symbol_code"] = _symbol_code(amount)
+    next_1_hours["details"]["precipitation_amount"] = amount
+    if kind == "complete":
+        # The complete response also includes the uncertainty of the forecast
+        next_1_hours["details"]["precipitation_amount_min"] = round(amount / 2, 1)
+        next_1_hours["details"]["precipitation_amount_max"] = round(amount * 2, 1)
+        next_1_hours["details"]["probability_of_precipitation"] = (
+            min(90.0, 30.0 + amount * 20) if amount else 2.0
+        )
+
+    six_hours_amount = _period_amount(scenario, hour, 6)
+    data["next_6_hours"]["summary"]["symbol_code"] = _symbol_code(six_hours_amount)
+    data["next_6_hours"]["details"]["precipitation_amount"] = six_hours_amount
+    data["next_12_hours"]["summary"]["symbol_code"] = _symbol_code(
+        _period_amount(scenario, hour, 12)
+    )
+    return time_step
+
+
+def _six_hourly_time_step(
+    template: dict[str, Any], start: datetime, hour: int, scenario: Scenario
+) -> dict[str, Any]:
+    time_step = copy.deepcopy(template)
+    time_step["time"] = _format_time(start + timedelta(hours=hour))
+    data = time_step["data"]
+
+    six_hours_amount = _period_amount(scenario, hour, 6)
+    data["next_6_hours"]["summary"]["symbol_code"] = _symbol_code(six_hours_amount)
+    data["next_6_hours"]["details"]["precipitation_amount"] = six_hours_amount
+    if "next_12_hours" in data:
+        data["next_12_hours"]["summary"]["symbol_code"] = _symbol_code(
+            _period_amount(scenario, hour, 12)
+        )
+    return time_step
+
+
+# Precipitation (mm) in the hour starting the given number of hours after the start of the forecast
+def _precipitation_amount(scenario: Scenario, hour: int) -> float:
+    match scenario:
+        case "dry":
+            return 0.0
+        case "all_rain":
+            return round(0.3 + (hour % 5) * 0.4, 1)
+        case "patchy":
+            # Showers of 2-3 hours with dry spells in between
+            return round(0.1 + (hour % 3) * 0.6, 1) if hour % 7 in (2, 3, 5) else 0.0
+
+
+# Precipitation rate (mm/h) of a nowcast time step
+def _precipitation_rate(scenario: Scenario, step: int, onset_step: int) -> float:
+    match scenario:
+        case "dry":
+            return 0.0
+        case "all_rain":
+            return round(1.0 + (step % 4) * 0.5, 1)
+        case "patchy":
+            return (
+                round(0.6 + (step - onset_step) * 0.3, 1) if step >= onset_step else 0.0
+            )
+
+
+def _period_amount(scenario: Scenario, hour: int, hours: int) -> float:
+    return round(
+        sum(_precipitation_amount(scenario, hour + i) for i in range(hours)), 1
+    )
+
+
+def _symbol_code(amount: float) -> str:
+    if amount == 0:
+        return "partlycloudy_day"
+    if amount < 0.5:
+        return "lightrain"
+    if amount < 2:
+        return "rain"
+    return "heavyrain"
+
+
+def _format_time(dt: datetime) -> str:
+    return time_utils.as_utc(dt).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _load_example(kind: ResponseKind) -> dict[str, Any]:
+    with open(_examples_dir / f"yr_{kind}_response.example.json") as file:
+        return json.load(file)
@@ -0,0 +1,108 @@
+import codecs
+import json
+import logging
+from typing import Any
+
+from src.dtos.yr_complete_decoder import (
+    decode_complete_response,
+    decode_time_step,
+    parse_timestamp,
+)
+from src.dtos.yr_complete_response import ForecastTimeStep, YrCompleteResponse
+from src.models import TimePeriod
+
+logger = logging.getLogger(__name__)
+
+TIMESERIES_KEY = '"timeseries"'
+WHITESPACE = " \t\n\r"
+
+
+# Experiment: Decodes the YR "complete" response while it is being downloaded, keeping only the time steps within a time period.
+# - Everything before the timeseries (type, geometry and meta) is kept
+# - Time steps are only decoded into DTOs if within the time period
+# - As the timeseries is sorted by time, decoding is done once a time step after the end of the period is reached
+# Not used by the bot: Responses are cached in full and the parsed snapshot is shared by all queries of the location (see WeatherService.get_snapshot),
+# which a parse of one time period that stops reading early cannot serve. Measured and compared with the full parse by benchmarks/run.py and benchmarks/equivalence.py.
+# Relies on the order of the keys of the response (not guaranteed by YR, but as returned so far):
+# "timeseries" is the last key of "properties", which is the last key of the response. Otherwise the keys after "timeseries" are lost
+class ForecastStreamDecoder:
+    def __init__(self, time_period: TimePeriod) -> None:
+        self._time_period = time_period
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._header: dict[str, Any] | None = None
+        self._time_steps: list[ForecastTimeStep] = []
+        self.is_done = False
+
+    # Feeds the next chunk of the response. Returns true when no more data is needed
+    def feed(self, chunk: bytes) -> bool:
+        if self.is_done:
+            return True
+        self._buffer += self._text_decoder.decode(chunk)
+        if self._header is None and not self._decode_header():
+            return False
+        self._decode_time_steps()
+        return self.is_done
+
+    def result(self) -> YrCompleteResponse:
+        if self._header is None:
+            raise Exception("Response ended before the forecast timeseries")
+        if not self.is_done:
+            raise Exception("Response ended before the end of the forecast timeseries")
+        response = decode_complete_response(self._header)
+        response.properties.timeseries = self._time_steps
+        return response
+
+    # Decodes everything before the first time step, i.e. when the start of the timeseries array is reached
+    def _decode_header(self) -> bool:
+        key_index = self._buffer.find(TIMESERIES_KEY)
+        if key_index == -1:
+            return False
+        array_start = self._buffer.find("[", key_index + len(TIMESERIES_KEY))
+        if array_start == -1:
+            return False
+        # The timeseries is last (see above), so close the (empty) timeseries array and the enclosing objects to get valid json
+        try:
+            header = json.loads(self._buffer[: array_start + 1] + "]}}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Timeseries is not the last key of the response: {e}")
+        if "meta" not in header.get("properties", {}):
+            raise Exception("Timeseries is not the last key of the response")
+        self._header = header
+        self._buffer = self._buffer[array_start + 1 :]
+        return True
+
+    def _decode_time_steps(self):
+        position = 0
+        buffer = self._buffer
+        while True:
+            position = _skip_separators(buffer, position)
+            if position == len(buffer):
+                break  # Need more data
+            if buffer[position] == "]":
+                self.is_done = True  # End of timeseries
+                break
+            try:
+                obj, end = self._json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # Time step not fully received yet
+            position = end
+
+            time = parse_timestamp(obj["time"])
+            if time < self._time_period.start:
+                continue
+            if time > self._time_period.end:
+                self.is_done = True
+                break
+            self._time_steps.append(decode_time_step(obj))
+
+        self._buffer = buffer[position:]
+
+
+def _skip_separators(buffer: str, position: int) -> int:
+    while position < len(buffer) and (
+        buffer[position] in WHITESPACE or buffer[position] == ","
+    ):
+        position += 1
+    return position
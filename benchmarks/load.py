@@ -0,0 +1,522 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import time as time_of_day
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, cast
+from zoneinfo import ZoneInfo
+
+import aiohttp
+
+from benchmarks import fakes
+from benchmarks.yr_stand_in import (
+    NOWCAST_PATH,
+    YrStandIn,
+    add_stand_in_args,
+    create_stand_in,
+)
+from src import metrics
+from src.alert_updates import AlertUpdater
+from src.bot import WeatherBot
+from src.cogs.rainy_forecast import RainyForecast
+from src.cogs.subscriptions import SUBSCRIPTION_JOB_KIND, Subscriptions
+from src.forecast_worker import ForecastWorkerClient, RemoteWeatherService
+from src.geocoding import ReverseGeocoder
+from src.location_buckets import LocationBuckets
+from src.models import Coordinates
+from src.nowcast import NowcastService
+from src.nowcast_alerts import NowcastAlerter
+from src.outbound import OutboundQueue
+from src.prefetcher import ForecastPrefetcher
+from src.rain_alerts import RainAlertService
+from src.scheduler import DailyJob, DailyScheduler
+from src.sent_alerts import SentAlertStore
+from src.subscriptions import SubscriptionStore
+from src.weather_client import AsyncYrWeatherClient, YrWeatherClient
+from src.weather_service import WeatherService
+
+# Load test of the bot against the YR stand-in (or any YR compatible server).
+# Runs the cogs of the bot with real services, but with Discord replaced by fake channels and interactions:
+# - Many concurrent /rain_check interactions
+# - The daily rain check
+# - A daily check of many subscriptions across many locations, first with a cold cache and then with a warm cache
+# Reports throughput and latency percentiles of each phase, and the event loop lag of the bot.
+# Run from the project root: python -m benchmarks.load --subscriptions 1000 --locations 200 --latency-ms 100
+# Add --forecast-workers 2 to fetch and parse the forecasts in worker processes (see src/forecast_worker.py)
+# Add --nowcast-rounds 2 to also poll the nowcast of every location (see src/nowcast_alerts.py). The first round alerts of rain, later rounds (within the nowcast update interval) are revalidated only
+
+logger = logging.getLogger(__name__)
+
+TIME_ZONE = ZoneInfo(fakes.BENCHMARK_ENV["TIME_ZONE"])
+
+
+@dataclass(frozen=True)
+class PhaseResult:
+    name: str
+    operations: int
+    errors: int
+    duration_seconds: float
+    latencies_seconds: list[float]
+
+    @property
+    def throughput(self) -> float:
+        return self.operations / self.duration_seconds if self.duration_seconds else 0
+
+    def percentile_ms(self, percentile: float) -> float:
+        if not self.latencies_seconds:
+            return 0
+        if len(self.latencies_seconds) == 1:
+            return self.latencies_seconds[0] * 1000
+        return (
+            statistics.quantiles(self.latencies_seconds, n=1000, method="inclusive")[
+                int(percentile * 10) - 1
+            ]
+            * 1000
+        )
+
+    def format(self) -> str:
+        return (
+            f"{self.name:<24} {self.operations:>7} {self.errors:>7} {self.duration_seconds:>9.2f} {self.throughput:>10.1f}"
+            f" {self.percentile_ms(50):>9.1f} {self.percentile_ms(90):>9.1f} {self.percentile_ms(99):>9.1f} {max(self.latencies_seconds, default=0) * 1000:>9.1f}"
+        )
+
+
+# The bot with real services, but fake Discord and geocoding
+class LoadTestBot:
+    def __init__(
+        self,
+        yr_base_url: str,
+        data_dir: Path,
+        send_delay_seconds: float,
+        forecast_worker_sockets: list[str] | None = None,  # None: In process
+        nowcast: bool = False,  # Alert of rain within the hour
+        buckets: LocationBuckets | None = None,
+    ):
+        self.async_weather_client: AsyncYrWeatherClient | None = None
+        self.forecast_worker: ForecastWorkerClient | None = None
+        weather_service: WeatherService | RemoteWeatherService
+        if forecast_worker_sockets:
+            self.forecast_worker = ForecastWorkerClient(
+                forecast_worker_sockets, buckets
+            )
+            weather_service = RemoteWeatherService(self.forecast_worker)
+        else:
+            self.async_weather_client = AsyncYrWeatherClient(
+                yr_base_url, nowcast_base_url=_get_nowcast_base_url(yr_base_url)
+            )
+            weather_service = WeatherService(
+                cast(YrWeatherClient, None),  # Sync client not used by the bot
+                self.async_weather_client,
+                buckets=buckets,
+            )
+        scheduler = DailyScheduler()  # Not started. Jobs are run by the load test
+        geocoder = cast(ReverseGeocoder, fakes.FakeGeocoder())
+        self.nowcast_alerter: NowcastAlerter | None = None
+        if nowcast:
+            # Like the bot, polls the nowcast in process with the forecast workers too
+            self.async_weather_client = self.async_weather_client or (
+                AsyncYrWeatherClient(
+                    yr_base_url, nowcast_base_url=_get_nowcast_base_url(yr_base_url)
+                )
+            )
+            # Not started. Polled by the load test
+            self.nowcast_alerter = NowcastAlerter(
+                NowcastService(self.async_weather_client),
+                geocoder,
+                interval=timedelta(minutes=5),
+            )
+        self.container = SimpleNamespace(
+            weather_service=weather_service,
+            rain_alert_service=RainAlertService(weather_service, geocoder),
+            alert_updater=AlertUpdater(
+                weather_service,
+                geocoder,
+                SentAlertStore(str(data_dir / "sent_alerts.sqlite")),
+            ),
+            outbound=OutboundQueue(),
+            subscription_store=SubscriptionStore(
+                str(data_dir / "subscriptions.sqlite")
+            ),
+            scheduler=scheduler,
+            prefetcher=ForecastPrefetcher(
+                weather_service, scheduler, lead_time=timedelta(minutes=10)
+            ),
+            nowcast_alerter=self.nowcast_alerter,
+        )
+        self.bot = fakes.FakeBot(
+            fakes.load_config(), self.container, send_delay_seconds
+        )
+        # Any, as the fakes are passed in place of Discord types
+        self.rainy_forecast_cog: Any = None
+        self.subscriptions_cog: Any = None
+
+    # Creates the subscriptions before loading the cogs, like subscriptions stored from a previous run
+    def load_cogs(self):
+        self.rainy_forecast_cog = RainyForecast(cast(WeatherBot, self.bot))
+        self.subscriptions_cog = Subscriptions(cast(WeatherBot, self.bot))
+
+    async def close(self):
+        if self.async_weather_client:
+            await self.async_weather_client.close()
+        if self.forecast_worker:
+            await self.forecast_worker.close()
+        self.container.subscription_store.close()
+        self.container.alert_updater.close()
+
+
+async def main() -> None:
+    args = _parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    stand_in: YrStandIn | None = None
+    yr_base_url = args.yr_base_url
+    if yr_base_url is None:
+        stand_in = create_stand_in(args)
+        yr_base_url = await stand_in.start()
+    print(f"YR: {yr_base_url}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workers = await _start_forecast_workers(
+            args.forecast_workers,
+            yr_base_url,
+            Path(temp_dir),
+            args.geohash_precision,
+        )
+        load_test_bot = LoadTestBot(
+            yr_base_url,
+            Path(temp_dir),
+            args.send_delay_ms / 1000,
+            [socket_path for socket_path, _ in workers],
+            nowcast=args.nowcast_rounds > 0,
+            buckets=LocationBuckets(args.geohash_precision),
+        )
+        loop_lag = LoopLagMonitor()
+        try:
+            _add_subscriptions(
+                load_test_bot,
+                args.subscriptions,
+                args.locations,
+                nowcast=args.nowcast_rounds > 0,
+            )
+            load_test_bot.load_cogs()
+            loop_lag.start()
+            results = await _run_phases(load_test_bot, args)
+        finally:
+            loop_lag.stop()
+            await load_test_bot.close()
+            for _, worker in workers:
+                worker.terminate()
+                await worker.wait()
+
+    print(
+        f"\n{'phase':<24} {'ops':>7} {'errors':>7} {'time (s)':>9} {'ops/s':>10} {'p50 (ms)':>9} {'p90 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}"
+    )
+    for result in results:
+        print(result.format())
+    print(f"\nEvent loop lag of the bot: {loop_lag.format()}")
+    if args.nowcast_rounds:
+        evaluated = metrics.NOWCAST_POLLS.get(result="evaluated")
+        unchanged = metrics.NOWCAST_POLLS.get(result="unchanged")
+        alerts = metrics.NOWCAST_ALERTS.get(result="sent")
+        print(
+            f"Nowcast: {evaluated:.0f} polls evaluated, {unchanged:.0f} unchanged, {alerts:.0f} alerts sent"
+        )
+
+    if stand_in:
+        print(f"\nYR stand-in: {dict(stand_in.stats)}")
+        await stand_in.stop()
+    else:
+        print(f"\nYR: {await _get_stats(yr_base_url)}")
+
+
+async def _run_phases(
+    load_test_bot: LoadTestBot, args: argparse.Namespace
+) -> list[PhaseResult]:
+    bot = load_test_bot.bot
+    rainy_forecast_cog = load_test_bot.rainy_forecast_cog
+    subscriptions_cog = load_test_bot.subscriptions_cog
+    results: list[PhaseResult] = []
+
+    async def rain_check_interaction():
+        interaction = fakes.FakeInteraction()
+        await rainy_forecast_cog.rain_check.callback(rainy_forecast_cog, interaction)
+
+    results.append(
+        await _run_concurrently(
+            "rain_check interactions",
+            rain_check_interaction,
+            args.interactions,
+            args.concurrency,
+        )
+    )
+
+    results.append(
+        await _run_job(
+            "daily rain check",
+            bot,
+            lambda: rainy_forecast_cog.rain_check_job([rainy_forecast_cog.job]),
+            expected_messages=1,
+        )
+    )
+
+    subscription_jobs = [
+        DailyJob(
+            key=(SUBSCRIPTION_JOB_KIND, subscription.id),
+            time_zone=subscription.time_zone,
+            time_of_day=subscription.notify_time,
+        )
+        for subscription in load_test_bot.container.subscription_store.get_all()
+    ]
+    for name in ("subscriptions (cold)", "subscriptions (warm)"):
+        results.append(
+            await _run_job(
+                name,
+                bot,
+                lambda: subscriptions_cog.subscription_job(subscription_jobs),
+                expected_messages=len(subscription_jobs),
+            )
+        )
+
+    if load_test_bot.nowcast_alerter:
+        locations = {
+            subscription.coordinates
+            for subscription in load_test_bot.container.subscription_store.get_all()
+        }
+        locations.add(Coordinates(bot.config.lat, bot.config.lon))
+        for i in range(args.nowcast_rounds):
+            results.append(
+                await _run_nowcast_polls(
+                    f"nowcast polls ({i + 1})",
+                    load_test_bot.nowcast_alerter,
+                    list(locations),
+                    args.concurrency,
+                )
+            )
+    return results
+
+
+# Measures how late the event loop of the bot wakes up a sleeping task, i.e. how long heartbeats and interactions would wait for the loop
+class LoopLagMonitor:
+    INTERVAL_SECONDS = 0.01
+
+    def __init__(self) -> None:
+        self.lags_seconds: list[float] = []
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def format(self) -> str:
+        if len(self.lags_seconds) < 2:
+            return "not measured"
+        p99 = statistics.quantiles(self.lags_seconds, n=100)[98]
+        return f"p99 {p99 * 1000:.1f} ms, max {max(self.lags_seconds) * 1000:.1f} ms"
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.INTERVAL_SECONDS)
+            self.lags_seconds.append(
+                time.perf_counter() - start - self.INTERVAL_SECONDS
+            )
+
+
+# Starts forecast worker processes sharing a data folder. Returns the socket and process of each worker
+async def _start_forecast_workers(
+    count: int, yr_base_url: str, data_dir: Path, geohash_precision: int | None
+) -> list[tuple[str, asyncio.subprocess.Process]]:
+    env = {**os.environ, "YR_BASE_URL": yr_base_url}
+    if geohash_precision is not None:
+        env["FORECAST_GEOHASH_PRECISION"] = str(geohash_precision)
+    workers: list[tuple[str, asyncio.subprocess.Process]] = []
+    for i in range(count):
+        socket_path = str(data_dir / f"forecast_worker.{i}.sock")
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "src.forecast_worker",
+            "--env",
+            str(data_dir / ".env"),  # None, i.e. configured by the environment
+            "--socket",
+            socket_path,
+            "--data-dir",
+            str(data_dir / "worker_data"),
+            env=env,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        workers.append((socket_path, process))
+    # Serving when the socket exists
+    for socket_path, process in workers:
+        while not Path(socket_path).exists():
+            if process.returncode is not None:
+                raise Exception(f"Forecast worker {socket_path} failed to start")
+            await asyncio.sleep(0.1)
+    return workers
+
+
+# Runs the operation the given number of times, with at most 'concurrency' running at the same time
+async def _run_concurrently(
+    name: str,
+    operation: Callable[[], Awaitable[Any]],
+    count: int,
+    concurrency: int,
+) -> PhaseResult:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def run():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await operation()
+            except Exception as e:
+                errors += 1
+                logger.debug(f"Operation failed: {e}")
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run() for _ in range(count)))
+    return PhaseResult(name, count, errors, time.perf_counter() - start, latencies)
+
+
+# Polls the nowcast of each location once, like a round of the staggered polls of the alerter (but all at once).
+# Each poll is an operation, including sending its alerts
+async def _run_nowcast_polls(
+    name: str,
+    alerter: NowcastAlerter,
+    locations: list[Coordinates],
+    concurrency: int,
+) -> PhaseResult:
+    remaining = iter(locations)
+    return await _run_concurrently(
+        name, lambda: alerter.poll(next(remaining)), len(locations), concurrency
+    )
+
+
+# Runs a daily job. Each expected message is an operation, with latency measured from the start of the job until the message is sent
+async def _run_job(
+    name: str,
+    bot: fakes.FakeBot,
+    job: Callable[[], Awaitable[Any]],
+    expected_messages: int,
+) -> PhaseResult:
+    bot.clear_messages()
+    start = time.perf_counter()
+    await job()
+    duration = time.perf_counter() - start
+    messages = bot.get_messages()
+    return PhaseResult(
+        name,
+        expected_messages,
+        expected_messages
+        - len(messages),  # Alerts not sent, e.g. failed to get forecast
+        duration,
+        [message.sent_at - start for message in messages],
+    )
+
+
+# Subscriptions spread across locations (in Denmark), with channels and users of different guilds
+def _add_subscriptions(
+    load_test_bot: LoadTestBot, count: int, location_count: int, nowcast: bool
+):
+    rng = random.Random(42)
+    locations = [
+        Coordinates(round(rng.uniform(54.6, 57.7), 4), round(rng.uniform(8.1, 15.1), 4))
+        for _ in range(location_count)
+    ]
+    store = load_test_bot.container.subscription_store
+    for i in range(count):
+        direct_message = i % 4 == 0
+        store.add(
+            locations[i % location_count],
+            TIME_ZONE,
+            time_of_day(21, 0),
+            guild_id=i % 50,
+            channel_id=None if direct_message else 1000 + i,
+            user_id=2000 + i if direct_message else None,
+            nowcast=nowcast,
+        )
+
+
+# The nowcast of the YR (stand-in) serving the forecasts
+def _get_nowcast_base_url(yr_base_url: str) -> str:
+    return yr_base_url.split("/weatherapi/")[0] + NOWCAST_PATH
+
+
+async def _get_stats(yr_base_url: str) -> Any:
+    stats_url = yr_base_url.split("/weatherapi/")[0] + "/stats"
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(stats_url) as response:
+                return await response.json()
+    except Exception as e:
+        return f"Stats not available ({e})"
+
+
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Load test the bot")
+    ap.add_argument(
+        "--yr-base-url",
+        help="Base url of a running YR (stand-in). Default: Start a YR stand-in with the options below",
+    )
+    ap.add_argument("--interactions", type=int, default=500)
+    ap.add_argument(
+        "--concurrency",
+        type=int,
+        default=50,
+        help="Max concurrent interactions",
+    )
+    ap.add_argument("--subscriptions", type=int, default=1000)
+    ap.add_argument(
+        "--locations",
+        type=int,
+        default=200,
+        help="Number of distinct subscription locations",
+    )
+    ap.add_argument(
+        "--send-delay-ms",
+        type=float,
+        default=0,
+        help="Time to send a Discord message",
+    )
+    ap.add_argument(
+        "--forecast-workers",
+        type=int,
+        default=0,
+        help="Number of forecast worker processes. Default: Forecasts are fetched and parsed by the bot process",
+    )
+    ap.add_argument(
+        "--nowcast-rounds",
+        type=int,
+        default=0,
+        help="Rounds of nowcast polls of every location after the daily checks. Default: No nowcast alerts",
+    )
+    ap.add_argument(
+        "--geohash-precision",
+        type=int,
+        help="Share the forecasts of locations in the same geohash cell of this precision (see src/location_buckets.py). Default: Only rounded to 4 decimals",
+    )
+    add_stand_in_args(ap)
+    # Rain everywhere by default, such that every subscription gets an alert
+    ap.set_defaults(scenario="patchy")
+    return ap.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
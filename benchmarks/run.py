@@ -0,0 +1,355 @@
+# pyright: reportPrivateUsage=false
+# The stages benchmarked are private to the services
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, cast
+from zoneinfo import ZoneInfo
+
+from benchmarks import equivalence, fakes, fixtures, runner
+from benchmarks.fixtures import ResponseKind, Scenario
+from src import daily_forecast, discord_messages, time_utils
+from src.alert_updates import AlertUpdater
+from src.bot import WeatherBot
+from src.cogs.rainy_forecast import RainyForecast
+from src.forecast_snapshot import ForecastSnapshot
+from src.forecast_table import ForecastTable
+from src.geocoding import ReverseGeocoder
+from src.models import Coordinates, RainyForecastPeriod, TimePeriod
+from src.outbound import OutboundQueue
+from src.prefetcher import ForecastPrefetcher
+from src.rain_alerts import RainAlertService
+from src.scheduler import DailyScheduler
+from src.sent_alerts import SentAlertStore
+from src.snapshot_files import ForecastSnapshotFiles
+from src.weather_client import AsyncYrWeatherClient, YrWeatherClient
+from src.weather_service import WeatherService
+
+# Benchmarks of each stage of the rain check (decode -> table -> rain evaluation -> message) and of the full rain check.
+# Run from the project root:
+#   python -m benchmarks.run                    # Fails if slower or using more memory than the baseline
+#   python -m benchmarks.run --update-baseline  # Stores the results as the new baseline
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+STAGE_ITERATIONS = 200
+END_TO_END_ITERATIONS = 50
+DAILY_FORECAST_DAYS = 9
+
+TIME_ZONE = ZoneInfo(fakes.BENCHMARK_ENV["TIME_ZONE"])
+COORDINATES = Coordinates(
+    lat=float(fakes.BENCHMARK_ENV["LAT"]), lon=float(fakes.BENCHMARK_ENV["LON"])
+)
+
+Benchmark = tuple[str, Callable[[], Any], int]
+Payloads = dict[tuple[ResponseKind, Scenario], bytes]
+
+
+def main() -> int:
+    args = _parse_args()
+
+    payloads: Payloads = {
+        (kind, scenario): fixtures.build_payload(kind, scenario)
+        for kind in fixtures.RESPONSE_KINDS
+        for scenario in fixtures.SCENARIOS
+    }
+    # The benchmarks of the fast and streamed decoding are only meaningful if they decode the same
+    equivalence_payloads = equivalence.load_payloads()
+    differences = equivalence.check_decoders(equivalence_payloads)
+    if differences:
+        raise Exception(
+            f"Fast decoder differs from from_dict ({', '.join(differences)})"
+        )
+    differences = equivalence.check_stream_decoder(equivalence_payloads)
+    if differences:
+        raise Exception(
+            f"Streamed decoding differs from the full parse ({', '.join(differences)})"
+        )
+
+    loop = asyncio.new_event_loop()
+    try:
+        with tempfile.TemporaryDirectory() as snapshot_directory:
+            return _run(args, payloads, loop, Path(snapshot_directory))
+    finally:
+        loop.close()
+
+
+def _run(
+    args: argparse.Namespace,
+    payloads: Payloads,
+    loop: asyncio.AbstractEventLoop,
+    snapshot_directory: Path,
+) -> int:
+    benchmarks = [
+        benchmark
+        for kind, scenario in payloads
+        for benchmark in _stage_benchmarks(kind, scenario, payloads, snapshot_directory)
+    ] + [
+        benchmark
+        for scenario in fixtures.SCENARIOS
+        for benchmark in _end_to_end_benchmarks(scenario, payloads, loop)
+    ]
+    benchmarks = [
+        (name, fn, args.iterations or iterations)
+        for name, fn, iterations in benchmarks
+        if args.filter in name
+    ]
+
+    results: list[runner.BenchmarkResult] = []
+    for name, fn, iterations in benchmarks:
+        print(f"Running {name}...", file=sys.stderr)
+        results.append(runner.measure(name, fn, iterations))
+
+    baseline = runner.load_baseline(args.baseline)
+    print(runner.format_results(results, baseline))
+
+    if args.update_baseline:
+        # Keep the baseline of benchmarks that were not run (filtered)
+        runner.save_baseline(
+            args.baseline,
+            list({**baseline, **{result.name: result for result in results}}.values()),
+        )
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    regressions = runner.find_regressions(
+        results, baseline, args.time_tolerance, args.memory_tolerance
+    )
+    if regressions:
+        # Run again to rule out noise, e.g. other processes using the CPU. Fail if still regressed
+        print(f"\nRunning {len(regressions)} regressed benchmark(s) again...")
+        benchmarks_by_name = {
+            name: (fn, iterations) for name, fn, iterations in benchmarks
+        }
+        rerun_results = [
+            runner.measure(name, *benchmarks_by_name[name])
+            for name in dict.fromkeys(regression.name for regression in regressions)
+        ]
+        regressions = runner.find_regressions(
+            rerun_results, baseline, args.time_tolerance, args.memory_tolerance
+        )
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) compared to baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+def _stage_benchmarks(
+    kind: ResponseKind,
+    scenario: Scenario,
+    payloads: Payloads,
+    snapshot_directory: Path,
+) -> list[Benchmark]:
+    payload = payloads[kind, scenario]
+    decode, from_dict = equivalence.DECODERS[kind]
+    weather_service = _create_weather_service(payloads, scenario)
+    data = json.loads(payload)
+    dto = decode(data)
+    table = ForecastTable.from_response(dto)
+    time_period = _tomorrow()
+    forecast_hours = weather_service._get_rainy_forecast_hours(time_period, table)
+    forecast = RainyForecastPeriod(
+        dto.properties.meta.updated_at, COORDINATES, forecast_hours or []
+    )
+    now = time_utils.utc_now()
+    snapshot = ForecastSnapshot(
+        coordinates=COORDINATES,
+        updated_at=dto.properties.meta.updated_at,
+        expires=now + timedelta(minutes=30),
+        fetched_at=now,
+        is_complete=kind == "complete",
+        table=table,
+    )
+    snapshot_files = ForecastSnapshotFiles(str(snapshot_directory / kind / scenario))
+    snapshot_files.save(snapshot)
+
+    prefix = f"{kind}/{scenario}"
+    stream_benchmarks: list[Benchmark] = (
+        [
+            # Decoding only the time steps of tomorrow while downloading, i.e. instead of json_loads -> decode
+            (
+                f"{prefix}/stream_decode",
+                lambda: equivalence.decode_streamed(
+                    payload, time_period, equivalence.STREAM_CHUNK_SIZES[-1]
+                ),
+                STAGE_ITERATIONS,
+            )
+        ]
+        if kind == "complete"
+        else []
+    )
+    return stream_benchmarks + [
+        (f"{prefix}/json_loads", lambda: json.loads(payload), STAGE_ITERATIONS),
+        (
+            f"{prefix}/from_dict",
+            lambda: from_dict(data),
+            STAGE_ITERATIONS,
+        ),
+        (f"{prefix}/decode", lambda: decode(data), STAGE_ITERATIONS),
+        (f"{prefix}/table", lambda: ForecastTable.from_response(dto), STAGE_ITERATIONS),
+        (
+            f"{prefix}/snapshot_save",
+            lambda: snapshot_files.save(snapshot),
+            STAGE_ITERATIONS,
+        ),
+        # Warm restart, i.e. instead of json_loads -> decode -> table
+        (f"{prefix}/snapshot_load", snapshot_files.load_all, STAGE_ITERATIONS),
+        (
+            f"{prefix}/rain_evaluation",
+            lambda: weather_service._get_rainy_forecast_hours(time_period, table),
+            STAGE_ITERATIONS,
+        ),
+        (
+            f"{prefix}/daily_forecast",
+            lambda: daily_forecast.aggregate_days(
+                table, TIME_ZONE, time_period.start.date(), DAILY_FORECAST_DAYS
+            ),
+            STAGE_ITERATIONS,
+        ),
+        (
+            f"{prefix}/render_hours",
+            lambda: discord_messages._create_rainy_hours_message_simple(
+                forecast.forecast_hours, TIME_ZONE
+            ),
+            STAGE_ITERATIONS,
+        ),
+        (
+            f"{prefix}/render_embed",
+            lambda: discord_messages.rainy_weather_forecast_tomorrow(
+                forecast, "rain", TIME_ZONE, "Copenhagen"
+            ),
+            STAGE_ITERATIONS,
+        ),
+    ]
+
+
+# Full rain check with a cold cache: fetch (fake YR) -> decode -> table -> rain evaluation -> message -> send (fake Discord)
+def _end_to_end_benchmarks(
+    scenario: Scenario,
+    payloads: Payloads,
+    loop: asyncio.AbstractEventLoop,
+) -> list[Benchmark]:
+    weather_service = _create_weather_service(payloads, scenario)
+    scheduler = DailyScheduler()
+    sent_alert_store = SentAlertStore(":memory:")
+    container = SimpleNamespace(
+        weather_service=weather_service,
+        rain_alert_service=_create_rain_alert_service(weather_service),
+        alert_updater=_create_alert_updater(weather_service, sent_alert_store),
+        outbound=OutboundQueue(),
+        scheduler=scheduler,
+        prefetcher=ForecastPrefetcher(
+            weather_service, scheduler, lead_time=timedelta(minutes=10)
+        ),
+        nowcast_alerter=None,
+    )
+    bot = fakes.FakeBot(fakes.load_config(), container)
+    cog: Any = RainyForecast(cast(WeatherBot, bot))  # Fakes in place of Discord types
+    interaction = fakes.FakeInteraction()
+
+    # Services are recreated for each check, such that the forecast is fetched and parsed every time.
+    # The outbound queue too, such that the checks are not rate limited
+    def reset():
+        weather_service = _create_weather_service(payloads, scenario)
+        container.rain_alert_service = _create_rain_alert_service(weather_service)
+        container.alert_updater = _create_alert_updater(
+            weather_service, sent_alert_store
+        )
+        container.outbound = OutboundQueue()
+        bot.clear_messages()
+        interaction.response.messages.clear()
+
+    def scheduled_check():
+        reset()
+        loop.run_until_complete(cog.rain_check_job([cog.job]))
+        return bot.target_channel.messages
+
+    def interaction_check():
+        reset()
+        loop.run_until_complete(cog.rain_check.callback(cog, interaction))
+        return interaction.response.messages
+
+    # Make sure the benchmarks take the expected path
+    expect_rain = scenario != "dry"
+    if (len(scheduled_check()) == 1) != expect_rain:
+        raise Exception(f"Unexpected result of scheduled rain check ({scenario})")
+    if (interaction_check()[0].embed is not None) != expect_rain:
+        raise Exception(f"Unexpected result of /rain_check ({scenario})")
+
+    prefix = f"end_to_end/{scenario}"
+    return [
+        (f"{prefix}/scheduled", scheduled_check, END_TO_END_ITERATIONS),
+        (f"{prefix}/interaction", interaction_check, END_TO_END_ITERATIONS),
+    ]
+
+
+def _create_weather_service(payloads: Payloads, scenario: Scenario) -> WeatherService:
+    yr_client = fakes.FakeYrClient(
+        payloads["complete", scenario], payloads["compact", scenario]
+    )
+    return WeatherService(
+        cast(YrWeatherClient, None),  # Sync client not used by the bot
+        cast(AsyncYrWeatherClient, yr_client),
+    )
+
+
+def _create_rain_alert_service(weather_service: WeatherService) -> RainAlertService:
+    return RainAlertService(
+        weather_service, cast(ReverseGeocoder, fakes.FakeGeocoder())
+    )
+
+
+def _create_alert_updater(
+    weather_service: WeatherService, store: SentAlertStore
+) -> AlertUpdater:
+    return AlertUpdater(
+        weather_service, cast(ReverseGeocoder, fakes.FakeGeocoder()), store
+    )
+
+
+def _tomorrow() -> TimePeriod:
+    return TimePeriod.from_full_days(
+        current_time=time_utils.now(TIME_ZONE) + timedelta(days=1), num_days=1
+    ).as_utc()
+
+
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Run the benchmarks")
+    ap.add_argument(
+        "--baseline",
+        type=Path,
+        default=BASELINE_PATH,
+        help="Path of baseline results",
+    )
+    ap.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the results as the new baseline instead of comparing",
+    )
+    ap.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed relative increase in time before failing. Default: 0.5 (50%%)",
+    )
+    ap.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative increase in peak memory before failing. Default: 0.2 (20%%)",
+    )
+    ap.add_argument(
+        "--filter", default="", help="Only run benchmarks containing this string"
+    )
+    ap.add_argument("--iterations", type=int, help="Override the number of iterations")
+    return ap.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+# Measures benchmarks and compares the results with a stored baseline
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    name: str
+    iterations: int
+    time_ms: float  # Median time of an iteration
+    min_time_ms: float
+    peak_kib: float  # Peak memory use of an iteration (on top of the memory in use before the iteration)
+    allocated_kib: float  # Memory still allocated after an iteration
+    allocated_blocks: int  # Number of memory blocks still allocated after an iteration
+
+
+@dataclass(frozen=True)
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.metric} {self.current:.3f} (baseline: {self.baseline:.3f})"
+
+
+# Times the function over a number of iterations, then traces the memory use of a single (extra) iteration.
+# Memory is traced separately, as tracing slows down the function considerably
+def measure(name: str, fn: Callable[[], Any], iterations: int) -> BenchmarkResult:
+    fn()  # Warm up, e.g. caches and lazy imports
+
+    times: list[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before_snapshot = tracemalloc.take_snapshot()
+        before_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        after_size, peak_size = tracemalloc.get_traced_memory()
+        after_snapshot = tracemalloc.take_snapshot()
+        del result
+    finally:
+        tracemalloc.stop()
+    allocated_blocks = sum(
+        stat.count_diff
+        for stat in after_snapshot.compare_to(before_snapshot, "filename")
+    )
+
+    return BenchmarkResult(
+        name=name,
+        iterations=iterations,
+        time_ms=statistics.median(times) * 1000,
+        min_time_ms=min(times) * 1000,
+        peak_kib=(peak_size - before_size) / 1024,
+        allocated_kib=(after_size - before_size) / 1024,
+        allocated_blocks=allocated_blocks,
+    )
+
+
+def load_baseline(path: Path) -> dict[str, BenchmarkResult]:
+    if not path.exists():
+        return {}
+    with open(path) as file:
+        results = json.load(file)
+    return {name: BenchmarkResult(**result) for name, result in results.items()}
+
+
+def save_baseline(path: Path, results: list[BenchmarkResult]):
+    with open(path, "w") as file:
+        json.dump({result.name: asdict(result) for result in results}, file, indent=4)
+        file.write("\n")
+
+
+# Returns the results that are slower or use more memory than the baseline (beyond the tolerance).
+# Time varies more between runs (and machines) than memory, hence the separate tolerances
+def find_regressions(
+    results: list[BenchmarkResult],
+    baseline: dict[str, BenchmarkResult],
+    time_tolerance: float,
+    memory_tolerance: float,
+) -> list[Regression]:
+    # Ignore small absolute changes, as they are mostly noise, e.g. timer resolution and interned strings
+    MIN_TIME_MS = 0.05
+    MIN_MEMORY_KIB = 16.0
+
+    regressions: list[Regression] = []
+    for result in results:
+        baseline_result = baseline.get(result.name)
+        if baseline_result is None:
+            continue
+        if result.time_ms > max(
+            baseline_result.time_ms * (1 + time_tolerance),
+            baseline_result.time_ms + MIN_TIME_MS,
+        ):
+            regressions.append(
+                Regression(
+                    result.name, "time_ms", baseline_result.time_ms, result.time_ms
+                )
+            )
+        if result.peak_kib > max(
+            baseline_result.peak_kib * (1 + memory_tolerance),
+            baseline_result.peak_kib + MIN_MEMORY_KIB,
+        ):
+            regressions.append(
+                Regression(
+                    result.name, "peak_kib", baseline_result.peak_kib, result.peak_kib
+                )
+            )
+    return regressions
+
+
+def format_results(
+    results: list[BenchmarkResult], baseline: dict[str, BenchmarkResult]
+) -> str:
+    header = f"{'benchmark':<42} {'time (ms)':>10} {'baseline':>10} {'change':>8} {'peak (KiB)':>11} {'alloc (KiB)':>12} {'blocks':>8}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        baseline_result = baseline.get(result.name)
+        baseline_time = (
+            f"{baseline_result.time_ms:>10.3f}" if baseline_result else f"{'-':>10}"
+        )
+        change = (
+            f"{(result.time_ms / baseline_result.time_ms - 1) * 100:>+7.1f}%"
+            if baseline_result and baseline_result.time_ms
+            else f"{'-':>8}"
+        )
+        lines.append(
+            f"{result.name:<42} {result.time_ms:>10.3f} {baseline_time} {change} {result.peak_kib:>11.1f} {result.allocated_kib:>12.1f} {result.allocated_blocks:>8}"
+        )
+    return "\n".join(lines)
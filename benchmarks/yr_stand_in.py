@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import zlib
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Literal, cast
+
+from aiohttp import web
+
+from benchmarks import fixtures
+from benchmarks.fixtures import ResponseKind, Scenario
+from src import time_utils
+
+logger = logging.getLogger(__name__)
+
+# Local stand-in for the YR locationforecast API (https://api.met.no/weatherapi/locationforecast/2.0/), e.g. for load tests.
+# - Serves the 'complete' and 'compact' endpoints for any lat/lon with realistic timeseries (see fixtures.py)
+# - Serves the nowcast (https://api.met.no/weatherapi/nowcast/2.0/complete) for lat/lon in the Nordic countries (422 elsewhere, like YR).
+#   With the 'patchy' scenario, rain starts within the hour at a time that differs between locations and nowcast updates
+# - The forecast is updated at a fixed interval (and the nowcast at a shorter interval). "Last-Modified" is the time of the latest update, and "If-Modified-Since" requests get a 304 until the next update
+# - Responses expire ("Expires") a fixed time after they are served
+# - Latency, errors and rate limiting (429) can be injected
+# Run with: python -m benchmarks.yr_stand_in --port 8080
+# Then point the bot to it with: YR_BASE_URL=http://localhost:8080/weatherapi/locationforecast/2.0/
+# and YR_NOWCAST_BASE_URL=http://localhost:8080/weatherapi/nowcast/2.0/
+
+BASE_PATH = "/weatherapi/locationforecast/2.0/"
+NOWCAST_PATH = "/weatherapi/nowcast/2.0/"
+SCENARIOS = fixtures.SCENARIOS + ("mixed",)
+
+Kind = ResponseKind | Literal["nowcast"]
+
+
+class YrStandIn:
+    MAX_CACHED_PAYLOADS = 1000
+
+    # scenario: Scenario of all locations, or 'mixed' to pick a scenario per location
+    # error_rate: Fraction of requests failing with 500
+    # rate_limit: Max requests per second before responding with 429
+    def __init__(
+        self,
+        scenario: str = "mixed",
+        expires_seconds: float = 1800,
+        update_interval_seconds: float = 3600,
+        nowcast_expires_seconds: float = 60,
+        nowcast_update_interval_seconds: float = 300,
+        latency_ms: float = 0,
+        latency_jitter_ms: float = 0,
+        error_rate: float = 0,
+        rate_limit: float | None = None,
+    ) -> None:
+        if scenario not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{scenario}'")
+        self._scenario = scenario
+        self._expires = timedelta(seconds=expires_seconds)
+        self._update_interval_seconds = update_interval_seconds
+        self._nowcast_expires = timedelta(seconds=nowcast_expires_seconds)
+        self._nowcast_update_interval_seconds = nowcast_update_interval_seconds
+        self._latency_seconds = latency_ms / 1000
+        self._latency_jitter_seconds = latency_jitter_ms / 1000
+        self._error_rate = error_rate
+        self._rate_limit = rate_limit
+        # Token bucket allowing bursts of up to one second of requests
+        self._tokens = rate_limit or 0.0
+        self._tokens_updated_at = time.monotonic()
+        self._payloads: OrderedDict[tuple[str, float, float, datetime], bytes] = (
+            OrderedDict()
+        )
+        self._runner: web.AppRunner | None = None
+        self.stats: Counter[str] = Counter()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(BASE_PATH + "{endpoint}", self._handle_forecast)
+        app.router.add_get(NOWCAST_PATH + "complete", self._handle_nowcast)
+        app.router.add_get("/stats", self._handle_stats)
+        return app
+
+    # Starts serving in the current event loop. Returns the base url to use for the YR client
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        actual_host, actual_port = self._runner.addresses[0][:2]
+        return f"http://{actual_host}:{actual_port}{BASE_PATH}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle_forecast(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        endpoint = request.match_info["endpoint"]
+        if endpoint in fixtures.RESPONSE_KINDS:
+            response = await self._create_response(request, endpoint)
+        else:
+            response = web.Response(status=404, text=f"Unknown endpoint '{endpoint}'")
+        self.stats[str(response.status)] += 1
+        return response
+
+    # Counted separately from the forecast requests
+    async def _handle_nowcast(self, request: web.Request) -> web.StreamResponse:
+        self.stats["nowcast_requests"] += 1
+        response = await self._create_response(request, "nowcast")
+        self.stats[f"nowcast_{response.status}"] += 1
+        return response
+
+    async def _create_response(
+        self, request: web.Request, kind: Kind
+    ) -> web.StreamResponse:
+        # Like YR, require identification
+        if not request.headers.get("User-Agent"):
+            return web.Response(status=403, text="User-Agent header required")
+        try:
+            lat = round(float(request.query["lat"]), 4)
+            lon = round(float(request.query["lon"]), 4)
+        except (KeyError, ValueError):
+            return web.Response(status=400, text="Invalid or missing lat/lon")
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            return web.Response(status=400, text="lat/lon out of range")
+        if kind == "nowcast" and not _has_nowcast(lat, lon):
+            return web.Response(status=422, text="Location outside of nowcast area")
+
+        if not self._take_token():
+            return web.Response(
+                status=429, text="Too many requests", headers={"Retry-After": "1"}
+            )
+
+        await self._wait()
+
+        if self._error_rate and random.random() < self._error_rate:
+            return web.Response(status=500, text="Injected error")
+
+        if kind == "nowcast":
+            updated_at = self._get_updated_at(self._nowcast_update_interval_seconds)
+            expires = self._nowcast_expires
+        else:
+            updated_at = self._get_updated_at(self._update_interval_seconds)
+            expires = self._expires
+        headers = {
+            "Expires": format_datetime(time_utils.utc_now() + expires, usegmt=True),
+            "Last-Modified": format_datetime(updated_at, usegmt=True),
+        }
+        if_modified_since = _parse_http_date(request.headers.get("If-Modified-Since"))
+        if if_modified_since and if_modified_since >= updated_at:
+            return web.Response(status=304, headers=headers)
+
+        body = self._get_payload(kind, lat, lon, updated_at)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    def _take_token(self) -> bool:
+        if self._rate_limit is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(
+            self._rate_limit,
+            self._tokens + (now - self._tokens_updated_at) * self._rate_limit,
+        )
+        self._tokens_updated_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def _wait(self):
+        latency = self._latency_seconds + random.uniform(
+            -self._latency_jitter_seconds, self._latency_jitter_seconds
+        )
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    # Time of the latest update given the update interval
+    def _get_updated_at(self, update_interval_seconds: float) -> datetime:
+        now = time_utils.utc_now().timestamp()
+        updated_at = now - now % update_interval_seconds
+        return datetime.fromtimestamp(int(updated_at), tz=timezone.utc)
+
+    def _get_payload(
+        self, kind: Kind, lat: float, lon: float, updated_at: datetime
+    ) -> bytes:
+        scenario = self._get_scenario(lat, lon)
+        key = (kind, lat, lon, updated_at)
+        payload = self._payloads.get(key)
+        if payload is not None:
+            self._payloads.move_to_end(key)
+            return payload
+
+        if kind == "nowcast":
+            # Rain starts in 5 to 55 minutes (patchy), changing with every update
+            onset_key = f"{lat},{lon},{updated_at.timestamp()}".encode()
+            payload_dict = fixtures.build_nowcast_payload_dict(
+                scenario, updated_at, onset_step=1 + zlib.crc32(onset_key) % 11
+            )
+        else:
+            payload_dict = fixtures.build_payload_dict(
+                kind, scenario, updated_at.replace(minute=0, second=0)
+            )
+            payload_dict["properties"]["meta"]["updated_at"] = updated_at.strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            )
+        payload_dict["geometry"]["coordinates"] = [lon, lat, 0]
+        payload = json.dumps(payload_dict).encode()
+
+        self._payloads[key] = payload
+        if len(self._payloads) > self.MAX_CACHED_PAYLOADS:
+            self._payloads.popitem(last=False)
+        return payload
+
+    def _get_scenario(self, lat: float, lon: float) -> Scenario:
+        if self._scenario != "mixed":
+            return cast(Scenario, self._scenario)
+        # Same scenario for a location on every request
+        return fixtures.SCENARIOS[hash((lat, lon)) % len(fixtures.SCENARIOS)]
+
+
+# Roughly the area covered by the radars of the nowcast (the Nordic countries)
+def _has_nowcast(lat: float, lon: float) -> bool:
+    return 54 <= lat <= 72 and 4 <= lon <= 32
+
+
+def _parse_http_date(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def add_stand_in_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    ap.add_argument(
+        "--expires",
+        type=float,
+        default=1800,
+        help="Seconds until responses expire. Default: 1800",
+    )
+    ap.add_argument(
+        "--update-interval",
+        type=float,
+        default=3600,
+        help="Seconds between forecast updates. Default: 3600",
+    )
+    ap.add_argument(
+        "--nowcast-expires",
+        type=float,
+        default=60,
+        help="Seconds until nowcast responses expire. Default: 60",
+    )
+    ap.add_argument(
+        "--nowcast-update-interval",
+        type=float,
+        default=300,
+        help="Seconds between nowcast updates. Default: 300",
+    )
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--latency-jitter-ms", type=float, default=0)
+    ap.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests failing with 500",
+    )
+    ap.add_argument(
+        "--rate-limit",
+        type=float,
+        help="Max requests per second before responding with 429",
+    )
+
+
+def create_stand_in(args: argparse.Namespace) -> YrStandIn:
+    return YrStandIn(
+        scenario=args.scenario,
+        expires_seconds=args.expires,
+        update_interval_seconds=args.update_interval,
+        nowcast_expires_seconds=args.nowcast_expires,
+        nowcast_update_interval_seconds=args.nowcast_update_interval,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-in for the YR API")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    add_stand_in_args(ap)
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stand_in = create_stand_in(args)
+    logger.info(f"Serving YR stand-in at http://{args.host}:{args.port}{BASE_PATH}")
+    web.run_app(stand_in.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
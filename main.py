@@ -1,3 +1,8 @@
+import time
+
+started_at = time.perf_counter()  # Start of the imports, measured by --profile-startup
+
+import argparse
 import logging
 
 from src import config, startup
@@ -7,13 +12,31 @@ logger = logging.getLogger(__name__)
 
 
 def main():
-    app_config = config.load_config()
+    args = _parse_args()
+    profiler = startup.StartupProfiler(started_at)
+    profiler.mark("imports")
+    app_config = config.load_config(args.env)
+    profiler.mark("config")
     container = startup.resolve_deps(app_config)
-    bot = WeatherBot(container)
+    profiler.mark("dependencies")
+    bot = WeatherBot(container, profiler, exit_when_ready=args.profile_startup)
     logger.info("Starting bot...")
     bot.run(app_config.bot_token, log_handler=None)
 
 
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "-e", "--env", required=False, help="Path of .env file", default=".env"
+    )
+    ap.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print the time of each startup phase when the bot is ready, then exit",
+    )
+    return ap.parse_args()
+
+
 if __name__ == "__main__":
     startup.setup_logging()
     try:
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import replace
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+import discord
+
+import src.discord_messages as discord_messages
+from src import metrics, time_utils
+from src.forecast_worker import RemoteGeocoder, RemoteWeatherService
+from src.geocoding import ReverseGeocoder
+from src.models import (
+    Coordinates,
+    RainyForecastPeriod,
+    RainyForecastPeriodQuery,
+    TimePeriod,
+)
+from src.sent_alerts import SentAlert, SentAlertStore
+from src.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
+
+# Edits a sent message given the channel id and message id
+EditAlert = Callable[[int, int, discord.Embed], Awaitable[None]]
+
+# Whether the alerts of a guild are updated by this process, see WeatherBot.owns_guild
+OwnsGuild = Callable[[int | None], bool]
+
+# Location, time zone and date of the forecast
+AlertLocation = tuple[Coordinates, str, date]
+
+
+# Keeps sent rain alerts up to date until the end of their date.
+# When YR has updated the forecast, the rainy hours of the date are evaluated again and the message is edited if (and only if) they changed meaningfully,
+# i.e. an update costs at most one Discord request per changed alert
+class AlertUpdater:
+    UPDATE_INTERVAL_SECONDS = 600.0  # YR updates the forecast about hourly
+    # mm. Smaller changes of the amount of a rainy hour are not worth an edit
+    MIN_AMOUNT_CHANGE = 0.5
+
+    def __init__(
+        self,
+        weather_service: WeatherService | RemoteWeatherService,
+        geocoder: ReverseGeocoder | RemoteGeocoder,
+        store: SentAlertStore,
+    ) -> None:
+        self._weather_service = weather_service
+        self._geocoder = geocoder
+        self._store = store
+        self._edit: EditAlert | None = None
+        self._owns_guild: OwnsGuild = lambda guild_id: True
+        self._update_task: asyncio.Task[None] | None = None
+
+    # Starts updating the alerts (of the guilds owned by this process) in the background
+    def start(self, edit: EditAlert, owns_guild: OwnsGuild):
+        self._edit = edit
+        self._owns_guild = owns_guild
+        if self._update_task is None:
+            self._update_task = asyncio.create_task(self._run_updates())
+
+    def stop(self):
+        if self._update_task:
+            self._update_task.cancel()
+            self._update_task = None
+
+    def close(self):
+        self.stop()
+        self._store.close()
+
+    # Remembers a sent alert of the rainy forecast for tomorrow, such that the message is edited when the forecast changes
+    async def track(
+        self,
+        guild_id: int | None,
+        channel_id: int,
+        message_id: int,
+        coordinates: Coordinates,
+        time_zone: ZoneInfo,
+    ):
+        try:
+            # The forecast just sent, i.e. already evaluated
+            forecast, _ = await self._weather_service.get_rainy_forecast_tomorrow(
+                coordinates, time_zone
+            )
+        except Exception:
+            metrics.ERRORS.inc(stage="alert_update")
+            logger.exception(f"Failed to track rain alert (message id: {message_id})")
+            return
+        if forecast is None:
+            return
+        self._store.set(
+            SentAlert(
+                channel_id=channel_id,
+                guild_id=guild_id,
+                message_id=message_id,
+                date=time_utils.now(time_zone).date() + timedelta(days=1),
+                coordinates=coordinates,
+                time_zone=time_zone,
+                updated_at=forecast.updated_at,
+                rainy_hours=_get_rainy_hours(forecast),
+            )
+        )
+
+    # Updates the alerts of all locations, and forgets alerts of days that are over. Returns the number of edited alerts
+    async def update(self) -> int:
+        alerts_by_location: dict[AlertLocation, list[SentAlert]] = defaultdict(list)
+        for alert in self._store.get_all():
+            if not self._owns_guild(alert.guild_id):
+                continue
+            if alert.date < time_utils.now(alert.time_zone).date():
+                self._store.remove(alert)
+                continue
+            alerts_by_location[
+                (alert.coordinates, alert.time_zone.key, alert.date)
+            ].append(alert)
+
+        edited_counts = await asyncio.gather(
+            *(self._update_location(alerts) for alerts in alerts_by_location.values())
+        )
+        return sum(edited_counts)
+
+    async def _run_updates(self):
+        while True:
+            await asyncio.sleep(self.UPDATE_INTERVAL_SECONDS)
+            try:
+                edited_count = await self.update()
+            except Exception:
+                metrics.ERRORS.inc(stage="alert_update")
+                logger.exception("Failed to update rain alerts")
+                continue
+            if edited_count:
+                logger.info(f"Edited {edited_count} rain alerts")
+
+    async def _update_location(self, alerts: list[SentAlert]) -> int:
+        try:
+            return await self._update_alerts(alerts)
+        except Exception:
+            metrics.ERRORS.inc(stage="alert_update")
+            location = alerts[0]
+            logger.exception(
+                f"Failed to update rain alerts for {location.coordinates} ({location.date})"
+            )
+            return 0
+
+    # Updates alerts of the same location and date, which share the evaluation and the rendered embed
+    async def _update_alerts(self, alerts: list[SentAlert]) -> int:
+        location = alerts[0]
+        # Fetches the forecast if expired, i.e. the alerts keep up with the forecast of YR
+        info = await self._weather_service.get_forecast_info(location.coordinates)
+        outdated_alerts = [
+            alert for alert in alerts if alert.updated_at != info.updated_at
+        ]
+        metrics.ALERT_UPDATES.inc(
+            len(alerts) - len(outdated_alerts), result="not_updated"
+        )
+        if not outdated_alerts:
+            return 0
+        forecast = await self._get_rainy_forecast(location, info.updated_at)
+
+        rainy_hours = _get_rainy_hours(forecast)
+        # Hours already passed are no longer in the forecast, so only compare the remaining hours
+        since = int(time_utils.utc_now().timestamp()) // 3600 * 3600
+        changed_alerts: list[SentAlert] = []
+        for alert in outdated_alerts:
+            # Compared with the hours shown by the message rather than the previous forecast, such that small changes do not add up unseen
+            if self._is_meaningful_change(alert.rainy_hours, rainy_hours, since):
+                changed_alerts.append(alert)
+            else:
+                metrics.ALERT_UPDATES.inc(result="unchanged")
+                self._store.set(replace(alert, updated_at=forecast.updated_at))
+        if not changed_alerts:
+            return 0
+
+        embed = await self._render(location, forecast)
+        edited = await asyncio.gather(
+            *(self._edit_alert(alert, embed) for alert in changed_alerts)
+        )
+        for alert, is_edited in zip(changed_alerts, edited):
+            if is_edited:
+                self._store.set(
+                    replace(
+                        alert, updated_at=forecast.updated_at, rainy_hours=rainy_hours
+                    )
+                )
+        return sum(edited)
+
+    # Returns True if edited
+    async def _edit_alert(self, alert: SentAlert, embed: discord.Embed) -> bool:
+        assert self._edit is not None
+        try:
+            await self._edit(alert.channel_id, alert.message_id, embed)
+        except (discord.NotFound, discord.Forbidden) as e:
+            # E.g. the message is deleted. Stop updating it
+            metrics.ALERT_UPDATES.inc(result="gone")
+            logger.info(
+                f"Rain alert can no longer be edited (message id: {alert.message_id}): {e}"
+            )
+            self._store.remove(alert)
+            return False
+        except Exception:
+            metrics.ALERT_UPDATES.inc(result="failed")
+            metrics.ERRORS.inc(stage="send")
+            logger.exception(
+                f"Failed to edit rain alert (message id: {alert.message_id})"
+            )
+            return False
+        metrics.ALERT_UPDATES.inc(result="edited")
+        return True
+
+    def _is_meaningful_change(
+        self, previous: dict[int, float], current: dict[int, float], since: int
+    ) -> bool:
+        previous = {hour: amount for hour, amount in previous.items() if hour >= since}
+        current = {hour: amount for hour, amount in current.items() if hour >= since}
+        if previous.keys() != current.keys():
+            return True
+        return any(
+            abs(previous[hour] - current[hour]) >= self.MIN_AMOUNT_CHANGE
+            for hour in previous
+        )
+
+    # The rainy forecast of the date of the alert. No rainy hours if no rain
+    async def _get_rainy_forecast(
+        self, alert: SentAlert, updated_at: datetime
+    ) -> RainyForecastPeriod:
+        time_period = TimePeriod.from_full_days(
+            datetime.combine(alert.date, time(), alert.time_zone)
+        ).as_utc()
+        forecast = await self._weather_service.get_rainy_forecast_async(
+            RainyForecastPeriodQuery(time_period, alert.coordinates)
+        )
+        return forecast or RainyForecastPeriod(updated_at, alert.coordinates, [])
+
+    async def _render(
+        self, alert: SentAlert, forecast: RainyForecastPeriod
+    ) -> discord.Embed:
+        forecast_symbol = ""
+        if forecast.forecast_hours:
+            # As of 8am (user time) to best describe the weather of the day
+            symbol_time = time_utils.as_utc(
+                datetime.combine(alert.date, time(8), alert.time_zone)
+            )
+            forecast_symbol = (
+                await self._weather_service.get_forecast_symbol_code_async(
+                    symbol_time, alert.coordinates
+                )
+                or ""
+            )
+        city = await self._geocoder.get_city_async(alert.coordinates)
+        is_today = alert.date == time_utils.now(alert.time_zone).date()
+        return discord_messages.rainy_weather_forecast_tomorrow(
+            forecast,
+            forecast_symbol,
+            alert.time_zone,
+            city,
+            title="Rain today! ☔" if is_today else "Rain tomorrow! ☔",
+        )
+
+
+# Hour (epoch seconds) -> precipitation amount
+def _get_rainy_hours(forecast: RainyForecastPeriod) -> dict[int, float]:
+    return {
+        int(hour.time.timestamp()): hour.precipitation_amount
+        for hour in forecast.forecast_hours
+    }
@@ -1,3 +1,6 @@
+import asyncio
+import hashlib
+import json
 import logging
 import os
 import traceback
@@ -8,56 +11,219 @@ import discord
 from discord import TextChannel
 from discord.ext import commands
 
+from src import metrics
 from src.container import Container
+from src.models import Coordinates
+from src.outbound import Priority
+from src.startup import StartupProfiler
 
 logger = logging.getLogger(__name__)
 
 
-SYNC_COMMANDS = True  # Set to false for faster startup, but commands will not be synced with discord
+# Hash of the commands last synced with discord. Commands are only synced when changed (delete the file to force a sync)
+COMMANDS_HASH_PATH = Path("./data/commands_hash.json")
 cogs_dir = Path("./src/cogs")
 cogs_base_path = ".".join(cogs_dir.parts)
 
 
-class WeatherBot(commands.Bot):
+# Runs the shards given by the config (all shards by default). The process running the shard of the target guild
+# syncs the commands and runs the default rain check, and each process only schedules the subscriptions of the guilds of its own shards
+class WeatherBot(commands.AutoShardedBot):
     # NB: Commands available in self.tree
-    def __init__(self, container: Container) -> None:
+    def __init__(
+        self,
+        container: Container,
+        profiler: StartupProfiler | None = None,
+        exit_when_ready: bool = False,  # E.g. to profile the startup
+    ) -> None:
         intents = discord.Intents.default()
-        super().__init__(command_prefix="", intents=intents)
-        self.dev_channel: Optional[TextChannel] = None
+        super().__init__(
+            command_prefix="",
+            intents=intents,
+            shard_count=container.config.shard_count,
+            shard_ids=container.config.shard_ids,  # type: ignore # None: All shards
+        )
+        # A partial channel until the shard of the target guild is ready, such that errors can be reported from any shard (and process)
+        self.dev_channel: Optional[discord.abc.Messageable] = None
         self.target_channel: Optional[TextChannel] = None
         # Set dependencies, that is, the bot will act as a service container for cogs as they (only) take the bot as dependency
         # XXX: Create own solution for automatic dependency injection when loading cogs?
         self.container: Container = container
         self.config = container.config
+        self.metrics_server = (
+            metrics.MetricsServer(self.config.metrics_host, self.config.metrics_port)
+            if self.config.metrics_port
+            else None
+        )
+        self.profiler = profiler or StartupProfiler()
+        self.exit_when_ready = exit_when_ready
+        self._is_started = False  # on_ready is also called when reconnecting
+        # The shard count is known once the first shard connects (if not configured, it is recommended by discord)
+        self._shards_connected = asyncio.Event()
+        self._ready_shards: dict[int, asyncio.Event] = {}
 
     async def setup_hook(self):
+        self.profiler.mark("login")
+        self.dev_channel = self.get_partial_messageable(self.config.dev_channel_id)
+        # Forecasts parsed before the restart, such that they are served without requesting YR
+        self.container.weather_service.load_snapshots()
+        self.profiler.mark("snapshots")
         await self._load_cogs()
+        self.profiler.mark("cogs")
+        # Cogs have added their jobs
+        self.container.scheduler.start()
+        if self.container.response_cache:
+            self.container.response_cache.start()
+        self.container.alert_updater.start(self._edit_alert, self.owns_guild)
+        if self.container.nowcast_alerter:
+            self.container.nowcast_alerter.start()
+        if self.metrics_server:
+            await self.metrics_server.start()
+        # Look up city names in the background, such that they are ready when the first message is sent
+        self.container.geocoder.warm(
+            [Coordinates(self.config.lat, self.config.lon)]
+            + [
+                subscription.coordinates
+                for subscription in self.container.subscription_store.get_all()
+                if self.owns_guild(subscription.guild_id)
+            ]
+        )
+        self.profiler.mark("setup")
 
-    async def on_ready(self):
+    # True if the guild is on a shard run by this process, i.e. its subscriptions and checks are handled by this process.
+    # Known before connecting, as the shard count is configured when only some of the shards are run
+    def owns_guild(self, guild_id: int | None) -> bool:
+        if self.config.shard_ids is None:
+            return True
+        return self._get_shard_id(guild_id) in self.config.shard_ids
+
+    # Waits until the shard of the guild is ready. Unlike wait_until_ready, this does not wait for the other shards
+    async def wait_until_guild_ready(self, guild_id: int | None):
+        await self._shards_connected.wait()
+        await self._get_shard_ready(self._get_shard_id(guild_id)).wait()
+
+    async def on_shard_connect(self, shard_id: int):
+        self._shards_connected.set()
+
+    async def on_shard_ready(self, shard_id: int):
+        logger.info(
+            f"Shard {shard_id} is ready ({self.profiler.elapsed_seconds():.2f} s since start)"
+        )
+        self._get_shard_ready(shard_id).set()
+        if shard_id == self._get_shard_id(self.config.target_guild_id):
+            await self._on_target_shard_ready()
+
+    # The bot is usable as soon as the shard of the target guild is ready, i.e. it does not wait for the other shards
+    async def _on_target_shard_ready(self):
+        if not self._is_started:
+            self.profiler.mark("connect")
         await self._sync_commands()
+        if not self._is_started:
+            self.profiler.mark("sync")
         # Get channels of interest
-        self.dev_channel = self._get_text_channel_or_raise(self.config.dev_channel_id)
+        dev_channel = self._get_text_channel_or_raise(self.config.dev_channel_id)
+        self.dev_channel = dev_channel
         self.target_channel = self._get_text_channel_or_raise(
             self.config.target_channel_id
         )
-        ready_msg = f"Bot is online ({self.user})"
+        ready_msg = f"Bot is online ({self.user}, shards: {self._describe_shards()})"
         logger.info(ready_msg)
-        await self.dev_channel.send(ready_msg)
+        await self.container.outbound.send(
+            dev_channel.id,
+            Priority.DIAGNOSTIC,
+            "diagnostic",
+            lambda: dev_channel.send(ready_msg),
+        )
+
+    # All shards of this process are ready
+    async def on_ready(self):
+        if self._is_started:
+            return
+        self._is_started = True
+        self.profiler.mark("ready")
+        logger.info(f"Startup took {self.profiler.total_seconds():.2f} s")
+        if self.exit_when_ready:
+            print(self.profiler.format())
+            await self.close()
 
-    # Send any errors to dev channel
+    async def close(self):
+        self.container.scheduler.stop()
+        if self.container.nowcast_alerter:
+            self.container.nowcast_alerter.stop()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.container.async_weather_client:
+            await self.container.async_weather_client.close()
+        if self.container.response_cache:
+            self.container.response_cache.close()
+        if self.container.forecast_worker:
+            await self.container.forecast_worker.close()
+        self.container.subscription_store.close()
+        self.container.alert_updater.close()
+        self.container.outbound.close()
+        await super().close()
+
+    # Send any errors to dev channel. Repeats of the same error are coalesced, such that a recurring error does not flood the channel
     async def on_error(self, event_method: str, /, *args: Any, **kwargs: Any):
+        metrics.ERRORS.inc(stage="event")
         trace = traceback.format_exc()
         if self.dev_channel:
-            await self.dev_channel.send(f"Exception occured: ```" + trace + "```")
+            self.container.outbound.report(
+                self.config.dev_channel_id,
+                trace,
+                f"Exception occured: ```" + trace + "```",
+                self.dev_channel.send,
+            )
         return await super().on_error(event_method, *args, **kwargs)
 
+    # Syncs the commands with the target guild (to update slash commands instantly) if changed since the last sync.
+    # NB: Syncing takes a while and is rate limited by discord
     async def _sync_commands(self):
-        if SYNC_COMMANDS:
-            logger.info("Syncing commands with discord...")
-            # await tree.sync() # This takes a while, as it syncs with all guilds
-            # Sync with specified target guild to update slash commands instantly
-            await self.tree.sync(guild=discord.Object(id=self.config.target_guild_id))
-            logger.info("Commands synced")
+        guild = discord.Object(id=self.config.target_guild_id)
+        commands_hash = self._hash_commands(guild)
+        if _read_commands_hash() == commands_hash:
+            logger.info("Commands not changed since last sync, skipping sync")
+            return
+        logger.info("Syncing commands with discord...")
+        await self.tree.sync(guild=guild)
+        _write_commands_hash(commands_hash)
+        logger.info("Commands synced")
+
+    # Hash of the commands as sent to discord when syncing (and the application and guild synced to)
+    def _hash_commands(self, guild: discord.abc.Snowflake) -> str:
+        payload = {
+            "application_id": self.application_id,
+            "guild_id": guild.id,
+            "commands": [
+                command.to_dict(self.tree)
+                for command in self.tree.get_commands(guild=guild)
+            ],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    # Edits a sent alert without fetching the channel or message first, i.e. a single request to discord
+    async def _edit_alert(self, channel_id: int, message_id: int, embed: discord.Embed):
+        message = self.get_partial_messageable(channel_id).get_partial_message(
+            message_id
+        )
+        await self.container.outbound.send(
+            channel_id, Priority.ALERT, "alert_edit", lambda: message.edit(embed=embed)
+        )
+
+    # See https://discord.com/developers/docs/topics/gateway#sharding. Direct messages are received by shard 0
+    def _get_shard_id(self, guild_id: int | None) -> int:
+        if guild_id is None or not self.shard_count:
+            return 0
+        return (guild_id >> 22) % self.shard_count
+
+    def _get_shard_ready(self, shard_id: int) -> asyncio.Event:
+        if shard_id not in self._ready_shards:
+            self._ready_shards[shard_id] = asyncio.Event()
+        return self._ready_shards[shard_id]
+
+    def _describe_shards(self) -> str:
+        shard_ids = self.config.shard_ids or range(self.shard_count or 1)
+        return f"{', '.join(str(shard_id) for shard_id in shard_ids)} of {self.shard_count}"
 
     def _get_text_channel_or_raise(self, channel_id: int) -> TextChannel:
         channel = self.get_channel(channel_id)
@@ -77,3 +243,15 @@ class WeatherBot(commands.Bot):
     def _print_commands(self):
         for command in self.tree.get_commands():
             logger.info(command.name)
+
+
+def _read_commands_hash() -> str | None:
+    try:
+        return json.loads(COMMANDS_HASH_PATH.read_text())["hash"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_commands_hash(commands_hash: str):
+    COMMANDS_HASH_PATH.parent.mkdir(parents=True, exist_ok=True)
+    COMMANDS_HASH_PATH.write_text(json.dumps({"hash": commands_hash}))
@@ -0,0 +1,54 @@
+import logging
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from src import discord_messages, interactions
+from src.bot import WeatherBot
+from src.models import Coordinates
+
+logger = logging.getLogger(__name__)
+
+MAX_DAYS = 9  # Length of the YR forecast
+
+
+# Forecast of the coming days at the location of the bot
+class Forecast(commands.Cog):
+    def __init__(self, bot: WeatherBot):
+        self.bot = bot
+
+    @app_commands.command(
+        description="Shows the forecast of the coming days",
+        name="forecast",
+    )
+    @app_commands.describe(days=f"Number of days including today (1-{MAX_DAYS})")
+    async def forecast(
+        self,
+        interaction: discord.Interaction,
+        days: app_commands.Range[int, 1, MAX_DAYS] = 3,
+    ) -> None:
+        await interactions.respond_within_budget(
+            interaction,
+            "forecast",
+            self._create_forecast_response(days),
+            self.bot.container.outbound,
+        )
+
+    async def _create_forecast_response(self, days: int) -> interactions.Response:
+        coordinates = Coordinates(lat=self.bot.config.lat, lon=self.bot.config.lon)
+        time_zone = self.bot.config.time_zone
+        forecast = await self.bot.container.weather_service.get_daily_forecast(
+            coordinates, time_zone, days
+        )
+        city = await self.bot.container.geocoder.get_city_async(coordinates)
+        return interactions.Response(
+            embed=discord_messages.daily_forecast(forecast, time_zone, city)
+        )
+
+
+async def setup(bot: WeatherBot):
+    # Commands are added to the target guild only, such that they are synced instantly
+    await bot.add_cog(
+        Forecast(bot), guild=discord.Object(id=bot.config.target_guild_id)
+    )
@@ -1,104 +1,144 @@
 import logging
-from datetime import timedelta
 
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 
-import src.discord_messages as discord_messages
-from src import config, time_utils
+from src import interactions, metrics
 from src.bot import WeatherBot
-from src.models import Coordinates, RainyForecastPeriodQuery, TimePeriod
+from src.models import Coordinates
+from src.outbound import Priority
+from src.scheduler import DailyJob
 
 logger = logging.getLogger(__name__)
 
+RAIN_CHECK_JOB_KEY = ("rain_check", 0)
+NO_RAIN_MESSAGE = "No rain in forecast for tomorrow 😎"
+
 
 class RainyForecast(commands.Cog):
     def __init__(self, bot: WeatherBot):
         self.bot = bot
+        self.job = DailyJob(
+            key=RAIN_CHECK_JOB_KEY,
+            time_zone=self.bot.config.time_zone,
+            time_of_day=self.bot.config.notify_time,
+        )
+        scheduler = self.bot.container.scheduler
+        scheduler.register_handler(self.job.kind, self.rain_check_job)
+        # Run by the process of the shard of the target guild only
+        if not bot.owns_guild(bot.config.target_guild_id):
+            return
         logger.info(
-            f"Scheduling rain check. Will check for rainy forecast (tomorrow), every day at {self.bot.config.notify_time} UTC"
+            f"Scheduling rain check. Will check for rainy forecast (tomorrow), every day at {self.bot.config.notify_time} ({self.bot.config.time_zone})"
         )
-        self.rain_check_loop.start()
+        scheduler.add(self.job)
+        self.bot.container.prefetcher.add(
+            self.job.key[1],
+            self._get_coordinates(),
+            self.job.time_zone,
+            self.job.time_of_day,
+        )
+        if self.bot.container.nowcast_alerter:
+            self.bot.container.nowcast_alerter.watch(
+                RAIN_CHECK_JOB_KEY,
+                self._get_coordinates(),
+                self.bot.config.time_zone,
+                self._send_nowcast_alert,
+            )
 
     # Manually check for rain tomorrow
     @app_commands.command(
         description="Checks if it's going to rain tomorrow",
         name="rain_check",
     )
-    @app_commands.guilds(discord.Object(id=config.app_config.target_guild_id))
     async def rain_check(self, interaction: discord.Interaction) -> None:
-        forecast, forecast_symbol = self._get_rainy_forecast_tomorrow()
-
-        if not forecast or not forecast_symbol:
-            await interaction.response.send_message(
-                "No rain in forecast for tomorrow 😎"
-            )
+        # Answer instantly if the forecast has already been rendered, e.g. by another user or when prefetched
+        rendered = self.bot.container.rain_alert_service.get_ready_embed(
+            self._get_coordinates(), self.bot.config.time_zone
+        )
+        if rendered is not None:
+            metrics.INTERACTION_RESPONSES.inc(command="rain_check", mode="ready")
+            await interactions.send_response(interaction, _to_response(rendered.embed))
             return
 
-        embed = discord_messages.rainy_weather_forecast_tomorrow(
-            forecast, forecast_symbol, self.bot.container.config.time_zone
+        await interactions.respond_within_budget(
+            interaction,
+            "rain_check",
+            self._create_rain_check_response(),
+            self.bot.container.outbound,
         )
 
-        await interaction.response.send_message(embed=embed)
+    async def _create_rain_check_response(self) -> interactions.Response:
+        return _to_response(await self._get_rainy_forecast_tomorrow_embed())
 
     def cog_unload(self):
-        self.rain_check_loop.cancel()
+        self.bot.container.scheduler.cancel(self.job.key)
+        self.bot.container.prefetcher.remove(self.job.key[1])
+        if self.bot.container.nowcast_alerter:
+            self.bot.container.nowcast_alerter.unwatch(RAIN_CHECK_JOB_KEY)
         return super().cog_unload()
 
     # Daily rain check
-    # @tasks.loop(seconds=5)
-    @tasks.loop(time=config.app_config.notify_time)
-    async def rain_check_loop(self):
+    async def rain_check_job(self, jobs: list[DailyJob]):
+        await self.bot.wait_until_guild_ready(self.bot.config.target_guild_id)
         # Sends a rainy forecast (if any) to the target channel
         logger.info("Executing daily rain check...")
-        forecast, forecast_symbol = self._get_rainy_forecast_tomorrow()
-        if forecast is None or forecast_symbol is None:
+        embed = await self._get_rainy_forecast_tomorrow_embed()
+        if embed is None:
             return
-        embed = discord_messages.rainy_weather_forecast_tomorrow(
-            forecast, forecast_symbol, self.bot.container.config.time_zone
-        )
         if self.bot.target_channel is None:
             return  # XXX: Unexpected
-        await self.bot.target_channel.send(embed=embed)
+        target_channel = self.bot.target_channel
+        message = await self.bot.container.outbound.send(
+            target_channel.id,
+            Priority.ALERT,
+            "alert",
+            lambda: target_channel.send(embed=embed),
+        )
         logger.info("Notification sent")
-
-    @rain_check_loop.before_loop
-    async def before_rain_check_loop(self):
-        logger.info("Rain check loop waiting for bot to be ready...")
-        await self.bot.wait_until_ready()
-
-    def get_user_current_time(self):
-        return time_utils.now(self.bot.config.time_zone)
-
-    def _get_rainy_forecast_tomorrow(self):
-        user_current_time = self.get_user_current_time()
-        time_period = TimePeriod.from_full_days(
-            current_time=user_current_time + timedelta(days=1), num_days=1
+        # Edited when the forecast changes
+        await self.bot.container.alert_updater.track(
+            self.bot.config.target_guild_id,
+            message.channel.id,
+            message.id,
+            self._get_coordinates(),
+            self.bot.config.time_zone,
         )
-        time_period = time_period.as_utc()
 
-        query = RainyForecastPeriodQuery(
-            time_period=time_period,
-            coordinates=Coordinates(lat=self.bot.config.lat, lon=self.bot.config.lon),
+    # Rain starting within the hour at the target location
+    async def _send_nowcast_alert(self, embed: discord.Embed):
+        await self.bot.wait_until_guild_ready(self.bot.config.target_guild_id)
+        if self.bot.target_channel is None:
+            return  # XXX: Unexpected
+        target_channel = self.bot.target_channel
+        await self.bot.container.outbound.send(
+            target_channel.id,
+            Priority.ALERT,
+            "nowcast",
+            lambda: target_channel.send(embed=embed),
         )
-        forecast = self.bot.container.weather_service.get_rainy_forecast(query)
 
-        if not forecast:
-            return None, None
+    async def _get_rainy_forecast_tomorrow_embed(self) -> discord.Embed | None:
+        return await self.bot.container.rain_alert_service.create_embed(
+            self._get_coordinates(),
+            self.bot.config.time_zone,
+        )
 
-        symbol_time = time_utils.as_utc(
-            time_utils.at_hour(8, user_current_time)
-        ) + timedelta(days=1)
+    def _get_coordinates(self) -> Coordinates:
+        return Coordinates(lat=self.bot.config.lat, lon=self.bot.config.lon)
 
-        # Get forecast symbol as of 8am tomorrow (user time) to best describe the weather of the day
-        forecast_symbol = self.bot.container.weather_service.get_forecast_symbol_code(
-            from_time=symbol_time,
-            coordinates=query.coordinates,
-        )
 
-        return forecast, forecast_symbol
+def _to_response(embed: discord.Embed | None) -> interactions.Response:
+    return (
+        interactions.Response(embed=embed)
+        if embed
+        else interactions.Response(NO_RAIN_MESSAGE)
+    )
 
 
 async def setup(bot: WeatherBot):
-    await bot.add_cog(RainyForecast(bot))
+    # Commands are added to the target guild only, such that they are synced instantly
+    await bot.add_cog(
+        RainyForecast(bot), guild=discord.Object(id=bot.config.target_guild_id)
+    )
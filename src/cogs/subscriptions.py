@@ -0,0 +1,239 @@
+import logging
+from datetime import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from src.bot import WeatherBot
+from src.models import Coordinates
+from src.outbound import Priority
+from src.scheduler import DailyJob
+from src.subscriptions import Subscription
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_JOB_KIND = "subscription"
+
+
+# Lets channels and users subscribe to the daily rainy forecast for their own location
+class Subscriptions(commands.Cog):
+    def __init__(self, bot: WeatherBot):
+        self.bot = bot
+        self.store = bot.container.subscription_store
+        self.scheduler = bot.container.scheduler
+        self.prefetcher = bot.container.prefetcher
+        self.nowcast_alerter = bot.container.nowcast_alerter
+        self.scheduler.register_handler(SUBSCRIPTION_JOB_KIND, self.subscription_job)
+        # Only the subscriptions of guilds on the shards of this process
+        subscriptions = [
+            subscription
+            for subscription in self.store.get_all()
+            if bot.owns_guild(subscription.guild_id)
+        ]
+        for subscription in subscriptions:
+            self._schedule(subscription)
+        logger.info(f"Scheduled {len(subscriptions)} subscriptions")
+
+    @app_commands.command(
+        description="Get notified if it's going to rain tomorrow at a location",
+        name="subscribe",
+    )
+    @app_commands.describe(
+        latitude="Latitude of the location",
+        longitude="Longitude of the location",
+        notify_time="Time of day to get notified. Format: HH:MM",
+        time_zone="IANA time zone, e.g. Europe/Berlin",
+        direct_message="Send the alert as a direct message instead of to this channel",
+        nowcast="Also get notified when rain starts within the next hour",
+    )
+    async def subscribe(
+        self,
+        interaction: discord.Interaction,
+        latitude: app_commands.Range[float, -90, 90],
+        longitude: app_commands.Range[float, -180, 180],
+        notify_time: str,
+        time_zone: str,
+        direct_message: bool = False,
+        nowcast: bool = False,
+    ) -> None:
+        try:
+            notify_time_of_day = time.fromisoformat(notify_time)
+        except ValueError:
+            await interaction.response.send_message(
+                f"Invalid time '{notify_time}'. Use the format HH:MM", ephemeral=True
+            )
+            return
+        try:
+            zone_info = ZoneInfo(time_zone)
+        except (ZoneInfoNotFoundError, ValueError):
+            await interaction.response.send_message(
+                f"Unknown time zone '{time_zone}'", ephemeral=True
+            )
+            return
+
+        subscription = self.store.add(
+            Coordinates(latitude, longitude),
+            zone_info,
+            notify_time_of_day,
+            guild_id=interaction.guild_id,
+            channel_id=None if direct_message else interaction.channel_id,
+            user_id=interaction.user.id if direct_message else None,
+            nowcast=nowcast,
+        )
+        self._schedule(subscription)
+        message = f"Subscribed! {_describe(subscription)}"
+        if nowcast and self.nowcast_alerter is None:
+            message += "\nNB: Nowcast alerts are disabled for this bot"
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @app_commands.command(
+        description="Stop getting notified for a subscription",
+        name="unsubscribe",
+    )
+    @app_commands.describe(subscription_id="Id of the subscription")
+    async def unsubscribe(
+        self, interaction: discord.Interaction, subscription_id: int
+    ) -> None:
+        subscription = self.store.get(subscription_id)
+        # Only allow removing subscriptions of this channel or of the user itself
+        if subscription is None or (
+            subscription.channel_id != interaction.channel_id
+            and subscription.user_id != interaction.user.id
+        ):
+            await interaction.response.send_message(
+                f"No subscription with id {subscription_id} found", ephemeral=True
+            )
+            return
+
+        self.store.remove(subscription_id)
+        self._unschedule(subscription)
+        await interaction.response.send_message(
+            f"Unsubscribed from {subscription_id}", ephemeral=True
+        )
+
+    @app_commands.command(
+        description="List subscriptions of this channel and your direct messages",
+        name="subscriptions",
+    )
+    async def list_subscriptions(self, interaction: discord.Interaction) -> None:
+        subscriptions = self.store.get_for_user(interaction.user.id)
+        if interaction.channel_id is not None:
+            subscriptions = (
+                self.store.get_for_channel(interaction.channel_id) + subscriptions
+            )
+        if not subscriptions:
+            await interaction.response.send_message("No subscriptions", ephemeral=True)
+            return
+        lines = [_describe(subscription) for subscription in subscriptions]
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    def cog_unload(self):
+        for subscription in self.store.get_all():
+            self._unschedule(subscription)
+        return super().cog_unload()
+
+    # Sends the rainy forecast to subscribers whose notify time is now
+    async def subscription_job(self, jobs: list[DailyJob]):
+        due_subscriptions = self.store.get_many([job.key[1] for job in jobs])
+        await self.bot.container.rain_alert_service.send_alerts(
+            due_subscriptions, self._send_alert
+        )
+
+    def _schedule(self, subscription: Subscription):
+        self.scheduler.add(_to_job(subscription))
+        self.prefetcher.add(
+            subscription.id,
+            subscription.coordinates,
+            subscription.time_zone,
+            subscription.notify_time,
+        )
+        if subscription.nowcast and self.nowcast_alerter:
+            self.nowcast_alerter.watch(
+                (SUBSCRIPTION_JOB_KIND, subscription.id),
+                subscription.coordinates,
+                subscription.time_zone,
+                lambda embed: self._send_nowcast_alert(subscription, embed),
+            )
+
+    def _unschedule(self, subscription: Subscription):
+        self.scheduler.cancel(_to_job(subscription).key)
+        self.prefetcher.remove(subscription.id)
+        if self.nowcast_alerter:
+            self.nowcast_alerter.unwatch((SUBSCRIPTION_JOB_KIND, subscription.id))
+
+    async def _send_alert(self, subscription: Subscription, embed: discord.Embed):
+        # Not waiting for all shards, such that a slow shard only delays its own alerts
+        await self.bot.wait_until_guild_ready(subscription.guild_id)
+        message = await self.bot.container.outbound.send(
+            subscription.target_id,
+            Priority.ALERT,
+            "alert",
+            lambda: self._send_to_subscriber(subscription, embed),
+        )
+        # Edited when the forecast changes
+        await self.bot.container.alert_updater.track(
+            subscription.guild_id,
+            message.channel.id,
+            message.id,
+            subscription.coordinates,
+            subscription.time_zone,
+        )
+
+    # Rain starting within the hour at the location of the subscription
+    async def _send_nowcast_alert(
+        self, subscription: Subscription, embed: discord.Embed
+    ):
+        await self.bot.wait_until_guild_ready(subscription.guild_id)
+        await self.bot.container.outbound.send(
+            subscription.target_id,
+            Priority.ALERT,
+            "nowcast",
+            lambda: self._send_to_subscriber(subscription, embed),
+        )
+
+    async def _send_to_subscriber(
+        self, subscription: Subscription, embed: discord.Embed
+    ) -> discord.Message:
+        if subscription.channel_id is not None:
+            channel = self.bot.get_channel(
+                subscription.channel_id
+            ) or await self.bot.fetch_channel(subscription.channel_id)
+            if not isinstance(channel, discord.abc.Messageable):
+                raise Exception(
+                    f"Channel is not a text channel (id: {subscription.channel_id})"
+                )
+            return await channel.send(embed=embed)
+        elif subscription.user_id is not None:
+            user = self.bot.get_user(subscription.user_id) or await self.bot.fetch_user(
+                subscription.user_id
+            )
+            return await user.send(embed=embed)
+        raise Exception(f"Subscription has no target (id: {subscription.id})")
+
+
+def _to_job(subscription: Subscription) -> DailyJob:
+    return DailyJob(
+        key=(SUBSCRIPTION_JOB_KIND, subscription.id),
+        time_zone=subscription.time_zone,
+        time_of_day=subscription.notify_time,
+    )
+
+
+def _describe(subscription: Subscription) -> str:
+    target = (
+        f"<#{subscription.channel_id}>" if subscription.channel_id else "direct message"
+    )
+    nowcast = " + rain within the hour (nowcast)" if subscription.nowcast else ""
+    return (
+        f"**{subscription.id}**: {subscription.coordinates.lat}, {subscription.coordinates.lon}"
+        f" at {subscription.notify_time.strftime('%H:%M')} ({subscription.time_zone.key}) to {target}{nowcast}"
+    )
+
+
+async def setup(bot: WeatherBot):
+    # Commands are added to the target guild only, such that they are synced instantly
+    await bot.add_cog(
+        Subscriptions(bot), guild=discord.Object(id=bot.config.target_guild_id)
+    )
@@ -1,17 +1,16 @@
-import argparse
 import logging
 from datetime import time
 from pathlib import Path
-from typing import Any
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
 from pydantic import BaseSettings, Field, validator  # type: ignore
 
-from src import time_utils
-
 logger = logging.getLogger(__name__)
 
+YR_BASE_URL = "https://api.met.no/weatherapi/locationforecast/2.0/"
+YR_NOWCAST_BASE_URL = "https://api.met.no/weatherapi/nowcast/2.0/"
+
 
 class AppConfig(BaseSettings):
     bot_token: str = Field(..., env="BOT_TOKEN")
@@ -22,25 +21,61 @@ class AppConfig(BaseSettings):
     lon: float = Field(..., env="LON")
     time_zone: ZoneInfo = Field(..., env="TIME_ZONE")
     notify_time: time = Field(..., env="NOTIFY_TIME_OF_DAY")
+    prefetch_lead_minutes: int = Field(10, env="PREFETCH_LEAD_MINUTES")
+    metrics_port: int | None = Field(None, env="METRICS_PORT")
+    metrics_host: str = Field("127.0.0.1", env="METRICS_HOST")
+    yr_base_url: str = Field(YR_BASE_URL, env="YR_BASE_URL")
+    # Sharding. Default: The number of shards recommended by discord, all run by this process
+    shard_count: int | None = Field(None, env="SHARD_COUNT")
+    # Shards run by this process, e.g. [0, 1]. Requires SHARD_COUNT
+    shard_ids: list[int] | None = Field(None, env="SHARD_IDS")
+    # Unix sockets of forecast workers (see forecast_worker.py), e.g. ["./data/forecast_worker.sock"].
+    # Default: Forecasts are fetched and parsed by the bot process
+    forecast_worker_sockets: list[str] | None = Field(
+        None, env="FORECAST_WORKER_SOCKETS"
+    )
+    # Minutes between nowcast polls of each watched location. Default: No nowcast alerts
+    nowcast_interval_minutes: int | None = Field(None, env="NOWCAST_INTERVAL_MINUTES")
+    yr_nowcast_base_url: str = Field(YR_NOWCAST_BASE_URL, env="YR_NOWCAST_BASE_URL")
+    # Locations in the same geohash cell of this precision share a forecast (see LocationBuckets). Default: Only rounded to 4 decimals
+    forecast_geohash_precision: int | None = Field(
+        None, env="FORECAST_GEOHASH_PRECISION"
+    )
 
     @validator("time_zone", pre=True)
     def parse_timezone(cls, value: str):
         return ZoneInfo(value)
 
+    # Local time of day in the time zone
     @validator("notify_time", pre=True)
-    def parse_notify_time(cls, value: str, values: dict[str, Any]):
-        return time_utils.parse_time_str(value, values["time_zone"])
+    def parse_notify_time(cls, value: str):
+        return time.fromisoformat(value)
 
 
-def load_config() -> AppConfig:
-    logger.info("Loading config...")
-    ap = argparse.ArgumentParser()
-    ap.add_argument(
-        "-e", "--env", required=False, help="Path of .env file", default=".env"
+# Config of a forecast worker process. Only needs to reach YR, i.e. not Discord.
+# The socket and metrics port are given as arguments instead, as they differ between the workers sharing the env file
+class WorkerConfig(BaseSettings):
+    yr_base_url: str = Field(YR_BASE_URL, env="YR_BASE_URL")
+    forecast_geohash_precision: int | None = Field(
+        None, env="FORECAST_GEOHASH_PRECISION"
     )
-    args = vars(ap.parse_args())
 
-    env_path = Path(args["env"]).absolute()
+
+# Loads the config from the environment. Variables in the env file (if it exists) are loaded into the environment first
+def load_config(env: str = ".env") -> AppConfig:
+    _load_env(env)
+    config = AppConfig()  # type: ignore
+    return config
+
+
+def load_worker_config(env: str = ".env") -> WorkerConfig:
+    _load_env(env)
+    return WorkerConfig()  # type: ignore
+
+
+def _load_env(env: str):
+    logger.info("Loading config...")
+    env_path = Path(env).absolute()
     if Path(env_path).exists():
         logger.info(f"env file found: '{env_path}'")
         # Load into environment
@@ -50,9 +85,3 @@ def load_config() -> AppConfig:
         logger.info(
             f"No env file found at '{env_path}'. Assuming environment variables are set."
         )
-
-    config = AppConfig()  # type: ignore
-    return config
-
-
-app_config = load_config()
@@ -1,12 +1,39 @@
 from typing import NamedTuple
 
+from src.alert_updates import AlertUpdater
 from src.config import AppConfig
-from src.weather_client import YrWeatherClient
+from src.forecast_worker import (
+    ForecastWorkerClient,
+    RemoteGeocoder,
+    RemoteWeatherService,
+)
+from src.geocoding import ReverseGeocoder
+from src.nowcast_alerts import NowcastAlerter
+from src.outbound import OutboundQueue
+from src.prefetcher import ForecastPrefetcher
+from src.rain_alerts import RainAlertService
+from src.response_cache import ResponseCache
+from src.scheduler import DailyScheduler
+from src.subscriptions import SubscriptionStore
+from src.weather_client import AsyncYrWeatherClient, YrWeatherClient
 from src.weather_service import WeatherService
 
 
 # Service container
 class Container(NamedTuple):
-    weather_service: WeatherService
-    weather_client: YrWeatherClient
+    weather_service: WeatherService | RemoteWeatherService
+    # None when the forecasts are served by forecast workers
+    weather_client: YrWeatherClient | None
+    # Only used for nowcasts when the forecasts are served by forecast workers
+    async_weather_client: AsyncYrWeatherClient | None
+    response_cache: ResponseCache | None
+    geocoder: ReverseGeocoder | RemoteGeocoder
+    subscription_store: SubscriptionStore
+    rain_alert_service: RainAlertService
+    alert_updater: AlertUpdater
+    outbound: OutboundQueue
+    scheduler: DailyScheduler
+    prefetcher: ForecastPrefetcher
+    forecast_worker: ForecastWorkerClient | None
+    nowcast_alerter: NowcastAlerter | None  # None when nowcast alerts are disabled
     config: AppConfig
@@ -0,0 +1,120 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import numpy.typing as npt
+
+from src.forecast_table import ForecastTable
+from src.models import DailyForecast
+
+logger = logging.getLogger(__name__)
+
+HOUR_SECONDS = 3600
+SYMBOL_HOUR = 8  # Like the daily alert, the weather of the day is described by the 12 hour symbol from 8am
+
+
+# Aggregates the forecast per day (in the given time zone), starting from 'first_day'. Days not covered by the forecast are omitted.
+# All days are aggregated at once using the columns of the table, i.e. the cost hardly depends on the number of days:
+# - Each time step covers the next hour if available (hourly time steps), otherwise the next 6 hours (later time steps of the forecast)
+# - A time step crossing midnight is split between the days, with the amount spread evenly over its hours
+def aggregate_days(
+    table: ForecastTable, time_zone: ZoneInfo, first_day: date, num_days: int
+) -> list[DailyForecast]:
+    days = [first_day + timedelta(days=i) for i in range(num_days + 1)]
+    # Start of each day and the end of the last day
+    boundaries = np.array(
+        [_to_timestamp(day, time(0), time_zone) for day in days], dtype=np.int64
+    )
+
+    has_1h = ~np.isnan(table.precipitation_amount)
+    has_6h = ~np.isnan(table.precipitation_amount_6h)
+    hours = np.where(has_1h, 1, np.where(has_6h, 6, 0))
+    amount = np.where(has_1h, table.precipitation_amount, table.precipitation_amount_6h)
+    amount_per_hour = np.where(hours > 0, amount / np.maximum(hours, 1), 0.0)
+    probability = np.where(
+        has_1h,
+        table.probability_of_precipitation,
+        table.probability_of_precipitation_6h,
+    )
+
+    # Index of the day each time step starts in, shifted by one such that time steps before the first day are at 0
+    start_index = np.searchsorted(boundaries, table.times, "right")
+    end_of_start_day = boundaries[np.minimum(start_index, num_days)]
+    # Hours within the start day. The rest is within the next day
+    first_hours = np.clip(
+        (end_of_start_day - table.times) / HOUR_SECONDS, 0, hours
+    ).astype(np.float64)
+    second_hours = hours - first_hours
+
+    def per_day(first: npt.NDArray[np.float64], second: npt.NDArray[np.float64]):
+        totals = np.bincount(start_index, first, num_days + 2)
+        totals += np.bincount(start_index + 1, second, num_days + 3)[: num_days + 2]
+        return totals[1 : num_days + 1]
+
+    covered_hours = per_day(first_hours, second_hours)
+    total_amount = per_day(
+        amount_per_hour * first_hours, amount_per_hour * second_hours
+    )
+    is_rainy = amount_per_hour > 0
+    rainy_hours = per_day(first_hours * is_rainy, second_hours * is_rainy)
+    max_amount = _max_per_day(
+        start_index, first_hours, second_hours, amount_per_hour, num_days, 0.0
+    )
+    max_probability = _max_per_day(
+        start_index, first_hours, second_hours, probability, num_days, np.nan
+    )
+    symbol_codes = _get_symbol_codes(table, days[:-1], time_zone)
+
+    return [
+        DailyForecast(
+            date=day,
+            hours=round(covered_hours[i]),
+            precipitation_amount=round(float(total_amount[i]), 1),
+            max_precipitation_amount=round(float(max_amount[i]), 1),
+            max_probability=(
+                None if np.isnan(max_probability[i]) else float(max_probability[i])
+            ),
+            rainy_hours=round(rainy_hours[i]),
+            symbol_code=symbol_codes[i],
+        )
+        for i, day in enumerate(days[:-1])
+        if covered_hours[i] > 0
+    ]
+
+
+# Max of the values of the time steps within each day (NaN values ignored)
+def _max_per_day(
+    start_index: npt.NDArray[np.intp],
+    first_hours: npt.NDArray[np.float64],
+    second_hours: npt.NDArray[np.float64],
+    values: npt.NDArray[np.float64],
+    num_days: int,
+    initial: float,
+) -> npt.NDArray[np.float64]:
+    result = np.full(num_days + 3, initial, dtype=np.float64)
+    in_first = first_hours > 0
+    np.fmax.at(result, start_index[in_first], values[in_first])
+    in_second = second_hours > 0
+    np.fmax.at(result, start_index[in_second] + 1, values[in_second])
+    return result[1 : num_days + 1]
+
+
+# The 12 hour symbol from SYMBOL_HOUR of each day (or the next time step after), else the next hour symbol
+def _get_symbol_codes(
+    table: ForecastTable, days: list[date], time_zone: ZoneInfo
+) -> list[str | None]:
+    symbol_times = [_to_timestamp(day, time(SYMBOL_HOUR), time_zone) for day in days]
+    indices = np.searchsorted(table.times, symbol_times, "left").tolist()
+    return [
+        (
+            (table.symbol_code_12h(index) or table.symbol_code_1h(index))
+            if index < len(table)
+            else None
+        )
+        for index in indices
+    ]
+
+
+def _to_timestamp(day: date, time_of_day: time, time_zone: ZoneInfo) -> int:
+    return int(datetime.combine(day, time_of_day, tzinfo=time_zone).timestamp())
@@ -1,14 +1,18 @@
 import logging
 from datetime import datetime, timedelta
-from typing import Any
 from zoneinfo import ZoneInfo
 
 import discord
-import geopy  # type: ignore
-from geopy.geocoders import Nominatim  # type: ignore
 
-from src import time_utils
-from src.models import RainyForecastHour, RainyForecastPeriod
+from src import metrics, time_utils
+from src.models import (
+    Coordinates,
+    DailyForecast,
+    DailyForecastPeriod,
+    RainOnset,
+    RainyForecastHour,
+    RainyForecastPeriod,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,8 +27,13 @@ UNKOWN_EMOJI = "❓"
 
 
 # Returns rainy forecast embed
+@metrics.EMBED_RENDER_SECONDS.time(message="rainy_forecast_tomorrow")
 def rainy_weather_forecast_tomorrow(
-    forecast: RainyForecastPeriod, forecast_symbol: str, user_time_zone: ZoneInfo
+    forecast: RainyForecastPeriod,
+    forecast_symbol: str,
+    user_time_zone: ZoneInfo,
+    city: str | None,
+    title: str = "Rain tomorrow! ☔",
 ) -> discord.Embed:
     if not forecast.forecast_hours:
         return discord.Embed(
@@ -33,22 +42,15 @@ def rainy_weather_forecast_tomorrow(
             color=0x76CCFA,
         )
 
-    geolocator = Nominatim(user_agent="weather-bot")
-    location: geopy.Location = geolocator.reverse(f"{forecast.coordinates.lat}, {forecast.coordinates.lon}")  # type: ignore
-    city: str = _extract_city(location) or "Unknown"
-
     updated_at_local = time_utils.as_time_zone(forecast.updated_at, user_time_zone)
 
     weather_code_line = f"**Summary:** {forecast_symbol}\n"
     forecast_message = _create_rainy_hours_message_simple(
         forecast.forecast_hours, user_time_zone
     )
-    location_line = f"Location: {city} ({forecast.coordinates.lat:.2f}, {forecast.coordinates.lon:.2f})\n"
-    updated_line = f"Updated: {updated_at_local.strftime('%Y-%m-%d %H:%M:%S')}\n"
 
-    title = f"Rain tomorrow! ☔"
     description = weather_code_line + forecast_message
-    footer = location_line + updated_line
+    footer = _create_footer(forecast.coordinates, city, updated_at_local)
 
     embed = discord.Embed(
         title=title,
@@ -59,20 +61,66 @@ def rainy_weather_forecast_tomorrow(
     return embed
 
 
-# Given a Geopy Location object, attempt to extract the city or the closest equivalent.
-def _extract_city(location: geopy.Location) -> str | None:
-    # Order of preference for the city name
-    city_keys = ["city", "town", "village", "hamlet", "suburb", "county", "state"]
+# Returns embed with the forecast of each day
+@metrics.EMBED_RENDER_SECONDS.time(message="daily_forecast")
+def daily_forecast(
+    forecast: DailyForecastPeriod,
+    user_time_zone: ZoneInfo,
+    city: str | None,
+) -> discord.Embed:
+    updated_at_local = time_utils.as_time_zone(forecast.updated_at, user_time_zone)
+    lines = [_create_day_line(day) for day in forecast.days]
+    embed = discord.Embed(
+        title=f"Forecast for the next {len(forecast.days)} days",
+        description="\n".join(lines) if lines else "No forecast available",
+        color=0x76CCFA,
+    )
+    embed.set_footer(text=_create_footer(forecast.coordinates, city, updated_at_local))
+    return embed
 
-    # Get the raw OSM data
-    osm_data: dict[str, Any] = location.raw  # type: ignore
 
-    # Check for the city name in the OSM data
-    for key in city_keys:
-        if key in osm_data["address"]:
-            return osm_data["address"][key]  # type: ignore
-    # If no city name was found, return None
-    return None
+# Returns a short embed warning of rain starting soon
+@metrics.EMBED_RENDER_SECONDS.time(message="rain_onset")
+def rain_onset(
+    onset: RainOnset, user_time_zone: ZoneInfo, city: str | None
+) -> discord.Embed:
+    minutes = max(0, round((onset.time - time_utils.utc_now()).total_seconds() / 60))
+    onset_local = time_utils.as_time_zone(onset.time, user_time_zone)
+    updated_at_local = time_utils.as_time_zone(onset.updated_at, user_time_zone)
+    embed = discord.Embed(
+        title=f"Rain in {minutes} minutes! ☔",
+        description=f"{RAIN_EMOJI} From {onset_local.strftime('%H:%M')}, up to {onset.max_precipitation_rate:.1f} mm/h",
+        color=0x76CCFA,
+    )
+    embed.set_footer(text=_create_footer(onset.coordinates, city, updated_at_local))
+    return embed
+
+
+def _create_day_line(day: DailyForecast) -> str:
+    line = f"**{day.date.strftime('%a %d/%m')}** {day.symbol_code or ''} - "
+    if day.precipitation_amount <= 0:
+        return line + "No rain 😎"
+
+    details = [f"max {day.max_precipitation_amount} mm/h"]
+    if day.max_probability is not None:
+        details.append(f"{day.max_probability:.0f}%")
+    line += f"{day.precipitation_amount} mm ({', '.join(details)}), {day.rainy_hours} rainy hours"
+    if day.symbol_code:
+        line += f" {_precipitation_symbol_to_emoji(day.symbol_code)}"
+    return line
+
+
+def _create_footer(
+    coordinates: Coordinates, city: str | None, updated_at_local: datetime
+) -> str:
+    coordinates_str = f"{coordinates.lat:.2f}, {coordinates.lon:.2f}"
+    location_line = (
+        f"Location: {city} ({coordinates_str})\n"
+        if city
+        else f"Location: {coordinates_str}\n"
+    )
+    updated_line = f"Updated: {updated_at_local.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    return location_line + updated_line
 
 
 def _create_rainy_hours_message_simple(
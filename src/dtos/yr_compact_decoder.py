@@ -0,0 +1,119 @@
+# pyright: basic
+
+# Fast decoder for the YR "compact" response. Produces the same objects as YrCompactResponse.from_dict (see yr_complete_decoder.py)
+
+from typing import Any, Optional
+
+from src.dtos.yr_compact_response import (
+    Data,
+    Details,
+    ForecastTimeStep,
+    Instant,
+    InstantDetails,
+    Meta,
+    Next1_Hours,
+    Next6_Hours,
+    Next12_Hours,
+    Properties,
+    Summary,
+    Units,
+    YrCompactResponse,
+)
+from src.dtos.yr_complete_decoder import parse_timestamp
+from src.dtos.yr_complete_response import Geometry, from_float, from_str
+
+UNITS_FIELDS = tuple(Units.__dataclass_fields__)
+INSTANT_DETAILS_FIELDS = tuple(InstantDetails.__dataclass_fields__)
+
+
+def decode_compact_response(obj: Any) -> YrCompactResponse:
+    assert isinstance(obj, dict)
+    geometry = obj["geometry"]
+    properties = obj["properties"]
+    return YrCompactResponse(
+        from_str(obj.get("type")),
+        Geometry(
+            from_str(geometry.get("type")),
+            [from_float(c) for c in geometry["coordinates"]],
+        ),
+        Properties(
+            decode_meta(properties["meta"]),
+            [decode_time_step(step) for step in properties["timeseries"]],
+        ),
+    )
+
+
+def decode_meta(obj: Any) -> Meta:
+    units = obj["units"]
+    return Meta(
+        parse_timestamp(obj["updated_at"]),
+        Units(*(_optional_str(units.get(field)) for field in UNITS_FIELDS)),
+    )
+
+
+def decode_time_step(obj: Any) -> ForecastTimeStep:
+    data = obj["data"]
+    instant_details = data["instant"]["details"]
+    next_12_hours = data.get("next_12_hours")
+    next_1_hours = data.get("next_1_hours")
+    next_6_hours = data.get("next_6_hours")
+    return ForecastTimeStep(
+        parse_timestamp(obj["time"]),
+        Data(
+            Instant(
+                InstantDetails(
+                    *(
+                        _optional_float(instant_details.get(field))
+                        for field in INSTANT_DETAILS_FIELDS
+                    )
+                )
+            ),
+            (
+                Next12_Hours(_decode_summary(next_12_hours["summary"]))
+                if next_12_hours is not None
+                else None
+            ),
+            (
+                Next1_Hours(
+                    _decode_summary(next_1_hours["summary"]),
+                    _decode_details(next_1_hours["details"]),
+                )
+                if next_1_hours is not None
+                else None
+            ),
+            (
+                Next6_Hours(
+                    _decode_summary(next_6_hours["summary"]),
+                    _decode_details(next_6_hours["details"]),
+                )
+                if next_6_hours is not None
+                else None
+            ),
+        ),
+    )
+
+
+def _decode_summary(obj: Any) -> Summary:
+    return Summary(from_str(obj["symbol_code"]))
+
+
+def _decode_details(obj: Any) -> Details:
+    assert isinstance(obj, dict)
+    get = obj.get
+    return Details(
+        _optional_float(get("air_temperature_max")),
+        _optional_float(get("air_temperature_min")),
+        _optional_float(get("precipitation_amount")),
+    )
+
+
+def _optional_float(x: Any) -> Optional[float]:
+    if x is None or type(x) is float:
+        return x
+    return from_float(x)
+
+
+def _optional_str(x: Any) -> Optional[str]:
+    if x is None:
+        return x
+    return from_str(x)
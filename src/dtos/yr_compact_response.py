@@ -0,0 +1,257 @@
+# pyright: basic
+
+# DTO of the YR "compact" response. Same structure and attribute names as YrCompleteResponse, but with fewer fields,
+# i.e. no uncertainty (min, max, percentiles and probabilities) of the forecast
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional
+
+from src.dtos.yr_complete_response import (
+    Geometry,
+    from_datetime,
+    from_float,
+    from_list,
+    from_none,
+    from_str,
+    from_union,
+)
+
+
+@dataclass
+class Units:
+    air_pressure_at_sea_level: Optional[str] = None
+    air_temperature: Optional[str] = None
+    cloud_area_fraction: Optional[str] = None
+    precipitation_amount: Optional[str] = None
+    relative_humidity: Optional[str] = None
+    wind_from_direction: Optional[str] = None
+    wind_speed: Optional[str] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Units":
+        assert isinstance(obj, dict)
+        air_pressure_at_sea_level = from_union(
+            [from_str, from_none], obj.get("air_pressure_at_sea_level")
+        )
+        air_temperature = from_union([from_str, from_none], obj.get("air_temperature"))
+        cloud_area_fraction = from_union(
+            [from_str, from_none], obj.get("cloud_area_fraction")
+        )
+        precipitation_amount = from_union(
+            [from_str, from_none], obj.get("precipitation_amount")
+        )
+        relative_humidity = from_union(
+            [from_str, from_none], obj.get("relative_humidity")
+        )
+        wind_from_direction = from_union(
+            [from_str, from_none], obj.get("wind_from_direction")
+        )
+        wind_speed = from_union([from_str, from_none], obj.get("wind_speed"))
+        return Units(
+            air_pressure_at_sea_level,
+            air_temperature,
+            cloud_area_fraction,
+            precipitation_amount,
+            relative_humidity,
+            wind_from_direction,
+            wind_speed,
+        )
+
+
+@dataclass
+class Meta:
+    updated_at: datetime
+    units: Units
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Meta":
+        assert isinstance(obj, dict)
+        updated_at = from_datetime(obj.get("updated_at"))
+        units = Units.from_dict(obj.get("units"))
+        return Meta(updated_at, units)
+
+
+@dataclass
+class Summary:
+    symbol_code: str
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Summary":
+        assert isinstance(obj, dict)
+        symbol_code = from_str(obj.get("symbol_code"))
+        return Summary(symbol_code)
+
+
+@dataclass
+class Details:
+    # Maximum air temperature in period
+    air_temperature_max: Optional[float] = None
+    # Minimum air temperature in period
+    air_temperature_min: Optional[float] = None
+    # Best estimate for amount of precipitation for this period
+    precipitation_amount: Optional[float] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Details":
+        assert isinstance(obj, dict)
+        air_temperature_max = from_union(
+            [from_float, from_none], obj.get("air_temperature_max")
+        )
+        air_temperature_min = from_union(
+            [from_float, from_none], obj.get("air_temperature_min")
+        )
+        precipitation_amount = from_union(
+            [from_float, from_none], obj.get("precipitation_amount")
+        )
+        return Details(air_temperature_max, air_temperature_min, precipitation_amount)
+
+
+@dataclass
+class InstantDetails:
+    air_pressure_at_sea_level: Optional[float] = None
+    air_temperature: Optional[float] = None
+    cloud_area_fraction: Optional[float] = None
+    relative_humidity: Optional[float] = None
+    wind_from_direction: Optional[float] = None
+    wind_speed: Optional[float] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "InstantDetails":
+        assert isinstance(obj, dict)
+        air_pressure_at_sea_level = from_union(
+            [from_float, from_none], obj.get("air_pressure_at_sea_level")
+        )
+        air_temperature = from_union(
+            [from_float, from_none], obj.get("air_temperature")
+        )
+        cloud_area_fraction = from_union(
+            [from_float, from_none], obj.get("cloud_area_fraction")
+        )
+        relative_humidity = from_union(
+            [from_float, from_none], obj.get("relative_humidity")
+        )
+        wind_from_direction = from_union(
+            [from_float, from_none], obj.get("wind_from_direction")
+        )
+        wind_speed = from_union([from_float, from_none], obj.get("wind_speed"))
+        return InstantDetails(
+            air_pressure_at_sea_level,
+            air_temperature,
+            cloud_area_fraction,
+            relative_humidity,
+            wind_from_direction,
+            wind_speed,
+        )
+
+
+@dataclass
+class Instant:
+    details: InstantDetails
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Instant":
+        assert isinstance(obj, dict)
+        details = InstantDetails.from_dict(obj.get("details"))
+        return Instant(details)
+
+
+@dataclass
+class Next12_Hours:
+    summary: Summary
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Next12_Hours":
+        assert isinstance(obj, dict)
+        summary = Summary.from_dict(obj.get("summary"))
+        return Next12_Hours(summary)
+
+
+@dataclass
+class Next1_Hours:
+    summary: Summary
+    details: Details
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Next1_Hours":
+        assert isinstance(obj, dict)
+        summary = Summary.from_dict(obj.get("summary"))
+        details = Details.from_dict(obj.get("details"))
+        return Next1_Hours(summary, details)
+
+
+@dataclass
+class Next6_Hours:
+    summary: Summary
+    details: Details
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Next6_Hours":
+        assert isinstance(obj, dict)
+        summary = Summary.from_dict(obj.get("summary"))
+        details = Details.from_dict(obj.get("details"))
+        return Next6_Hours(summary, details)
+
+
+@dataclass
+class Data:
+    instant: Instant
+    next_12__hours: Optional[Next12_Hours] = None
+    next_1__hours: Optional[Next1_Hours] = None
+    next_6__hours: Optional[Next6_Hours] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Data":
+        assert isinstance(obj, dict)
+        instant = Instant.from_dict(obj.get("instant"))
+        next_12__hours = from_union(
+            [Next12_Hours.from_dict, from_none], obj.get("next_12_hours")
+        )
+        next_1__hours = from_union(
+            [Next1_Hours.from_dict, from_none], obj.get("next_1_hours")
+        )
+        next_6__hours = from_union(
+            [Next6_Hours.from_dict, from_none], obj.get("next_6_hours")
+        )
+        return Data(instant, next_12__hours, next_1__hours, next_6__hours)
+
+
+@dataclass
+class ForecastTimeStep:
+    time: datetime
+    data: Data
+
+    @staticmethod
+    def from_dict(obj: Any) -> "ForecastTimeStep":
+        assert isinstance(obj, dict)
+        time = from_datetime(obj.get("time"))
+        data = Data.from_dict(obj.get("data"))
+        return ForecastTimeStep(time, data)
+
+
+@dataclass
+class Properties:
+    meta: Meta
+    timeseries: List[ForecastTimeStep]
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Properties":
+        assert isinstance(obj, dict)
+        meta = Meta.from_dict(obj.get("meta"))
+        timeseries = from_list(ForecastTimeStep.from_dict, obj.get("timeseries"))
+        return Properties(meta, timeseries)
+
+
+@dataclass
+class YrCompactResponse:
+    type: str
+    geometry: Geometry
+    properties: Properties
+
+    @staticmethod
+    def from_dict(obj: Any) -> "YrCompactResponse":
+        assert isinstance(obj, dict)
+        type = from_str(obj.get("type"))
+        geometry = Geometry.from_dict(obj.get("geometry"))
+        properties = Properties.from_dict(obj.get("properties"))
+        return YrCompactResponse(type, geometry, properties)
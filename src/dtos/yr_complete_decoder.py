@@ -0,0 +1,147 @@
+# pyright: basic
+
+# Fast decoder for the YR "complete" response.
+# Produces the same objects as YrCompleteResponse.from_dict, but avoids the generic (and slow) conversion functions:
+# - Timestamps from YR always have the format "YYYY-MM-DDTHH:MM:SSZ" and are parsed by slicing instead of using dateutil
+# - Optional fields are checked for None directly instead of trying each type in from_union, which relies on exceptions
+
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from src.dtos.yr_complete_response import (
+    Data,
+    Details,
+    ForecastTimeStep,
+    Geometry,
+    Instant,
+    Meta,
+    Next1_Hours,
+    Next6_Hours,
+    Next12_Hours,
+    Properties,
+    Summary,
+    Units,
+    YrCompleteResponse,
+    from_datetime,
+    from_float,
+    from_str,
+)
+
+UNITS_FIELDS = tuple(Units.__dataclass_fields__)
+TIMESTAMP_LENGTH = len("2023-05-16T18:00:00Z")
+
+
+def decode_complete_response(obj: Any) -> YrCompleteResponse:
+    assert isinstance(obj, dict)
+    geometry = obj["geometry"]
+    properties = obj["properties"]
+    return YrCompleteResponse(
+        from_str(obj.get("type")),
+        Geometry(
+            from_str(geometry.get("type")),
+            [from_float(c) for c in geometry["coordinates"]],
+        ),
+        Properties(
+            decode_meta(properties["meta"]),
+            [decode_time_step(step) for step in properties["timeseries"]],
+        ),
+    )
+
+
+def decode_meta(obj: Any) -> Meta:
+    units = obj["units"]
+    return Meta(
+        parse_timestamp(obj["updated_at"]),
+        Units(*(_optional_str(units.get(field)) for field in UNITS_FIELDS)),
+    )
+
+
+def decode_time_step(obj: Any) -> ForecastTimeStep:
+    data = obj["data"]
+    next_12_hours = data.get("next_12_hours")
+    next_1_hours = data.get("next_1_hours")
+    next_6_hours = data.get("next_6_hours")
+    return ForecastTimeStep(
+        parse_timestamp(obj["time"]),
+        Data(
+            Instant(_decode_details(data["instant"]["details"])),
+            (
+                Next12_Hours(
+                    _decode_summary(next_12_hours["summary"]),
+                    _optional_details(next_12_hours.get("details")),
+                )
+                if next_12_hours is not None
+                else None
+            ),
+            (
+                Next1_Hours(
+                    _decode_summary(next_1_hours["summary"]),
+                    _decode_details(next_1_hours["details"]),
+                )
+                if next_1_hours is not None
+                else None
+            ),
+            (
+                Next6_Hours(
+                    # NB: Summary is decoded as details to match YrCompleteResponse.from_dict
+                    _decode_details(next_6_hours["summary"]),
+                    _optional_details(next_6_hours.get("details")),
+                )
+                if next_6_hours is not None
+                else None
+            ),
+        ),
+    )
+
+
+# Parses a timestamp in the fixed format used by YR. Falls back to dateutil for any other format
+def parse_timestamp(value: str) -> datetime:
+    if len(value) != TIMESTAMP_LENGTH or value[-1] != "Z":
+        return from_datetime(value)
+    return datetime(
+        int(value[0:4]),
+        int(value[5:7]),
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+        int(value[17:19]),
+        tzinfo=timezone.utc,
+    )
+
+
+def _decode_summary(obj: Any) -> Summary:
+    return Summary(
+        from_str(obj["symbol_code"]),
+        _optional_str(obj.get("symbol_confidence")),
+    )
+
+
+def _decode_details(obj: Any) -> Details:
+    assert isinstance(obj, dict)
+    get = obj.get
+    return Details(
+        _optional_float(get("air_temperature_max")),
+        _optional_float(get("air_temperature_min")),
+        _optional_float(get("precipitation_amount")),
+        _optional_float(get("precipitation_amount_max")),
+        _optional_float(get("precipitation_amount_min")),
+        _optional_float(get("probability_of_precipitation")),
+        _optional_float(get("probability_of_thunder")),
+        _optional_float(get("ultraviolet_index_clear_sky_max")),
+    )
+
+
+def _optional_details(obj: Any) -> Optional[Details]:
+    return _decode_details(obj) if obj is not None else None
+
+
+def _optional_float(x: Any) -> Optional[float]:
+    if x is None or type(x) is float:
+        return x
+    return from_float(x)
+
+
+def _optional_str(x: Any) -> Optional[str]:
+    if x is None:
+        return x
+    return from_str(x)
@@ -4,8 +4,6 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Callable, Dict, List, Optional, Type, TypeVar, cast
 
-import dateutil.parser
-
 T = TypeVar("T")
 
 
@@ -30,6 +28,8 @@ def to_float(x: Any) -> float:
 
 
 def from_datetime(x: Any) -> datetime:
+    import dateutil.parser  # Imported on first use, as it is slow to import
+
     return dateutil.parser.parse(x)
 
 
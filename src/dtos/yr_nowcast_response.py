@@ -0,0 +1,181 @@
+# pyright: basic
+
+# DTO of the YR nowcast response (https://api.met.no/weatherapi/nowcast/2.0/documentation).
+# Same structure as YrCompleteResponse, but with 5 minute time steps for the next 2 hours. Only the first time step has all the instant details and
+# the summary of the next hour, the other time steps only have the precipitation rate
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional
+
+from src.dtos.yr_complete_response import (
+    Geometry,
+    from_datetime,
+    from_float,
+    from_list,
+    from_none,
+    from_str,
+    from_union,
+)
+
+
+@dataclass
+class Units:
+    air_temperature: Optional[str] = None
+    precipitation_amount: Optional[str] = None
+    precipitation_rate: Optional[str] = None
+    relative_humidity: Optional[str] = None
+    wind_from_direction: Optional[str] = None
+    wind_speed: Optional[str] = None
+    wind_speed_of_gust: Optional[str] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Units":
+        assert isinstance(obj, dict)
+        return Units(
+            *(
+                from_union([from_str, from_none], obj.get(field))
+                for field in Units.__dataclass_fields__
+            )
+        )
+
+
+@dataclass
+class Meta:
+    updated_at: datetime
+    units: Units
+    # "ok", "temporarily unavailable" or "no coverage". The precipitation is only reliable if "ok"
+    radar_coverage: Optional[str] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Meta":
+        assert isinstance(obj, dict)
+        updated_at = from_datetime(obj.get("updated_at"))
+        units = Units.from_dict(obj.get("units"))
+        radar_coverage = from_union([from_str, from_none], obj.get("radar_coverage"))
+        return Meta(updated_at, units, radar_coverage)
+
+
+@dataclass
+class InstantDetails:
+    air_temperature: Optional[float] = None
+    # mm/h
+    precipitation_rate: Optional[float] = None
+    relative_humidity: Optional[float] = None
+    wind_from_direction: Optional[float] = None
+    wind_speed: Optional[float] = None
+    wind_speed_of_gust: Optional[float] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "InstantDetails":
+        assert isinstance(obj, dict)
+        return InstantDetails(
+            *(
+                from_union([from_float, from_none], obj.get(field))
+                for field in InstantDetails.__dataclass_fields__
+            )
+        )
+
+
+@dataclass
+class Instant:
+    details: InstantDetails
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Instant":
+        assert isinstance(obj, dict)
+        details = InstantDetails.from_dict(obj.get("details"))
+        return Instant(details)
+
+
+@dataclass
+class Summary:
+    symbol_code: str
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Summary":
+        assert isinstance(obj, dict)
+        symbol_code = from_str(obj.get("symbol_code"))
+        return Summary(symbol_code)
+
+
+@dataclass
+class Details:
+    precipitation_amount: Optional[float] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Details":
+        assert isinstance(obj, dict)
+        precipitation_amount = from_union(
+            [from_float, from_none], obj.get("precipitation_amount")
+        )
+        return Details(precipitation_amount)
+
+
+@dataclass
+class Next1_Hours:
+    summary: Summary
+    details: Details
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Next1_Hours":
+        assert isinstance(obj, dict)
+        summary = Summary.from_dict(obj.get("summary"))
+        details = Details.from_dict(obj.get("details"))
+        return Next1_Hours(summary, details)
+
+
+@dataclass
+class Data:
+    instant: Instant
+    next_1__hours: Optional[Next1_Hours] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Data":
+        assert isinstance(obj, dict)
+        instant = Instant.from_dict(obj.get("instant"))
+        next_1__hours = from_union(
+            [Next1_Hours.from_dict, from_none], obj.get("next_1_hours")
+        )
+        return Data(instant, next_1__hours)
+
+
+@dataclass
+class NowcastTimeStep:
+    time: datetime
+    data: Data
+
+    @staticmethod
+    def from_dict(obj: Any) -> "NowcastTimeStep":
+        assert isinstance(obj, dict)
+        time = from_datetime(obj.get("time"))
+        data = Data.from_dict(obj.get("data"))
+        return NowcastTimeStep(time, data)
+
+
+@dataclass
+class Properties:
+    meta: Meta
+    timeseries: List[NowcastTimeStep]
+
+    @staticmethod
+    def from_dict(obj: Any) -> "Properties":
+        assert isinstance(obj, dict)
+        meta = Meta.from_dict(obj.get("meta"))
+        timeseries = from_list(NowcastTimeStep.from_dict, obj.get("timeseries"))
+        return Properties(meta, timeseries)
+
+
+@dataclass
+class YrNowcastResponse:
+    type: str
+    geometry: Geometry
+    properties: Properties
+
+    @staticmethod
+    def from_dict(obj: Any) -> "YrNowcastResponse":
+        assert isinstance(obj, dict)
+        type = from_str(obj.get("type"))
+        geometry = Geometry.from_dict(obj.get("geometry"))
+        properties = Properties.from_dict(obj.get("properties"))
+        return YrNowcastResponse(type, geometry, properties)
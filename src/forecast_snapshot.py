@@ -0,0 +1,72 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from src import time_utils
+from src.forecast_table import ForecastTable
+from src.models import Coordinates
+
+logger = logging.getLogger(__name__)
+
+
+# When a forecast was updated by YR and fetched, and until when it is valid. Compact, i.e. without the forecast itself
+@dataclass(frozen=True)
+class ForecastInfo:
+    coordinates: Coordinates
+    updated_at: datetime
+    expires: datetime
+    fetched_at: datetime
+
+    def is_expired(self) -> bool:
+        return time_utils.utc_now() >= self.expires
+
+    # Time since the forecast was fetched from YR
+    def age(self) -> timedelta:
+        return time_utils.utc_now() - self.fetched_at
+
+
+# A parsed forecast for a location. Identified by the coordinates and the time YR last updated the forecast.
+# Valid until the YR response expires, i.e. all queries for the location within this window can share the same parsed forecast
+@dataclass(frozen=True)
+class ForecastSnapshot:
+    coordinates: Coordinates
+    updated_at: datetime
+    expires: datetime
+    fetched_at: datetime  # Last time the forecast was fetched (or revalidated) from YR
+    is_complete: bool  # From the complete endpoint, i.e. including the uncertainty of the forecast
+    table: ForecastTable
+    # Results of queries evaluated on this forecast, such that they are only evaluated once per forecast update
+    evaluations: dict[Any, Any] = field(default_factory=dict[Any, Any], compare=False)
+
+    def is_expired(self) -> bool:
+        return time_utils.utc_now() >= self.expires
+
+    # Time since the forecast was fetched from YR
+    def age(self) -> timedelta:
+        return time_utils.utc_now() - self.fetched_at
+
+    def info(self) -> ForecastInfo:
+        return ForecastInfo(
+            self.coordinates, self.updated_at, self.expires, self.fetched_at
+        )
+
+
+# Holds the latest snapshot for each location
+class ForecastSnapshotStore:
+    def __init__(self) -> None:
+        self._snapshots: dict[Coordinates, ForecastSnapshot] = {}
+
+    # Returns the snapshot for the location if not expired
+    def get(self, coordinates: Coordinates) -> ForecastSnapshot | None:
+        snapshot = self._snapshots.get(coordinates)
+        if snapshot is None or snapshot.is_expired():
+            return None
+        return snapshot
+
+    # Returns the snapshot for the location, even if expired
+    def get_latest(self, coordinates: Coordinates) -> ForecastSnapshot | None:
+        return self._snapshots.get(coordinates)
+
+    def set(self, snapshot: ForecastSnapshot):
+        self._snapshots[snapshot.coordinates] = snapshot
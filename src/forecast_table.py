@@ -0,0 +1,169 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+import numpy.typing as npt
+
+from src.dtos import yr_complete_response
+from src.dtos.yr_compact_response import YrCompactResponse
+from src.dtos.yr_complete_response import YrCompleteResponse
+from src.models import TimePeriod
+
+logger = logging.getLogger(__name__)
+
+NO_SYMBOL = -1  # Symbol code index used if no symbol is available for a time step
+
+
+# Columnar representation of the forecast timeseries, built once per forecast update such that queries do not need to loop over the time steps.
+# Each row is a time step, each column a metric of the next hour forecast (or next 12 hours for the symbol used to describe the weather from that time)
+# - Times are UTC epoch seconds, sorted in ascending order
+# - Missing precipitation values are NaN. The compact forecast has no min, max and probability of precipitation, so these are NaN for all rows
+# - The *_6h columns are of the next 6 hours. Later time steps of the forecast are 6 hours apart and only have these
+# - Symbol codes are stored as indices into 'symbols', NO_SYMBOL if missing
+@dataclass(frozen=True)
+class ForecastTable:
+    times: npt.NDArray[np.int64]
+    precipitation_amount: npt.NDArray[np.float64]
+    precipitation_amount_min: npt.NDArray[np.float64]
+    precipitation_amount_max: npt.NDArray[np.float64]
+    probability_of_precipitation: npt.NDArray[np.float64]
+    precipitation_amount_6h: npt.NDArray[np.float64]
+    probability_of_precipitation_6h: npt.NDArray[np.float64]
+    symbol_codes_1h: npt.NDArray[np.int16]
+    symbol_codes_12h: npt.NDArray[np.int16]
+    symbols: tuple[str, ...]
+
+    @staticmethod
+    def from_response(
+        response: YrCompleteResponse | YrCompactResponse,
+    ) -> "ForecastTable":
+        symbol_indices: dict[str, int] = {}
+
+        def symbol_index(symbol_code: str) -> int:
+            return symbol_indices.setdefault(symbol_code, len(symbol_indices))
+
+        times: list[int] = []
+        amount: list[float] = []
+        amount_min: list[float] = []
+        amount_max: list[float] = []
+        probability: list[float] = []
+        amount_6h: list[float] = []
+        probability_6h: list[float] = []
+        symbols_1h: list[int] = []
+        symbols_12h: list[int] = []
+        for forecast in response.properties.timeseries:
+            times.append(int(forecast.time.timestamp()))
+            next_1_hours = forecast.data.next_1__hours
+            if next_1_hours:
+                details = next_1_hours.details
+                amount.append(_nan_if_none(details.precipitation_amount))
+                if isinstance(details, yr_complete_response.Details):
+                    amount_min.append(_nan_if_none(details.precipitation_amount_min))
+                    amount_max.append(_nan_if_none(details.precipitation_amount_max))
+                    probability.append(
+                        _nan_if_none(details.probability_of_precipitation)
+                    )
+                else:
+                    amount_min.append(np.nan)
+                    amount_max.append(np.nan)
+                    probability.append(np.nan)
+                symbols_1h.append(symbol_index(next_1_hours.summary.symbol_code))
+            else:
+                amount.append(np.nan)
+                amount_min.append(np.nan)
+                amount_max.append(np.nan)
+                probability.append(np.nan)
+                symbols_1h.append(NO_SYMBOL)
+            next_6_hours = forecast.data.next_6__hours
+            details_6h = next_6_hours.details if next_6_hours else None
+            if details_6h:
+                amount_6h.append(_nan_if_none(details_6h.precipitation_amount))
+                probability_6h.append(
+                    _nan_if_none(details_6h.probability_of_precipitation)
+                    if isinstance(details_6h, yr_complete_response.Details)
+                    else np.nan
+                )
+            else:
+                amount_6h.append(np.nan)
+                probability_6h.append(np.nan)
+            next_12_hours = forecast.data.next_12__hours
+            symbols_12h.append(
+                symbol_index(next_12_hours.summary.symbol_code)
+                if next_12_hours
+                else NO_SYMBOL
+            )
+
+        return ForecastTable(
+            times=np.array(times, dtype=np.int64),
+            precipitation_amount=np.array(amount, dtype=np.float64),
+            precipitation_amount_min=np.array(amount_min, dtype=np.float64),
+            precipitation_amount_max=np.array(amount_max, dtype=np.float64),
+            probability_of_precipitation=np.array(probability, dtype=np.float64),
+            precipitation_amount_6h=np.array(amount_6h, dtype=np.float64),
+            probability_of_precipitation_6h=np.array(probability_6h, dtype=np.float64),
+            symbol_codes_1h=np.array(symbols_1h, dtype=np.int16),
+            symbol_codes_12h=np.array(symbols_12h, dtype=np.int16),
+            symbols=tuple(symbol_indices),
+        )
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    # Returns the rows within the time period (both ends inclusive)
+    def window(self, time_period: TimePeriod) -> slice:
+        start = np.searchsorted(self.times, time_period.start.timestamp(), "left")
+        end = np.searchsorted(self.times, time_period.end.timestamp(), "right")
+        return slice(int(start), int(end))
+
+    # Returns the index of the first row at or after the given time
+    def index_at(self, time: datetime) -> int:
+        index = int(np.searchsorted(self.times, time.timestamp(), "left"))
+        if index >= len(self.times):
+            raise Exception(f"No forecast found at or after {time}")
+        return index
+
+    def time_at(self, index: int) -> datetime:
+        return datetime.fromtimestamp(int(self.times[index]), tz=timezone.utc)
+
+    def symbol_code_1h(self, index: int) -> str | None:
+        return self._symbol(int(self.symbol_codes_1h[index]))
+
+    def symbol_code_12h(self, index: int) -> str | None:
+        return self._symbol(int(self.symbol_codes_12h[index]))
+
+    # Rows where the best estimate of the precipitation amount is above zero
+    def estimated_mask(self, rows: slice) -> npt.NDArray[np.bool_]:
+        # NB: Comparisons with NaN are always false, i.e. missing values are not rainy
+        return self.precipitation_amount[rows] > 0
+
+    # Rows with any amount of rain, even if low probability.
+    # precipitation_amount_max is not always available in the forecast, then use precipitation_amount instead
+    def any_amount_mask(self, rows: slice) -> npt.NDArray[np.bool_]:
+        amount_max = self.precipitation_amount_max[rows]
+        amount = np.where(
+            np.isnan(amount_max), self.precipitation_amount[rows], amount_max
+        )
+        return amount > 0
+
+    # Rows with a high probability of rain, i.e. where the symbol code is rain.
+    # XXX: Other possible values are "light_rain" and "heavy_rain" etc. Or set threshold for precipitation_amount?
+    def high_probability_mask(self, rows: slice) -> npt.NDArray[np.bool_]:
+        is_rain_symbol = np.array(
+            [False] + ["rain" in symbol for symbol in self.symbols], dtype=np.bool_
+        )
+        # Shift by one such that NO_SYMBOL maps to False
+        return is_rain_symbol[self.symbol_codes_1h[rows] + 1]
+
+    # Rows where the probability of precipitation is at least the given threshold (in percent)
+    def probability_mask(
+        self, rows: slice, min_probability: float
+    ) -> npt.NDArray[np.bool_]:
+        return self.probability_of_precipitation[rows] >= min_probability
+
+    def _symbol(self, symbol_index: int) -> str | None:
+        return self.symbols[symbol_index] if symbol_index != NO_SYMBOL else None
+
+
+def _nan_if_none(value: float | None) -> float:
+    return value if value is not None else np.nan
@@ -0,0 +1,471 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import pickle
+import socket
+import struct
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+from src import metrics
+from src.forecast_snapshot import ForecastInfo
+from src.geocoding import ReverseGeocoder
+from src.location_buckets import LocationBuckets
+from src.models import (
+    Coordinates,
+    DailyForecastPeriod,
+    RainyForecastPeriod,
+    RainyForecastPeriodQuery,
+)
+from src.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
+
+# Forecast workers run the forecast pipeline (fetching, decoding, parsing and evaluating forecasts, and geocoding) in separate processes,
+# such that the CPU heavy parts never delay the event loop of the bot, i.e. heartbeats and interaction responses.
+# The bot talks to the workers over Unix sockets and only receives compact results ready to be rendered (e.g. the rainy hours of tomorrow).
+# - Locations are partitioned across the workers, such that each forecast is parsed and evaluated by one worker only
+# - Cities are looked up by the first worker only, as Nominatim allows one request per second
+# - Workers share the response cache and snapshot files of the data folder, like shards (see response_cache.py)
+# Run a worker with: python -m src.forecast_worker --socket ./data/forecast_worker.sock
+# Then point the bot to it with: FORECAST_WORKER_SOCKETS=["./data/forecast_worker.sock"]
+
+# The protocol is pickle: Messages are pickled, prefixed by their size. Unpickling a message can run arbitrary code,
+# i.e. the socket must only be reachable by the user running the bot and the workers (see ForecastWorker.start). Never expose it to other users or over a network
+_FRAME_HEADER = struct.Struct(">I")
+
+# (id, method, args) from the bot, and (id, is_ok, result or error message) from the worker
+Request = tuple[int, str, tuple[Any, ...]]
+Response = tuple[int, bool, Any]
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Any:
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    (size,) = _FRAME_HEADER.unpack(header)
+    return pickle.loads(await reader.readexactly(size))
+
+
+def _write_message(writer: asyncio.StreamWriter, message: Any):
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+# Serves the forecast pipeline to bots over a Unix socket. Requests are handled concurrently, i.e. responses may be out of order
+class ForecastWorker:
+    def __init__(
+        self,
+        weather_service: WeatherService,
+        geocoder: ReverseGeocoder,
+        socket_path: str,
+    ) -> None:
+        self._weather_service = weather_service
+        self._geocoder = geocoder
+        self._socket_path = socket_path
+        self._server: asyncio.Server | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._methods: dict[str, Callable[..., Awaitable[Any]]] = {
+            "rainy_forecast_tomorrow": self._get_rainy_forecast_tomorrow,
+            "rainy_forecast": self._get_rainy_forecast,
+            "forecast_symbol_code": self._get_forecast_symbol_code,
+            "daily_forecast": self._get_daily_forecast,
+            "forecast_info": self._get_forecast_info,
+            "city": self._geocoder.get_city_async,
+        }
+
+    async def start(self):
+        Path(self._socket_path).parent.mkdir(parents=True, exist_ok=True)
+        # Left behind if the previous worker crashed
+        Path(self._socket_path).unlink(missing_ok=True)
+        # Bound under a restrictive umask, such that the socket is never accessible by other users, not even briefly before a chmod
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        previous_umask = os.umask(0o077)
+        try:
+            sock.bind(self._socket_path)
+        except BaseException:
+            sock.close()
+            raise
+        finally:
+            os.umask(previous_umask)
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, sock=sock
+        )
+        logger.info(f"Serving forecasts at {self._socket_path}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in self._tasks:
+            task.cancel()
+        Path(self._socket_path).unlink(missing_ok=True)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        logger.info("Bot connected")
+        try:
+            while True:
+                request: Request = await _read_message(reader)
+                task = asyncio.create_task(self._handle_request(request, writer))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.info("Bot disconnected")
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request: Request, writer: asyncio.StreamWriter):
+        request_id, method, args = request
+        started_at = time.perf_counter()
+        try:
+            result = await self._methods[method](*args)
+            response: Response = (request_id, True, result)
+        except Exception as e:
+            metrics.ERRORS.inc(stage="forecast_worker")
+            logger.warning(f"Request '{method}' failed: {e}")
+            response = (request_id, False, f"{type(e).__name__}: {e}")
+        if writer.is_closing():
+            return  # The bot is gone
+        _write_message(writer, response)
+        metrics.FORECAST_WORKER_SECONDS.observe(
+            time.perf_counter() - started_at, method=method
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass  # Noticed by the connection
+
+    # Forecast results are returned with the info of the forecast, such that the bot knows when the result expires without asking
+
+    async def _get_rainy_forecast_tomorrow(
+        self, coordinates: Coordinates, time_zone: ZoneInfo, today: date | None
+    ) -> tuple[tuple[RainyForecastPeriod, str] | tuple[None, None], ForecastInfo]:
+        result = await self._weather_service.get_rainy_forecast_tomorrow(
+            coordinates, time_zone, today
+        )
+        return result, self._get_latest_info(coordinates)
+
+    async def _get_rainy_forecast(
+        self, query: RainyForecastPeriodQuery
+    ) -> tuple[RainyForecastPeriod | None, ForecastInfo]:
+        result = await self._weather_service.get_rainy_forecast_async(query)
+        return result, self._get_latest_info(query.coordinates)
+
+    async def _get_forecast_symbol_code(
+        self, from_time: datetime, coordinates: Coordinates
+    ) -> tuple[str | None, ForecastInfo]:
+        result = await self._weather_service.get_forecast_symbol_code_async(
+            from_time, coordinates
+        )
+        return result, self._get_latest_info(coordinates)
+
+    async def _get_daily_forecast(
+        self, coordinates: Coordinates, time_zone: ZoneInfo, num_days: int
+    ) -> tuple[DailyForecastPeriod, ForecastInfo]:
+        result = await self._weather_service.get_daily_forecast(
+            coordinates, time_zone, num_days
+        )
+        return result, self._get_latest_info(coordinates)
+
+    async def _get_forecast_info(
+        self, coordinates: Coordinates
+    ) -> tuple[ForecastInfo, ForecastInfo]:
+        info = await self._weather_service.get_forecast_info(coordinates)
+        return info, info
+
+    def _get_latest_info(self, coordinates: Coordinates) -> ForecastInfo:
+        info = self._weather_service.get_latest_forecast_info(coordinates)
+        assert info is not None  # Just fetched
+        return info
+
+
+# Connection to a worker. Requests share the connection, and the connection is (re)opened on demand, e.g. if the worker is restarted
+class _WorkerConnection:
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self._writer: asyncio.StreamWriter | None = None
+        self._read_task: asyncio.Task[None] | None = None
+        self._connect_lock = asyncio.Lock()
+        self._ids = itertools.count()
+        self._pending: dict[int, asyncio.Future[Any]] = {}
+
+    async def request(self, method: str, args: tuple[Any, ...], timeout: float) -> Any:
+        writer = await self._connect()
+        request_id = next(self._ids)
+        response: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = response
+        try:
+            request: Request = (request_id, method, args)
+            _write_message(writer, request)
+            await writer.drain()
+            return await asyncio.wait_for(response, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(
+                    self.socket_path
+                )
+                self._read_task = asyncio.create_task(self._read_responses(reader))
+            return self._writer
+
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                request_id, is_ok, result = await _read_message(reader)
+                response = self._pending.get(request_id)
+                if response is None or response.done():
+                    continue  # Timed out
+                if is_ok:
+                    response.set_result(result)
+                else:
+                    response.set_exception(Exception(result))
+        except Exception as e:
+            logger.warning(
+                f"Lost connection to forecast worker {self.socket_path}: {e!r}"
+            )
+            self._fail_pending(e)
+        finally:
+            if self._writer:
+                self._writer.close()
+
+    def _fail_pending(self, error: BaseException):
+        for response in self._pending.values():
+            if not response.done():
+                response.set_exception(
+                    Exception(
+                        f"Lost connection to forecast worker {self.socket_path}: {error}"
+                    )
+                )
+
+
+# Sends requests to the forecast workers. Each location bucket is served by the same worker
+class ForecastWorkerClient:
+    REQUEST_TIMEOUT_SECONDS = 30.0
+
+    def __init__(
+        self,
+        socket_paths: list[str],
+        buckets: LocationBuckets | None = None,  # As configured for the workers
+    ) -> None:
+        if not socket_paths:
+            raise Exception("No forecast worker sockets")
+        self._connections = [_WorkerConnection(path) for path in socket_paths]
+        self._buckets = buckets or LocationBuckets()
+
+    async def request(
+        self,
+        coordinates: Coordinates | None,  # None: The first worker
+        method: str,
+        *args: Any,
+    ) -> Any:
+        connection = self._get_connection(coordinates)
+        started_at = time.perf_counter()
+        try:
+            result = await connection.request(
+                method, args, self.REQUEST_TIMEOUT_SECONDS
+            )
+        except Exception:
+            metrics.FORECAST_WORKER_REQUESTS.inc(method=method, result="failed")
+            raise
+        metrics.FORECAST_WORKER_REQUESTS.inc(method=method, result="ok")
+        metrics.FORECAST_WORKER_ROUND_TRIP_SECONDS.observe(
+            time.perf_counter() - started_at, method=method
+        )
+        return result
+
+    async def close(self):
+        for connection in self._connections:
+            await connection.close()
+
+    def _get_connection(self, coordinates: Coordinates | None) -> _WorkerConnection:
+        if coordinates is None:
+            return self._connections[0]
+        # Stable across processes (unlike hash()), such that all shards use the same worker for a location.
+        # By bucket like the fetches of WeatherService, i.e. locations sharing a forecast share a worker
+        key = self._buckets.key(coordinates).encode()
+        return self._connections[zlib.crc32(key) % len(self._connections)]
+
+
+# The weather service of the bot when the forecasts are served by workers. Offers the methods of WeatherService used by the bot
+class RemoteWeatherService:
+    def __init__(self, client: ForecastWorkerClient) -> None:
+        self._client = client
+        # Of the latest result of each location
+        self._infos: dict[Coordinates, ForecastInfo] = {}
+
+    # Loaded by the workers instead
+    def load_snapshots(self) -> int:
+        return 0
+
+    async def get_forecast_symbol_code_async(
+        self, from_time: datetime, coordinates: Coordinates
+    ) -> str | None:
+        return await self._request(
+            coordinates, "forecast_symbol_code", from_time, coordinates
+        )
+
+    async def get_rainy_forecast_async(
+        self, query: RainyForecastPeriodQuery
+    ) -> RainyForecastPeriod | None:
+        return await self._request(query.coordinates, "rainy_forecast", query)
+
+    async def get_rainy_forecast_tomorrow(
+        self,
+        coordinates: Coordinates,
+        time_zone: ZoneInfo,
+        today: date | None = None,
+    ) -> tuple[RainyForecastPeriod, str] | tuple[None, None]:
+        return await self._request(
+            coordinates, "rainy_forecast_tomorrow", coordinates, time_zone, today
+        )
+
+    async def get_daily_forecast(
+        self, coordinates: Coordinates, time_zone: ZoneInfo, num_days: int
+    ) -> DailyForecastPeriod:
+        return await self._request(
+            coordinates, "daily_forecast", coordinates, time_zone, num_days
+        )
+
+    def get_forecast_age(self, coordinates: Coordinates) -> timedelta | None:
+        info = self._infos.get(coordinates)
+        return info.age() if info else None
+
+    # As of the latest result, i.e. without asking the worker
+    def get_latest_forecast_info(self, coordinates: Coordinates) -> ForecastInfo | None:
+        return self._infos.get(coordinates)
+
+    async def get_forecast_info(self, coordinates: Coordinates) -> ForecastInfo:
+        return await self._request(coordinates, "forecast_info", coordinates)
+
+    async def _request(self, coordinates: Coordinates, method: str, *args: Any) -> Any:
+        result, info = await self._client.request(coordinates, method, *args)
+        self._infos[coordinates] = info
+        return result
+
+
+# The geocoder of the bot when the forecasts are served by workers. Offers the methods of ReverseGeocoder used by the bot
+class RemoteGeocoder:
+    def __init__(self, client: ForecastWorkerClient) -> None:
+        self._client = client
+        self._cities: dict[Coordinates, str] = {}
+        self._lookups: set[asyncio.Task[str | None]] = set()
+
+    # Returns the city if known. Otherwise asks the worker in the background and returns None
+    def get_city(self, coordinates: Coordinates) -> str | None:
+        if coordinates in self._cities:
+            return self._cities[coordinates]
+        lookup = asyncio.create_task(self.get_city_async(coordinates))
+        self._lookups.add(lookup)
+        lookup.add_done_callback(self._lookups.discard)
+        return None
+
+    async def get_city_async(
+        self,
+        coordinates: Coordinates,
+        wait_seconds: float = ReverseGeocoder.DEFAULT_WAIT_SECONDS,
+    ) -> str | None:
+        if coordinates in self._cities:
+            return self._cities[coordinates]
+        try:
+            city = await self._client.request(None, "city", coordinates, wait_seconds)
+        except Exception as e:
+            logger.warning(f"Getting city of {coordinates} failed: {e}")
+            return None
+        # None is not kept, as the lookup may still be in progress
+        if city is not None:
+            self._cities[coordinates] = city
+        return city
+
+    def warm(self, locations: list[Coordinates]):
+        for coordinates in locations:
+            self.get_city(coordinates)
+
+
+async def main():
+    from src.config import load_worker_config
+    from src.response_cache import ResponseCache
+    from src.snapshot_files import ForecastSnapshotFiles
+    from src.weather_client import AsyncYrWeatherClient, YrWeatherClient
+
+    args = _parse_args()
+    config = load_worker_config(args.env)
+    data_dir = Path(args.data_dir)
+    response_cache = ResponseCache(str(data_dir / Path(ResponseCache.DB_PATH).name))
+    async_weather_client = AsyncYrWeatherClient(
+        config.yr_base_url, cache=response_cache
+    )
+    weather_service = WeatherService(
+        YrWeatherClient(config.yr_base_url),
+        async_weather_client,
+        ForecastSnapshotFiles(
+            str(data_dir / Path(ForecastSnapshotFiles.DIRECTORY).name)
+        ),
+        LocationBuckets(config.forecast_geohash_precision),
+    )
+    geocoder = ReverseGeocoder(str(data_dir / Path(ReverseGeocoder.CACHE_PATH).name))
+    worker = ForecastWorker(weather_service, geocoder, args.socket)
+    metrics_server = (
+        metrics.MetricsServer(args.metrics_host, args.metrics_port)
+        if args.metrics_port
+        else None
+    )
+
+    weather_service.load_snapshots()
+    response_cache.start()
+    if metrics_server:
+        await metrics_server.start()
+    await worker.start()
+    try:
+        await asyncio.Event().wait()  # Until interrupted
+    finally:
+        await worker.stop()
+        if metrics_server:
+            await metrics_server.stop()
+        await async_weather_client.close()
+        response_cache.close()
+
+
+def _parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "-e", "--env", required=False, help="Path of .env file", default=".env"
+    )
+    ap.add_argument(
+        "--socket",
+        default="./data/forecast_worker.sock",
+        help="Path of the Unix socket to serve at",
+    )
+    ap.add_argument(
+        "--data-dir",
+        default="./data",
+        help="Folder of the response cache, snapshots and geocode cache. Shared with the other workers",
+    )
+    ap.add_argument("--metrics-port", type=int, help="Port to serve metrics at")
+    ap.add_argument("--metrics-host", default="127.0.0.1")
+    return ap.parse_args()
+
+
+if __name__ == "__main__":
+    from src import startup
+
+    startup.setup_logging()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
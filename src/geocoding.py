@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from src import metrics
+from src.models import Coordinates
+
+if TYPE_CHECKING:
+    import geopy  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+# Resolves the city of a location using reverse geocoding (OpenStreetMap Nominatim)
+# - Cities are cached by rounded coordinates and persisted to disk, such that each location is only looked up once
+# - Lookups run in a background thread and never block the event loop
+# - If a lookup is slow, callers get None (i.e. no city) rather than waiting. The lookup continues in the background and fills the cache for next time
+class ReverseGeocoder:
+    CACHE_PATH = "./data/geocode_cache.json"
+    PRECISION = 3  # Number of decimals to round coordinates to (~100 m)
+    LOOKUP_TIMEOUT_SECONDS = 5.0  # Timeout of the request to Nominatim
+    DEFAULT_WAIT_SECONDS = 1.0  # Max time to wait for a city that is not cached
+    MIN_LOOKUP_INTERVAL_SECONDS = (
+        1.0  # Nominatim usage policy: Max 1 request per second
+    )
+
+    def __init__(self, cache_path: str = CACHE_PATH) -> None:
+        self._cache_path = Path(cache_path)
+        self._cities: dict[str, str | None] = self._load_cache()
+        self._lookups: dict[str, asyncio.Task[str | None]] = {}
+        self._lookup_lock = asyncio.Lock()
+        self._last_lookup_time = 0.0
+        self._geolocator: Any = (
+            None  # Created on first lookup, as geopy is slow to import
+        )
+
+    # Returns the city if cached. Otherwise starts a lookup in the background and returns None
+    def get_city(self, coordinates: Coordinates) -> str | None:
+        key = self._cache_key(coordinates)
+        if key in self._cities:
+            return self._cities[key]
+        self._start_lookup(key, coordinates)
+        return None
+
+    # Returns the city, waiting at most 'wait_seconds' for it to be looked up if not cached
+    async def get_city_async(
+        self, coordinates: Coordinates, wait_seconds: float = DEFAULT_WAIT_SECONDS
+    ) -> str | None:
+        key = self._cache_key(coordinates)
+        if key in self._cities:
+            return self._cities[key]
+        lookup = self._start_lookup(key, coordinates)
+        try:
+            # Shield the lookup such that it completes in the background if we stop waiting
+            return await asyncio.wait_for(asyncio.shield(lookup), wait_seconds)
+        except asyncio.TimeoutError:
+            logger.info(f"Reverse geocoding of {coordinates} is slow, skipping city")
+            return None
+        except Exception:
+            return None  # Already logged by the lookup
+
+    # Start looking up the given locations in the background, e.g. at startup
+    def warm(self, locations: list[Coordinates]):
+        for coordinates in locations:
+            self.get_city(coordinates)
+
+    def _start_lookup(
+        self, key: str, coordinates: Coordinates
+    ) -> asyncio.Task[str | None]:
+        lookup = self._lookups.get(key)
+        if lookup is None:
+            lookup = asyncio.create_task(self._lookup(key, coordinates))
+            self._lookups[key] = lookup
+        return lookup
+
+    async def _lookup(self, key: str, coordinates: Coordinates) -> str | None:
+        try:
+            # Look up one location at a time to respect the rate limit of Nominatim
+            async with self._lookup_lock:
+                wait_seconds = (
+                    self._last_lookup_time
+                    + self.MIN_LOOKUP_INTERVAL_SECONDS
+                    - time.monotonic()
+                )
+                if wait_seconds > 0:
+                    await asyncio.sleep(wait_seconds)
+                logger.info(f"Reverse geocoding {coordinates}...")
+                try:
+                    location: geopy.Location | None = await asyncio.to_thread(
+                        self._get_geolocator().reverse,
+                        f"{coordinates.lat}, {coordinates.lon}",
+                    )
+                finally:
+                    self._last_lookup_time = time.monotonic()
+            city = _extract_city(location) if location else None
+            self._cities[key] = city
+            self._save_cache()
+            logger.info(f"Reverse geocoded {coordinates}: {city}")
+            return city
+        except Exception as e:
+            # Not cached, i.e. retried on next request
+            metrics.ERRORS.inc(stage="geocoding")
+            logger.warning(f"Reverse geocoding of {coordinates} failed: {e}")
+            raise
+        finally:
+            del self._lookups[key]
+
+    def _get_geolocator(self) -> Any:
+        if self._geolocator is None:
+            from geopy.geocoders import Nominatim  # type: ignore
+
+            self._geolocator = Nominatim(user_agent="weather-bot", timeout=self.LOOKUP_TIMEOUT_SECONDS)  # type: ignore
+        return self._geolocator
+
+    def _cache_key(self, coordinates: Coordinates) -> str:
+        return (
+            f"{coordinates.lat:.{self.PRECISION}f},{coordinates.lon:.{self.PRECISION}f}"
+        )
+
+    def _load_cache(self) -> dict[str, str | None]:
+        if not self._cache_path.exists():
+            return {}
+        try:
+            cities: dict[str, str | None] = json.loads(self._cache_path.read_text())
+            logger.info(f"Loaded {len(cities)} cached cities from {self._cache_path}")
+            return cities
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load geocode cache: {e}")
+            return {}
+
+    def _save_cache(self):
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Per process, as the file may be shared by several processes (e.g. shards)
+            tmp_path = self._cache_path.with_name(
+                f"{self._cache_path.name}.{os.getpid()}.tmp"
+            )
+            tmp_path.write_text(json.dumps(self._cities, indent=2))
+            tmp_path.replace(self._cache_path)
+        except OSError as e:
+            logger.warning(f"Could not save geocode cache: {e}")
+
+
+# Given a Geopy Location object, attempt to extract the city or the closest equivalent.
+def _extract_city(location: "geopy.Location") -> str | None:
+    # Order of preference for the city name
+    city_keys = ["city", "town", "village", "hamlet", "suburb", "county", "state"]
+
+    # Get the raw OSM data
+    osm_data: dict[str, Any] = location.raw  # type: ignore
+
+    # Check for the city name in the OSM data
+    for key in city_keys:
+        if key in osm_data["address"]:
+            return osm_data["address"][key]  # type: ignore
+    # If no city name was found, return None
+    return None
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Coroutine
+
+import discord
+
+from src import metrics
+from src.outbound import OutboundQueue, Priority
+
+logger = logging.getLogger(__name__)
+
+# Discord fails an interaction not responded to within 3 seconds. Defer the response if not ready within this time
+RESPONSE_BUDGET_SECONDS = 1.5
+
+
+# Message to respond to an interaction with
+@dataclass(frozen=True)
+class Response:
+    content: str | None = None
+    embed: discord.Embed | None = None
+
+
+# Responds to the interaction with the response created by the coroutine.
+# The response is created in the background, and the interaction is deferred if the response is not ready within the budget (e.g. YR is slow).
+# The response is then sent as a follow-up message through the outbound queue
+async def respond_within_budget(
+    interaction: discord.Interaction,
+    command: str,
+    create_response: Coroutine[Any, Any, Response],
+    outbound: OutboundQueue,
+):
+    task = asyncio.create_task(create_response)
+    done, _ = await asyncio.wait({task}, timeout=RESPONSE_BUDGET_SECONDS)
+    if task in done:
+        metrics.INTERACTION_RESPONSES.inc(command=command, mode="in_time")
+        await send_response(interaction, task.result())
+        return
+
+    metrics.INTERACTION_RESPONSES.inc(command=command, mode="deferred")
+    logger.info(f"/{command} not ready within budget, deferring response")
+    await interaction.response.defer(thinking=True)
+    try:
+        response = await task
+    except Exception:
+        metrics.ERRORS.inc(stage="interaction")
+        response = Response("Failed to get the forecast, please try again later")
+        await _send_followup(interaction, response, outbound)
+        raise
+    await _send_followup(interaction, response, outbound)
+
+
+async def send_response(interaction: discord.Interaction, response: Response):
+    with metrics.DISCORD_SEND_SECONDS.time(kind="interaction"):
+        if response.embed:
+            await interaction.response.send_message(embed=response.embed)
+        else:
+            await interaction.response.send_message(response.content)
+
+
+async def _send_followup(
+    interaction: discord.Interaction, response: Response, outbound: OutboundQueue
+):
+    async def send():
+        if response.embed:
+            await interaction.followup.send(embed=response.embed)
+        else:
+            await interaction.followup.send(response.content or "")
+
+    await outbound.send(
+        interaction.channel_id or interaction.id, Priority.FOLLOWUP, "followup", send
+    )
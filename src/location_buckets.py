@@ -0,0 +1,126 @@
+import math
+
+from src.models import Coordinates
+
+# YR asks clients to use max 4 decimals (about 11 m), i.e. more precise coordinates only cost cache misses
+MAX_DECIMALS = 4
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_GEOHASH_PRECISION = 12
+
+_EARTH_RADIUS_KM = 6371.0
+_KM_PER_DEGREE = math.pi * _EARTH_RADIUS_KM / 180
+
+
+# Coordinates as requested from YR, i.e. rounded to the max precision of YR
+def canonical_coordinates(coordinates: Coordinates) -> Coordinates:
+    return Coordinates(
+        round(coordinates.lat, MAX_DECIMALS), round(coordinates.lon, MAX_DECIMALS)
+    )
+
+
+# Groups nearby locations into buckets sharing a forecast, i.e. the forecast of a bucket is only fetched, cached and parsed once.
+# The forecast of a bucket is the forecast at its canonical coordinates:
+# - Default: Locations are only grouped by the max precision of YR (4 decimals), i.e. the forecast is for the location itself
+# - With a geohash precision: Locations in the same geohash cell share the forecast at the center of the cell,
+#   e.g. 6 (cells of about 1.2 x 0.6 km at the equator, narrower towards the poles) or 5 (about 4.9 x 4.9 km).
+#   Larger cells share more fetches, but the forecast is for a point further from the location
+class LocationBuckets:
+    def __init__(self, geohash_precision: int | None = None) -> None:
+        if geohash_precision is not None and not (
+            1 <= geohash_precision <= MAX_GEOHASH_PRECISION
+        ):
+            raise ValueError(
+                f"Geohash precision must be between 1 and {MAX_GEOHASH_PRECISION}, got {geohash_precision}"
+            )
+        self.geohash_precision = geohash_precision
+
+    # Name of the bucket resolution, e.g. for metrics
+    @property
+    def resolution(self) -> str:
+        if self.geohash_precision is None:
+            return f"decimals:{MAX_DECIMALS}"
+        return f"geohash:{self.geohash_precision}"
+
+    # Identifies the bucket of the location, e.g. to route the buckets between processes
+    def key(self, coordinates: Coordinates) -> str:
+        if self.geohash_precision is None:
+            canonical = canonical_coordinates(coordinates)
+            return f"{canonical.lat},{canonical.lon}"
+        return encode_geohash(coordinates, self.geohash_precision)
+
+    # Coordinates of the forecast shared by the locations of the bucket
+    def canonical(self, coordinates: Coordinates) -> Coordinates:
+        if self.geohash_precision is None:
+            return canonical_coordinates(coordinates)
+        return canonical_coordinates(
+            decode_geohash(encode_geohash(coordinates, self.geohash_precision))
+        )
+
+
+def encode_geohash(coordinates: Coordinates, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars: list[str] = []
+    bits = 0
+    bit_count = 0
+    is_lon = True  # Bits alternate between lon and lat
+    while len(chars) < precision:
+        value, value_range = (
+            (coordinates.lon, lon_range) if is_lon else (coordinates.lat, lat_range)
+        )
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+        is_lon = not is_lon
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+# Returns the center of the geohash cell
+def decode_geohash(geohash: str) -> Coordinates:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    is_lon = True
+    for char in geohash:
+        bits = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if is_lon else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            is_lon = not is_lon
+    return Coordinates(
+        (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+    )
+
+
+# Height and width (km) of a geohash cell at the given latitude
+def geohash_cell_size_km(precision: int, lat: float) -> tuple[float, float]:
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    height = 180 / 2**lat_bits * _KM_PER_DEGREE
+    width = 360 / 2**lon_bits * _KM_PER_DEGREE * math.cos(math.radians(lat))
+    return height, width
+
+
+# Great-circle distance between the locations
+def distance_km(a: Coordinates, b: Coordinates) -> float:
+    lat_a, lat_b = math.radians(a.lat), math.radians(b.lat)
+    d_lat = lat_b - lat_a
+    d_lon = math.radians(b.lon - a.lon)
+    h = (
+        math.sin(d_lat / 2) ** 2
+        + math.cos(lat_a) * math.cos(lat_b) * math.sin(d_lon / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS_KM * math.asin(math.sqrt(h))
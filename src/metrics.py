@@ -0,0 +1,369 @@
+import asyncio
+import bisect
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Generator
+
+logger = logging.getLogger(__name__)
+
+# Metrics in the Prometheus text format (https://prometheus.io/docs/instrumenting/exposition_formats/)
+
+LabelValues = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric(ABC):
+    TYPE = ""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        REGISTRY.register(self)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+        lines.extend(self._render_samples())
+        return lines
+
+    @abstractmethod
+    def _render_samples(self) -> list[str]:
+        pass
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labels}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _format_labels(
+        self, label_values: LabelValues, extra: dict[str, str] | None = None
+    ) -> str:
+        pairs = list(zip(self.labels, label_values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+# Value that only increases, e.g. number of requests
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(
+        self, name: str, description: str, labels: tuple[str, ...] = ()
+    ) -> None:
+        super().__init__(name, description, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        label_values = self._label_values(labels)
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _render_samples(self) -> list[str]:
+        return [
+            f"{self.name}{self._format_labels(label_values)} {_format_value(value)}"
+            for label_values, value in self._values.items()
+        ]
+
+
+# Value that can go up and down, e.g. size of a queue
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def __init__(
+        self, name: str, description: str, labels: tuple[str, ...] = ()
+    ) -> None:
+        super().__init__(name, description, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        self._values[self._label_values(labels)] = value
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _render_samples(self) -> list[str]:
+        return [
+            f"{self.name}{self._format_labels(label_values)} {_format_value(value)}"
+            for label_values, value in self._values.items()
+        ]
+
+
+# Distribution of values in buckets, e.g. latencies in seconds
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, description, labels)
+        self._buckets = buckets
+        # Per label values: count per bucket (last is +Inf), sum, count
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        label_values = self._label_values(labels)
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self._buckets) + 1)
+            self._sums[label_values] = 0.0
+        counts[bisect.bisect_left(self._buckets, value)] += 1
+        self._sums[label_values] += value
+
+    # Observes the time spent in the block (or decorated function)
+    @contextmanager
+    def time(self, **labels: str) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._label_values(labels), []))
+
+    def _render_samples(self) -> list[str]:
+        lines: list[str] = []
+        for label_values, counts in self._counts.items():
+            cumulative = 0
+            for upper_bound, count in zip(self._buckets + (float("inf"),), counts):
+                cumulative += count
+                le = (
+                    "+Inf"
+                    if upper_bound == float("inf")
+                    else _format_value(upper_bound)
+                )
+                lines.append(
+                    f"{self.name}_bucket{self._format_labels(label_values, {'le': le})} {cumulative}"
+                )
+            labels_str = self._format_labels(label_values)
+            lines.append(
+                f"{self.name}_sum{labels_str} {_format_value(self._sums[label_values])}"
+            )
+            lines.append(f"{self.name}_count{labels_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+# Serves the metrics over HTTP at /metrics, e.g. to be scraped by Prometheus
+class MetricsServer:
+    def __init__(self, host: str, port: int, registry: MetricsRegistry = REGISTRY):
+        self._host = host
+        self._port = port
+        self._registry = registry
+        self._server: asyncio.Server | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self._host, self._port
+        )
+        logger.info(f"Serving metrics at http://{self._host}:{self._port}/metrics")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip headers
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (
+                b"\r\n",
+                b"\n",
+                b"",
+            ):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1] in ("/metrics", "/"):
+                status = "200 OK"
+                body = self._registry.render().encode()
+            else:
+                status = "404 Not Found"
+                body = b"Not found\n"
+            headers = [
+                f"HTTP/1.1 {status}",
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8",
+                f"Content-Length: {len(body)}",
+                "Connection: close",
+            ]
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Metrics of the bot
+YR_FETCH_SECONDS = Histogram(
+    "weatherbot_yr_fetch_seconds",
+    "Time to fetch a forecast from the YR API",
+    labels=("endpoint",),
+)
+YR_REQUESTS = Counter(
+    "weatherbot_yr_requests_total",
+    "Requests for YR forecasts by result (cache_hit, shared by another process, not_modified, downloaded, error)",
+    labels=("endpoint", "result"),
+)
+FORECAST_FETCHES = Counter(
+    "weatherbot_forecast_fetches_total",
+    "Forecast fetches on snapshot miss by result (fetched, coalesced with a fetch in flight, failure_cached)",
+    labels=("result",),
+)
+FORECAST_BUCKET_LOOKUPS = Counter(
+    "weatherbot_forecast_bucket_lookups_total",
+    "Forecast lookups by location bucket resolution and result (hit, shared: fetched for another location of the bucket, miss)",
+    labels=("resolution", "result"),
+)
+FORECAST_PARSE_SECONDS = Histogram(
+    "weatherbot_forecast_parse_seconds",
+    "Time to parse a YR response into a forecast table",
+)
+FORECAST_SNAPSHOTS = Counter(
+    "weatherbot_forecast_snapshots_total",
+    "Forecast snapshot lookups by result (hit, revalidated, parsed)",
+    labels=("result",),
+)
+FORECAST_AGE_SECONDS = Histogram(
+    "weatherbot_forecast_age_seconds",
+    "Time since the forecast of a rain alert was fetched from YR when the alert is sent, i.e. how warm the prefetched forecast was",
+    buckets=(10.0, 30.0, 60.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0, 7200.0),
+)
+RAIN_EVALUATION_SECONDS = Histogram(
+    "weatherbot_rain_evaluation_seconds",
+    "Time to find the rainy hours of a forecast",
+)
+RAIN_EVALUATIONS = Counter(
+    "weatherbot_rain_evaluations_total",
+    "Rainy forecast evaluations by result (hit, evaluated)",
+    labels=("result",),
+)
+EMBED_RENDER_SECONDS = Histogram(
+    "weatherbot_embed_render_seconds",
+    "Time to render a forecast message",
+    labels=("message",),
+)
+RENDERED_EMBEDS = Counter(
+    "weatherbot_rendered_embeds_total",
+    "Rainy forecast embed lookups by result (hit, rendered)",
+    labels=("result",),
+)
+INTERACTION_RESPONSES = Counter(
+    "weatherbot_interaction_responses_total",
+    "Interaction responses by how they were answered (ready, in_time, deferred)",
+    labels=("command", "mode"),
+)
+ALERT_UPDATES = Counter(
+    "weatherbot_alert_updates_total",
+    "Sent rain alerts checked for forecast changes by result (not_updated, unchanged, edited, gone, failed)",
+    labels=("result",),
+)
+DISCORD_SEND_SECONDS = Histogram(
+    "weatherbot_discord_send_seconds",
+    "Time to send a message to Discord",
+    labels=("kind",),
+)
+OUTBOUND_QUEUE_DEPTH = Gauge(
+    "weatherbot_outbound_queue_depth",
+    "Messages waiting in the outbound queue for backpressure or rate limits by priority",
+    labels=("priority",),
+)
+OUTBOUND_WAIT_SECONDS = Histogram(
+    "weatherbot_outbound_wait_seconds",
+    "Time messages waited in the outbound queue before being sent by priority",
+    labels=("priority",),
+)
+OUTBOUND_MESSAGES = Counter(
+    "weatherbot_outbound_messages_total",
+    "Outbound messages by priority and result (sent, failed, coalesced, dropped)",
+    labels=("priority", "result"),
+)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "weatherbot_response_cache_lookups_total",
+    "YR response cache lookups by result (memory_hit, disk_hit, miss)",
+    labels=("result",),
+)
+RESPONSE_CACHE_EVICTIONS = Counter(
+    "weatherbot_response_cache_evictions_total",
+    "Responses evicted from the YR response cache by tier (memory, disk) and reason (size, stale)",
+    labels=("tier", "reason"),
+)
+RESPONSE_CACHE_DISK_BYTES = Gauge(
+    "weatherbot_response_cache_disk_bytes",
+    "Size of the compressed responses in the disk tier of the YR response cache",
+)
+FORECAST_WORKER_REQUESTS = Counter(
+    "weatherbot_forecast_worker_requests_total",
+    "Requests to forecast workers by method and result (ok, failed)",
+    labels=("method", "result"),
+)
+FORECAST_WORKER_ROUND_TRIP_SECONDS = Histogram(
+    "weatherbot_forecast_worker_round_trip_seconds",
+    "Time from sending a request to a forecast worker until the result is received by method",
+    labels=("method",),
+)
+FORECAST_WORKER_SECONDS = Histogram(
+    "weatherbot_forecast_worker_seconds",
+    "Time for a forecast worker to handle a request by method",
+    labels=("method",),
+)
+NOWCAST_POLLS = Counter(
+    "weatherbot_nowcast_polls_total",
+    "Nowcast polls of watched locations by result (unchanged, evaluated, failed)",
+    labels=("result",),
+)
+NOWCAST_ALERTS = Counter(
+    "weatherbot_nowcast_alerts_total",
+    "Nowcast rain alerts by result (sent, failed)",
+    labels=("result",),
+)
+ERRORS = Counter(
+    "weatherbot_errors_total",
+    "Errors by stage",
+    labels=("stage",),
+)
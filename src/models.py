@@ -1,7 +1,6 @@
 import logging
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
-from tracemalloc import start
 from zoneinfo import ZoneInfo
 
 from src import time_utils
@@ -34,6 +33,55 @@ class RainyForecastPeriod:
     forecast_hours: list[RainyForecastHour]
 
 
+# Forecast of a day (in the time zone of the user)
+@dataclass(frozen=True)
+class DailyForecast:
+    date: date
+    hours: int  # Hours of the day covered by the forecast
+    precipitation_amount: float  # Total of the day
+    max_precipitation_amount: (
+        float  # Of any hour. For 6 hour time steps, the average of the 6 hours
+    )
+    max_probability: (
+        float | None
+    )  # Of any time step. None if not available, i.e. the compact forecast
+    rainy_hours: int
+    symbol_code: str | None  # Describes the weather of the day
+
+
+# Forecast of consecutive days
+@dataclass(frozen=True)
+class DailyForecastPeriod:
+    updated_at: datetime
+    coordinates: Coordinates
+    days: list[DailyForecast]
+
+
+# Precipitation of a 5 minute time step of the nowcast
+@dataclass(frozen=True)
+class NowcastStep:
+    time: datetime
+    precipitation_rate: float  # mm/h
+
+
+# Radar based forecast of the precipitation of the next 2 hours
+@dataclass(frozen=True)
+class Nowcast:
+    updated_at: datetime
+    coordinates: Coordinates
+    has_radar_coverage: bool  # If not, the precipitation is not reliable
+    steps: list[NowcastStep]
+
+
+# Rain about to start, according to the nowcast
+@dataclass(frozen=True)
+class RainOnset:
+    updated_at: datetime  # Of the nowcast
+    coordinates: Coordinates
+    time: datetime  # First time step with rain
+    max_precipitation_rate: float  # mm/h. Of the rain within the nowcast
+
+
 @dataclass(frozen=True)
 class TimePeriod:
     start: datetime
@@ -63,3 +111,5 @@ class TimePeriod:
 class RainyForecastPeriodQuery:
     time_period: TimePeriod
     coordinates: Coordinates
+    # Include min, max and probability of precipitation in the forecast. Requires the (larger) complete forecast from YR
+    include_uncertainty: bool = False
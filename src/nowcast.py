@@ -0,0 +1,78 @@
+import logging
+from datetime import timedelta
+
+from src import time_utils
+from src.dtos.yr_complete_decoder import parse_timestamp
+from src.dtos.yr_nowcast_response import YrNowcastResponse
+from src.location_buckets import canonical_coordinates
+from src.models import Coordinates, Nowcast, NowcastStep, RainOnset
+from src.weather_client import AsyncYrWeatherClient
+
+logger = logging.getLogger(__name__)
+
+STEP_DURATION = timedelta(minutes=5)  # Of the time steps of the nowcast
+
+
+# Gets the nowcast (precipitation of the next 2 hours in 5 minute time steps) of locations. Cheap to poll every few minutes:
+# - The YR response is cached and revalidated with "If-Modified-Since" (see AsyncYrWeatherClient), i.e. a poll costs a 304 at most until the nowcast is updated
+# - The response is only decoded if the nowcast has been updated since the last poll of the location
+class NowcastService:
+    def __init__(self, client: AsyncYrWeatherClient) -> None:
+        self._client = client
+        self._nowcasts: dict[Coordinates, Nowcast] = {}
+
+    async def get_nowcast(self, coordinates: Coordinates) -> Nowcast:
+        # Not bucketed like the forecasts, as a shower can be smaller than a bucket
+        canonical = canonical_coordinates(coordinates)
+        response = await self._client.get_nowcast(canonical.lat, canonical.lon)
+        updated_at = parse_timestamp(response.data["properties"]["meta"]["updated_at"])
+        latest = self._nowcasts.get(coordinates)
+        if latest and latest.updated_at == updated_at:
+            return latest
+
+        dto = YrNowcastResponse.from_dict(response.data)
+        nowcast = Nowcast(
+            updated_at,
+            coordinates,
+            has_radar_coverage=dto.properties.meta.radar_coverage == "ok",
+            steps=[
+                NowcastStep(
+                    time_utils.as_utc(step.time),
+                    step.data.instant.details.precipitation_rate or 0.0,
+                )
+                for step in dto.properties.timeseries
+            ],
+        )
+        self._nowcasts[coordinates] = nowcast
+        return nowcast
+
+    # Forgets the latest nowcast of a location that is no longer polled
+    def forget(self, coordinates: Coordinates):
+        self._nowcasts.pop(coordinates, None)
+
+
+# Time steps of the nowcast from now until 'horizon' from now. The first covers the current time
+def get_upcoming_steps(nowcast: Nowcast, horizon: timedelta) -> list[NowcastStep]:
+    now = time_utils.utc_now()
+    return [
+        step
+        for step in nowcast.steps
+        if step.time + STEP_DURATION > now and step.time <= now + horizon
+    ]
+
+
+# Returns the start of rain of at least 'min_rate' (mm/h) within 'horizon' from now.
+# None if no rain, or if it is already raining (i.e. the rain has already started)
+def find_rain_onset(
+    nowcast: Nowcast, min_rate: float, horizon: timedelta
+) -> RainOnset | None:
+    steps = get_upcoming_steps(nowcast, horizon)
+    rainy_steps = [step for step in steps if step.precipitation_rate >= min_rate]
+    if not rainy_steps or rainy_steps[0] is steps[0]:
+        return None
+    return RainOnset(
+        nowcast.updated_at,
+        nowcast.coordinates,
+        rainy_steps[0].time,
+        max(step.precipitation_rate for step in rainy_steps),
+    )
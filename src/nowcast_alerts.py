@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Hashable
+from zoneinfo import ZoneInfo
+
+import aiohttp
+import discord
+
+import src.discord_messages as discord_messages
+from src import metrics, nowcast, time_utils
+from src.forecast_worker import RemoteGeocoder
+from src.geocoding import ReverseGeocoder
+from src.models import Coordinates, RainOnset
+from src.nowcast import NowcastService
+
+logger = logging.getLogger(__name__)
+
+SendNowcastAlert = Callable[[discord.Embed], Awaitable[Any]]
+
+
+# A channel or user to alert of rain at a location
+@dataclass(frozen=True)
+class _Watcher:
+    coordinates: Coordinates
+    time_zone: ZoneInfo
+    send: SendNowcastAlert
+
+
+# Polling and alert state of a watched location
+@dataclass
+class _Location:
+    watch_ids: set[Hashable] = field(default_factory=set[Hashable])
+    poll_task: asyncio.Task[None] | None = None
+    evaluated_updated_at: datetime | None = None  # Of the last evaluated nowcast
+    # Alerted of the current rain, i.e. no more alerts until the nowcast is dry again
+    is_alerted: bool = False
+    alerted_at: datetime | None = None
+
+
+# Alerts watchers when the nowcast shows rain starting within the next hour.
+# - Each location is polled every interval. Polls are staggered, i.e. each location has its own offset within the interval, such that polls are spread evenly
+# - Nowcasts are only evaluated when updated by YR, and locations share the poll and the rendered alert between their watchers
+# - An alert is sent when rain is about to start (not when already raining), and then not again until the nowcast is dry, at most once per MIN_ALERT_INTERVAL
+class NowcastAlerter:
+    MIN_RATE = 0.5  # mm/h. Lighter rain is not worth an alert
+    HORIZON = timedelta(hours=1)  # Alert of rain starting within this time
+    # Per location, e.g. if the rain comes and goes
+    MIN_ALERT_INTERVAL = timedelta(hours=1)
+    MAX_CONCURRENT_POLLS = 10
+
+    def __init__(
+        self,
+        nowcast_service: NowcastService,
+        geocoder: ReverseGeocoder | RemoteGeocoder,
+        interval: timedelta,
+    ) -> None:
+        self._nowcast_service = nowcast_service
+        self._geocoder = geocoder
+        self._interval_seconds = interval.total_seconds()
+        self._watchers: dict[Hashable, _Watcher] = {}
+        self._locations: dict[Coordinates, _Location] = {}
+        self._poll_slots = asyncio.Semaphore(self.MAX_CONCURRENT_POLLS)
+        self._is_started = False
+
+    # Alerts of rain at the location until unwatched. Watching an existing id replaces the watch
+    def watch(
+        self,
+        watch_id: Hashable,
+        coordinates: Coordinates,
+        time_zone: ZoneInfo,
+        send: SendNowcastAlert,
+    ):
+        self.unwatch(watch_id)
+        self._watchers[watch_id] = _Watcher(coordinates, time_zone, send)
+        location = self._locations.setdefault(coordinates, _Location())
+        location.watch_ids.add(watch_id)
+        if self._is_started:
+            self._start_polling(coordinates, location)
+
+    def unwatch(self, watch_id: Hashable):
+        watcher = self._watchers.pop(watch_id, None)
+        if watcher is None:
+            return
+        location = self._locations[watcher.coordinates]
+        location.watch_ids.discard(watch_id)
+        if not location.watch_ids:
+            if location.poll_task:
+                location.poll_task.cancel()
+            del self._locations[watcher.coordinates]
+            self._nowcast_service.forget(watcher.coordinates)
+
+    # Starts polling the watched locations in the background
+    def start(self):
+        self._is_started = True
+        for coordinates, location in self._locations.items():
+            self._start_polling(coordinates, location)
+
+    def stop(self):
+        self._is_started = False
+        for location in self._locations.values():
+            if location.poll_task:
+                location.poll_task.cancel()
+                location.poll_task = None
+
+    # Polls the nowcast of the location and alerts its watchers if rain is about to start. Returns the number of alerts sent
+    async def poll(self, coordinates: Coordinates) -> int:
+        due = await self._evaluate(coordinates)
+        return await self._send_alerts(*due) if due else 0
+
+    # Fetches and evaluates the nowcast of the location. Returns the location and the rain onset if its watchers are due an alert
+    async def _evaluate(
+        self, coordinates: Coordinates
+    ) -> tuple[_Location, RainOnset] | None:
+        location = self._locations.get(coordinates)
+        if location is None:
+            return None
+        current = await self._nowcast_service.get_nowcast(coordinates)
+        if current.updated_at == location.evaluated_updated_at:
+            metrics.NOWCAST_POLLS.inc(result="unchanged")
+            return None
+        metrics.NOWCAST_POLLS.inc(result="evaluated")
+        location.evaluated_updated_at = current.updated_at
+        if not current.has_radar_coverage:
+            return None  # Unreliable, keep the state until the radar is back
+
+        steps = nowcast.get_upcoming_steps(current, self.HORIZON)
+        if not any(step.precipitation_rate >= self.MIN_RATE for step in steps):
+            location.is_alerted = False  # Dry, i.e. alert of the next rain
+            return None
+        onset = nowcast.find_rain_onset(current, self.MIN_RATE, self.HORIZON)
+        now = time_utils.utc_now()
+        if (
+            onset is None  # Already raining. Too late to alert
+            or location.is_alerted
+            or (
+                location.alerted_at
+                and now - location.alerted_at < self.MIN_ALERT_INTERVAL
+            )
+        ):
+            location.is_alerted = True
+            return None
+        location.is_alerted = True
+        location.alerted_at = now
+        return location, onset
+
+    def _start_polling(self, coordinates: Coordinates, location: _Location):
+        if location.poll_task is None:
+            location.poll_task = asyncio.create_task(self._run_polls(coordinates))
+
+    async def _run_polls(self, coordinates: Coordinates):
+        # Offset within the interval, stable across restarts
+        key = f"{coordinates.lat},{coordinates.lon}".encode()
+        offset = zlib.crc32(key) / 2**32 * self._interval_seconds
+        while True:
+            await asyncio.sleep((offset - time.time()) % self._interval_seconds)
+            try:
+                # Only the fetch and evaluation take a slot, such that slow sends (e.g. when rate limited by Discord) do not hold up the polls of other locations
+                async with self._poll_slots:
+                    due = await self._evaluate(coordinates)
+                if due:
+                    await self._send_alerts(*due)
+            except aiohttp.ClientResponseError as e:
+                metrics.NOWCAST_POLLS.inc(result="failed")
+                if e.status == 422:
+                    # Outside of the area of the nowcast (the Nordic countries)
+                    logger.info(f"No nowcast for {coordinates}, not polled any more")
+                    return
+                logger.warning(f"Nowcast poll for {coordinates} failed: {e}")
+            except Exception as e:
+                metrics.NOWCAST_POLLS.inc(result="failed")
+                logger.warning(f"Nowcast poll for {coordinates} failed: {e}")
+
+    async def _send_alerts(self, location: _Location, onset: RainOnset) -> int:
+        watchers = [self._watchers[watch_id] for watch_id in location.watch_ids]
+        city = await self._geocoder.get_city_async(onset.coordinates)
+        embeds: dict[str, discord.Embed] = {}  # Rendered once per time zone
+        for watcher in watchers:
+            if watcher.time_zone.key not in embeds:
+                embeds[watcher.time_zone.key] = discord_messages.rain_onset(
+                    onset, watcher.time_zone, city
+                )
+        logger.info(
+            f"Rain starting at {onset.time} for {onset.coordinates}, alerting {len(watchers)} watchers"
+        )
+        results = await asyncio.gather(
+            *(watcher.send(embeds[watcher.time_zone.key]) for watcher in watchers),
+            return_exceptions=True,
+        )
+        sent_count = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                metrics.NOWCAST_ALERTS.inc(result="failed")
+                metrics.ERRORS.inc(stage="send")
+                logger.warning(f"Failed to send nowcast alert: {result}")
+            else:
+                metrics.NOWCAST_ALERTS.inc(result="sent")
+                sent_count += 1
+        return sent_count
@@ -0,0 +1,210 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, TypeVar
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Orders waiters of the same priority first come, first served
+_sequence = itertools.count()
+
+
+# Priority of an outbound message. Lower is sent first
+class Priority(IntEnum):
+    FOLLOWUP = 0  # Follow-up of an interaction, i.e. a user is waiting
+    ALERT = 1  # Scheduled alerts and edits of sent alerts
+    DIAGNOSTIC = 2  # Status and error reports to the dev channel
+
+
+# Token bucket allowing 'capacity' requests per 'per_seconds' (refilled continuously).
+# When out of tokens, waiters get the next token in order of priority
+class _TokenBucket:
+    def __init__(self, capacity: int, per_seconds: float) -> None:
+        self._capacity = capacity
+        self._rate = capacity / per_seconds  # Tokens per second
+        self._tokens = float(capacity)
+        self._refilled_at = time.monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []  # Heap
+        self._wake_handle: asyncio.TimerHandle | None = None
+
+    async def acquire(self, priority: Priority):
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(_sequence), future))
+        self._schedule_wake()
+        await future
+
+    # Full and not waited for, i.e. can be forgotten
+    def is_idle(self) -> bool:
+        self._refill()
+        return not self._waiters and self._tokens >= self._capacity
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._refilled_at) * self._rate
+        )
+        self._refilled_at = now
+
+    # Wakes the waiters when the next token is available
+    def _schedule_wake(self):
+        if self._wake_handle is None and self._waiters:
+            delay = max(0.0, (1 - self._tokens) / self._rate)
+            self._wake_handle = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self._wake_handle = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # Cancelled while waiting
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule_wake()
+
+
+# Central queue of messages to Discord, such that bursts (e.g. many subscribers with the same notify time) stay within the rate limits of Discord
+# instead of being rejected and retried:
+# - Each channel has its own bucket, and all messages share a global bucket. Messages waiting for a bucket are sent in order of priority
+# - Backpressure: At most MAX_PENDING alerts and diagnostics are in the queue. Senders of alerts wait for room, while diagnostics are dropped
+# - Repeated error reports are coalesced into a single report and a count
+class OutboundQueue:
+    CHANNEL_RATE = (5, 5.0)  # Messages per seconds per channel
+    GLOBAL_RATE = (50, 1.0)  # Requests per seconds of the bot
+    MAX_PENDING = 1000
+    COALESCE_SECONDS = 60.0  # Time to count repeats of an error report after sending it
+    MAX_BUCKETS = 1024  # Idle channel buckets are forgotten when exceeded
+
+    def __init__(self, max_pending: int = MAX_PENDING) -> None:
+        self._global_bucket = _TokenBucket(*self.GLOBAL_RATE)
+        self._channel_buckets: dict[int, _TokenBucket] = {}
+        self._slots = asyncio.Semaphore(max_pending)
+        self._depths = {priority: 0 for priority in Priority}
+        # Error reports pending or sent within COALESCE_SECONDS by key, and the number of repeats since
+        self._report_repeats: dict[str, int] = {}
+        self._report_tasks: set[asyncio.Task[None]] = set()
+
+    # Sends a message (or another request to the channel, e.g. an edit) when within the rate limits, and returns the result of the send.
+    # Follow-ups bypass the backpressure, as they are already limited by the users waiting for them
+    async def send(
+        self,
+        channel_id: int,  # Or another id identifying the target of the send, e.g. a user
+        priority: Priority,
+        kind: str,  # Of the message, for metrics
+        send: Callable[[], Awaitable[T]],
+    ) -> T:
+        enqueued_at = time.perf_counter()
+        self._change_depth(priority, 1)
+        has_slot = False
+        try:
+            if priority != Priority.FOLLOWUP:
+                await self._slots.acquire()
+                has_slot = True
+            await self._get_bucket(channel_id).acquire(priority)
+            await self._global_bucket.acquire(priority)
+        except BaseException:
+            if has_slot:
+                self._slots.release()
+            raise
+        finally:
+            self._change_depth(priority, -1)
+        metrics.OUTBOUND_WAIT_SECONDS.observe(
+            time.perf_counter() - enqueued_at, priority=priority.name.lower()
+        )
+
+        try:
+            with metrics.DISCORD_SEND_SECONDS.time(kind=kind):
+                result = await send()
+        except Exception:
+            metrics.OUTBOUND_MESSAGES.inc(
+                priority=priority.name.lower(), result="failed"
+            )
+            raise
+        finally:
+            if has_slot:
+                self._slots.release()
+        metrics.OUTBOUND_MESSAGES.inc(priority=priority.name.lower(), result="sent")
+        return result
+
+    # Sends an error report in the background. Reports with the same key (e.g. the same traceback) are coalesced:
+    # Repeats while the report is queued or within COALESCE_SECONDS after it is sent are only counted, and the count is sent as a single report
+    def report(
+        self,
+        channel_id: int,
+        key: str,
+        content: str,
+        send: Callable[[str], Awaitable[Any]],
+    ):
+        if key in self._report_repeats:
+            self._report_repeats[key] += 1
+            metrics.OUTBOUND_MESSAGES.inc(priority="diagnostic", result="coalesced")
+            return
+        if self._slots.locked():
+            metrics.OUTBOUND_MESSAGES.inc(priority="diagnostic", result="dropped")
+            logger.warning("Outbound queue is full, dropping error report")
+            return
+        self._report_repeats[key] = 0
+        task = asyncio.create_task(self._send_report(channel_id, key, content, send))
+        self._report_tasks.add(task)
+        task.add_done_callback(self._report_tasks.discard)
+
+    def close(self):
+        for task in self._report_tasks:
+            task.cancel()
+
+    async def _send_report(
+        self,
+        channel_id: int,
+        key: str,
+        content: str,
+        send: Callable[[str], Awaitable[Any]],
+    ):
+        try:
+            await self.send(
+                channel_id, Priority.DIAGNOSTIC, "diagnostic", lambda: send(content)
+            )
+            await asyncio.sleep(self.COALESCE_SECONDS)
+            repeats = self._report_repeats[key]
+            if repeats:
+                summary = f"The error above occurred {repeats} more times within {self.COALESCE_SECONDS:.0f} seconds"
+                await self.send(
+                    channel_id, Priority.DIAGNOSTIC, "diagnostic", lambda: send(summary)
+                )
+        except Exception:
+            logger.exception("Failed to send error report")
+        finally:
+            del self._report_repeats[key]
+
+    def _get_bucket(self, channel_id: int) -> _TokenBucket:
+        bucket = self._channel_buckets.get(channel_id)
+        if bucket is None:
+            if len(self._channel_buckets) >= self.MAX_BUCKETS:
+                self._forget_idle_buckets()
+            bucket = _TokenBucket(*self.CHANNEL_RATE)
+            self._channel_buckets[channel_id] = bucket
+        return bucket
+
+    # Idle buckets are full, i.e. the same as a new bucket
+    def _forget_idle_buckets(self):
+        self._channel_buckets = {
+            channel_id: bucket
+            for channel_id, bucket in self._channel_buckets.items()
+            if not bucket.is_idle()
+        }
+
+    def _change_depth(self, priority: Priority, change: int):
+        self._depths[priority] += change
+        metrics.OUTBOUND_QUEUE_DEPTH.set(
+            self._depths[priority], priority=priority.name.lower()
+        )
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from src import time_utils
+from src.forecast_worker import RemoteWeatherService
+from src.models import Coordinates
+from src.scheduler import DailyJob, DailyScheduler
+from src.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_JOB_KIND = "prefetch"
+LocationKey = tuple[Coordinates, ZoneInfo]
+# Location and the day the alert is due, i.e. the alert is for the day after
+WarmKey = tuple[Coordinates, ZoneInfo, date]
+
+
+# Fetches, parses and evaluates the forecast of a location before its alert is sent, such that the alert does not wait for YR.
+# - The forecast is prefetched a lead time before the notify time of the alert
+# - Until the alert is sent, the forecast is fetched again whenever the YR response expires
+class ForecastPrefetcher:
+    RETRY_SECONDS = 60.0  # Time to wait before fetching again if prefetch failed
+    GRACE_PERIOD = timedelta(minutes=1)  # Keep warm a bit after the notify time
+
+    def __init__(
+        self,
+        weather_service: WeatherService | RemoteWeatherService,
+        scheduler: DailyScheduler,
+        lead_time: timedelta,
+    ) -> None:
+        self._weather_service = weather_service
+        self._scheduler = scheduler
+        self._lead_time = lead_time
+        self._locations: dict[int, LocationKey] = {}  # Location of each alert
+        self._keep_warm_until: dict[WarmKey, datetime] = {}
+        self._tasks: dict[WarmKey, asyncio.Task[None]] = {}
+        scheduler.register_handler(PREFETCH_JOB_KIND, self._prefetch)
+
+    # Prefetch the forecast for an alert with the given id.
+    # Ids are shared with the jobs of the alerts, i.e. adding an existing id replaces the prefetch of that alert
+    def add(
+        self,
+        alert_id: int,
+        coordinates: Coordinates,
+        time_zone: ZoneInfo,
+        notify_time: time,
+    ):
+        self._locations[alert_id] = (coordinates, time_zone)
+        prefetch_time = (
+            datetime.combine(date.min, notify_time)
+            + timedelta(days=1)
+            - self._lead_time
+        ).time()
+        self._scheduler.add(
+            DailyJob((PREFETCH_JOB_KIND, alert_id), time_zone, prefetch_time)
+        )
+
+    def remove(self, alert_id: int):
+        self._locations.pop(alert_id, None)
+        self._scheduler.cancel((PREFETCH_JOB_KIND, alert_id))
+
+    async def _prefetch(self, jobs: list[DailyJob]):
+        # Alerts are due a lead time from now, i.e. possibly on the next day in their time zone
+        due_time = time_utils.utc_now() + self._lead_time
+        keep_warm_until = due_time + self.GRACE_PERIOD
+        keys = {
+            (
+                coordinates,
+                time_zone,
+                time_utils.as_time_zone(due_time, time_zone).date(),
+            )
+            for coordinates, time_zone in (
+                self._locations[job.key[1]]
+                for job in jobs
+                if job.key[1] in self._locations
+            )
+        }
+        logger.info(f"Prefetching forecasts for {len(keys)} locations")
+        for key in keys:
+            self._keep_warm_until[key] = max(
+                keep_warm_until, self._keep_warm_until.get(key, keep_warm_until)
+            )
+            if key not in self._tasks:
+                self._tasks[key] = asyncio.create_task(self._keep_warm(key))
+
+    async def _keep_warm(self, key: WarmKey):
+        coordinates, time_zone, due_date = key
+        try:
+            while True:
+                try:
+                    # Evaluated as of the day the alert is due, such that the alert reuses the evaluation
+                    await self._weather_service.get_rainy_forecast_tomorrow(
+                        coordinates, time_zone, due_date
+                    )
+                    info = self._weather_service.get_latest_forecast_info(coordinates)
+                    assert info is not None
+                    next_fetch = info.expires
+                except Exception as e:
+                    logger.warning(
+                        f"Prefetch of forecast for {coordinates} failed: {e}"
+                    )
+                    next_fetch = time_utils.utc_now() + timedelta(
+                        seconds=self.RETRY_SECONDS
+                    )
+
+                if next_fetch >= self._keep_warm_until[key]:
+                    break
+                await asyncio.sleep(
+                    max((next_fetch - time_utils.utc_now()).total_seconds(), 0)
+                )
+        finally:
+            del self._tasks[key]
+            del self._keep_warm_until[key]
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+import discord
+
+import src.discord_messages as discord_messages
+from src import metrics, time_utils
+from src.forecast_worker import RemoteGeocoder, RemoteWeatherService
+from src.geocoding import ReverseGeocoder
+from src.models import Coordinates
+from src.subscriptions import Subscription
+from src.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
+
+SendAlert = Callable[[Subscription, discord.Embed], Awaitable[None]]
+
+# Location, time zone, target date (in the time zone) and the time the forecast was updated by YR
+EmbedKey = tuple[Coordinates, str, date, datetime]
+
+
+# A rendered rainy forecast. The embed is None if no rain
+@dataclass(frozen=True)
+class RenderedEmbed:
+    embed: discord.Embed | None
+
+
+# Creates rainy forecast alerts and sends them to subscribers
+class RainAlertService:
+    MAX_EMBEDS = 256
+
+    def __init__(
+        self,
+        weather_service: WeatherService | RemoteWeatherService,
+        geocoder: ReverseGeocoder | RemoteGeocoder,
+    ) -> None:
+        self._weather_service = weather_service
+        self._geocoder = geocoder
+        # Rendered embeds, such that all requests for the same forecast share the same message until the forecast is updated
+        self._embeds: OrderedDict[EmbedKey, RenderedEmbed] = OrderedDict()
+
+    # Returns the embed for tomorrow if already rendered for the current forecast, without fetching or rendering. None if not ready
+    def get_ready_embed(
+        self, coordinates: Coordinates, time_zone: ZoneInfo
+    ) -> RenderedEmbed | None:
+        info = self._weather_service.get_latest_forecast_info(coordinates)
+        if info is None or info.is_expired():
+            return None
+        key = _get_embed_key(coordinates, time_zone, info.updated_at)
+        rendered = self._embeds.get(key)
+        if rendered is not None:
+            self._embeds.move_to_end(key)
+        return rendered
+
+    # Returns the rainy forecast embed for tomorrow, or None if no rain
+    async def create_embed(
+        self, coordinates: Coordinates, time_zone: ZoneInfo
+    ) -> discord.Embed | None:
+        rendered = self.get_ready_embed(coordinates, time_zone)
+        if rendered is not None:
+            metrics.RENDERED_EMBEDS.inc(result="hit")
+            return rendered.embed
+        metrics.RENDERED_EMBEDS.inc(result="rendered")
+
+        forecast, forecast_symbol = (
+            await self._weather_service.get_rainy_forecast_tomorrow(
+                coordinates, time_zone
+            )
+        )
+        forecast_age = self._weather_service.get_forecast_age(coordinates)
+        logger.info(f"Forecast for {coordinates} fetched {forecast_age} ago")
+        # The forecast just evaluated
+        info = self._weather_service.get_latest_forecast_info(coordinates)
+        assert info is not None
+        embed = None
+        city = None
+        if forecast is not None and forecast_symbol is not None:
+            city = await self._geocoder.get_city_async(forecast.coordinates)
+            embed = discord_messages.rainy_weather_forecast_tomorrow(
+                forecast, forecast_symbol, time_zone, city
+            )
+        # Not reused if rendered without the city, e.g. if geocoding was slow, such that later requests get the city once it is looked up
+        if embed is None or city is not None:
+            self._set_embed(
+                _get_embed_key(coordinates, time_zone, info.updated_at),
+                RenderedEmbed(embed),
+            )
+        return embed
+
+    # Sends the rainy forecast to each subscriber.
+    # Subscribers sharing a location (and time zone) share the same forecast and embed, i.e. each location is only fetched and evaluated once
+    async def send_alerts(self, subscriptions: list[Subscription], send: SendAlert):
+        subscriptions_by_location: dict[tuple[Coordinates, str], list[Subscription]] = (
+            defaultdict(list)
+        )
+        for subscription in subscriptions:
+            subscriptions_by_location[subscription.location_key].append(subscription)
+
+        logger.info(
+            f"Sending rain alerts to {len(subscriptions)} subscribers at {len(subscriptions_by_location)} locations"
+        )
+        await asyncio.gather(
+            *(
+                self._send_location_alerts(location_subscriptions, send)
+                for location_subscriptions in subscriptions_by_location.values()
+            )
+        )
+
+    async def _send_location_alerts(
+        self, subscriptions: list[Subscription], send: SendAlert
+    ):
+        location = subscriptions[0]
+        try:
+            embed = await self.create_embed(location.coordinates, location.time_zone)
+        except Exception:
+            metrics.ERRORS.inc(stage="alert")
+            logger.exception(
+                f"Failed to create rain alert for {location.coordinates} ({location.time_zone})"
+            )
+            return
+        if embed is None:
+            return
+        forecast_age = self._weather_service.get_forecast_age(location.coordinates)
+        if forecast_age is not None:
+            metrics.FORECAST_AGE_SECONDS.observe(forecast_age.total_seconds())
+
+        results = await asyncio.gather(
+            *(send(subscription, embed) for subscription in subscriptions),
+            return_exceptions=True,
+        )
+        for subscription, result in zip(subscriptions, results):
+            if isinstance(result, BaseException):
+                metrics.ERRORS.inc(stage="send")
+                logger.warning(
+                    f"Failed to send rain alert (subscription id: {subscription.id}): {result}"
+                )
+
+    def _set_embed(self, key: EmbedKey, rendered: RenderedEmbed):
+        self._embeds[key] = rendered
+        self._embeds.move_to_end(key)
+        while len(self._embeds) > self.MAX_EMBEDS:
+            self._embeds.popitem(last=False)
+
+
+def _get_embed_key(
+    coordinates: Coordinates, time_zone: ZoneInfo, updated_at: datetime
+) -> EmbedKey:
+    tomorrow = time_utils.now(time_zone).date() + timedelta(days=1)
+    return (coordinates, time_zone.key, tomorrow, updated_at)
@@ -0,0 +1,390 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from src import metrics, time_utils
+
+logger = logging.getLogger(__name__)
+
+
+# A YR API response together with the cache headers needed to reuse it
+@dataclass(frozen=True)
+class YrResponse:
+    data: dict[str, Any]
+    expires: datetime
+    last_modified: str | None
+    from_cache: bool
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    memory_evictions: int
+    disk_evictions: int
+    memory_entries: int
+    disk_bytes: int  # As of the last eviction
+
+
+# Two-tier cache of YR responses:
+# - Memory: Bounded LRU of decoded responses, i.e. a hit costs a dict lookup
+# - Disk (optional): sqlite db of zlib compressed response bodies. Survives restarts and holds more locations than the memory tier
+# All disk access is done in a single background thread, such that the event loop never waits for the disk (except when reading on a memory miss).
+# Expired responses are kept for a while, as they can still be revalidated with "If-Modified-Since" instead of downloaded again.
+# Evicted from disk in the background when stale for longer than that, or least recently used when the disk tier exceeds its size cap.
+# The disk tier can be shared by several processes (e.g. shards of the bot). Processes then take turns fetching a response using a lease,
+# and check the disk tier for a response fetched by another process before revalidating an expired response
+class ResponseCache:
+    DB_PATH = "./data/yr_cache.sqlite"
+    MAX_MEMORY_ENTRIES = 256
+    MAX_DISK_BYTES = 50 * 1024 * 1024
+    STALE_RETENTION = timedelta(
+        hours=1
+    )  # Time to keep expired responses for revalidation
+    EVICTION_INTERVAL_SECONDS = 300.0
+    COMPRESSION_LEVEL = 6
+    LEASE_SECONDS = (
+        15.0  # Max time to fetch a response while other processes wait for it
+    )
+    LEASE_POLL_SECONDS = 0.1
+
+    def __init__(
+        self,
+        db_path: str | None = DB_PATH,  # None: Memory only
+        max_memory_entries: int = MAX_MEMORY_ENTRIES,
+        max_disk_bytes: int = MAX_DISK_BYTES,
+    ) -> None:
+        self._max_memory_entries = max_memory_entries
+        self._max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, YrResponse] = OrderedDict()
+        self._executor: ThreadPoolExecutor | None = None
+        self._db: sqlite3.Connection | None = None
+        if db_path is not None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            # Single thread, such that disk operations are serialized and the connection is never used concurrently
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="response-cache"
+            )
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._create_tables()
+        self._eviction_task: asyncio.Task[None] | None = None
+        self._lease_owner = uuid.uuid4().hex  # Identifies this process
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._memory_evictions = 0
+        self._disk_evictions = 0
+        self._disk_bytes = 0
+
+    # Returns the cached response (expired or not), or None if not cached
+    async def get(self, key: str) -> YrResponse | None:
+        response = self._memory.get(key)
+        if response is not None and (
+            self._executor is None or time_utils.utc_now() < response.expires
+        ):
+            self._memory.move_to_end(key)
+            self._memory_hits += 1
+            metrics.RESPONSE_CACHE_LOOKUPS.inc(result="memory_hit")
+            return response
+
+        # Also when expired in memory, as another process sharing the disk tier may have fetched the response since
+        if self._executor is not None:
+            disk_response = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._get_from_disk, key
+            )
+            if disk_response is not None and (
+                response is None or disk_response.expires > response.expires
+            ):
+                self._disk_hits += 1
+                metrics.RESPONSE_CACHE_LOOKUPS.inc(result="disk_hit")
+                self._set_in_memory(key, disk_response)
+                return disk_response
+
+        if response is not None:
+            self._memory.move_to_end(key)
+            self._memory_hits += 1
+            metrics.RESPONSE_CACHE_LOOKUPS.inc(result="memory_hit")
+            return response
+
+        self._misses += 1
+        metrics.RESPONSE_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    # Leases fetching the response, such that processes sharing the disk tier do not request the same response at the same time.
+    # Returns False if leased by another process. Always True without a disk tier
+    async def acquire_lease(self, key: str) -> bool:
+        if self._executor is None:
+            return True
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._acquire_lease_on_disk, key
+        )
+
+    # Released after the pending disk writes, i.e. the fetched response is on disk for the other processes when released
+    def release_lease(self, key: str):
+        if self._executor is not None:
+            self._submit(self._release_lease_on_disk, key)
+
+    # Waits until the process holding the lease has stored the response (or the lease is released or expires), and returns the cached response.
+    # The response is still expired (or None) if the other process failed to fetch it
+    async def wait_for_lease(self, key: str) -> YrResponse | None:
+        if self._executor is None:
+            return self._memory.get(key)
+        deadline = time.monotonic() + self.LEASE_SECONDS
+        while True:
+            response, is_leased = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._get_leased_from_disk, key
+            )
+            is_fresh = response is not None and time_utils.utc_now() < response.expires
+            if is_fresh or not is_leased or time.monotonic() > deadline:
+                if response is not None:
+                    self._set_in_memory(key, response)
+                return response
+            await asyncio.sleep(self.LEASE_POLL_SECONDS)
+
+    # Caches the response. The body is the response as received from YR, which is stored on disk (encoded from the data if not given)
+    def set(self, key: str, response: YrResponse, body: bytes | None = None):
+        response = replace(response, from_cache=False)
+        self._set_in_memory(key, response)
+        if self._executor is not None:
+            self._submit(self._set_on_disk, key, response, body)
+
+    # Updates the expiration of a cached response, e.g. after a 304
+    def refresh(self, key: str, expires: datetime, last_modified: str | None):
+        response = self._memory.get(key)
+        if response is not None:
+            self._memory[key] = replace(
+                response, expires=expires, last_modified=last_modified
+            )
+        if self._executor is not None:
+            self._submit(self._refresh_on_disk, key, expires, last_modified)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            memory_hits=self._memory_hits,
+            disk_hits=self._disk_hits,
+            misses=self._misses,
+            memory_evictions=self._memory_evictions,
+            disk_evictions=self._disk_evictions,
+            memory_entries=len(self._memory),
+            disk_bytes=self._disk_bytes,
+        )
+
+    # Starts evicting from disk in the background
+    def start(self):
+        if self._executor is not None and self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(self._run_eviction())
+
+    def stop(self):
+        if self._eviction_task:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+
+    # Waits for pending disk writes and closes the db
+    def close(self):
+        self.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._db is not None:
+            self._db.close()
+
+    # Evicts stale responses, then the least recently used responses until within the size cap. Returns the number of evicted responses
+    async def evict(self) -> int:
+        if self._executor is None:
+            return 0
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._evict_from_disk
+        )
+
+    async def _run_eviction(self):
+        while True:
+            await asyncio.sleep(self.EVICTION_INTERVAL_SECONDS)
+            try:
+                await self.evict()
+            except Exception:
+                metrics.ERRORS.inc(stage="response_cache")
+                logger.exception("Failed to evict responses from disk cache")
+            logger.info(f"Response cache: {self.stats()}")
+
+    def _set_in_memory(self, key: str, response: YrResponse):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_memory_entries:
+            self._memory.popitem(last=False)
+            self._memory_evictions += 1
+            metrics.RESPONSE_CACHE_EVICTIONS.inc(tier="memory", reason="size")
+
+    def _submit(self, fn: Any, *args: Any):
+        assert self._executor is not None
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(_log_error)
+
+    # Disk operations below are run by the executor thread
+
+    def _get_from_disk(self, key: str) -> YrResponse | None:
+        assert self._db is not None
+        row = self._db.execute(
+            "SELECT body, expires, last_modified FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time_utils.utc_now().timestamp(), key),
+            )
+        body, expires, last_modified = row
+        return YrResponse(
+            data=json.loads(zlib.decompress(body)),
+            expires=datetime.fromtimestamp(expires, tz=timezone.utc),
+            last_modified=last_modified,
+            from_cache=False,
+        )
+
+    def _set_on_disk(self, key: str, response: YrResponse, body: bytes | None):
+        assert self._db is not None
+        if body is None:
+            body = json.dumps(response.data).encode()
+        compressed = zlib.compress(body, self.COMPRESSION_LEVEL)
+        with self._db:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO responses (key, body, size, expires, last_modified, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    key,
+                    compressed,
+                    len(compressed),
+                    response.expires.timestamp(),
+                    response.last_modified,
+                    time_utils.utc_now().timestamp(),
+                ),
+            )
+
+    def _refresh_on_disk(self, key: str, expires: datetime, last_modified: str | None):
+        assert self._db is not None
+        with self._db:
+            self._db.execute(
+                "UPDATE responses SET expires = ?, last_modified = ?, last_access = ? WHERE key = ?",
+                (
+                    expires.timestamp(),
+                    last_modified,
+                    time_utils.utc_now().timestamp(),
+                    key,
+                ),
+            )
+
+    def _acquire_lease_on_disk(self, key: str) -> bool:
+        assert self._db is not None
+        now = time_utils.utc_now().timestamp()
+        # A single transaction, i.e. other processes cannot acquire the lease in between
+        with self._db:
+            self._db.execute(
+                "DELETE FROM leases WHERE key = ? AND expires < ?", (key, now)
+            )
+            self._db.execute(
+                "INSERT OR IGNORE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                (key, self._lease_owner, now + self.LEASE_SECONDS),
+            )
+            (owner,) = self._db.execute(
+                "SELECT owner FROM leases WHERE key = ?", (key,)
+            ).fetchone()
+        return owner == self._lease_owner
+
+    def _release_lease_on_disk(self, key: str):
+        assert self._db is not None
+        with self._db:
+            self._db.execute(
+                "DELETE FROM leases WHERE key = ? AND owner = ?",
+                (key, self._lease_owner),
+            )
+
+    def _get_leased_from_disk(self, key: str) -> tuple[YrResponse | None, bool]:
+        assert self._db is not None
+        lease = self._db.execute(
+            "SELECT 1 FROM leases WHERE key = ? AND expires >= ?",
+            (key, time_utils.utc_now().timestamp()),
+        ).fetchone()
+        return self._get_from_disk(key), lease is not None
+
+    def _evict_from_disk(self) -> int:
+        assert self._db is not None
+        stale_before = (time_utils.utc_now() - self.STALE_RETENTION).timestamp()
+        with self._db:
+            # Leases of processes that stopped while fetching
+            self._db.execute(
+                "DELETE FROM leases WHERE expires < ?",
+                (time_utils.utc_now().timestamp(),),
+            )
+            stale_count = self._db.execute(
+                "DELETE FROM responses WHERE expires < ?", (stale_before,)
+            ).rowcount
+
+            # Least recently used first. Delete until the remaining responses are within the size cap
+            size_count = 0
+            total_size = 0
+            keys_to_delete: list[str] = []
+            for key, size in self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_access DESC"
+            ):
+                total_size += size
+                if total_size > self._max_disk_bytes:
+                    keys_to_delete.append(key)
+                    total_size -= size
+            if keys_to_delete:
+                size_count = len(keys_to_delete)
+                self._db.executemany(
+                    "DELETE FROM responses WHERE key = ?",
+                    [(key,) for key in keys_to_delete],
+                )
+
+        self._disk_bytes = total_size
+        self._disk_evictions += stale_count + size_count
+        metrics.RESPONSE_CACHE_EVICTIONS.inc(stale_count, tier="disk", reason="stale")
+        metrics.RESPONSE_CACHE_EVICTIONS.inc(size_count, tier="disk", reason="size")
+        metrics.RESPONSE_CACHE_DISK_BYTES.set(total_size)
+        if stale_count or size_count:
+            logger.info(
+                f"Evicted {stale_count} stale and {size_count} least recently used responses from disk cache"
+            )
+        return stale_count + size_count
+
+    def _create_tables(self):
+        assert self._db is not None
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    last_modified TEXT,
+                    last_access REAL NOT NULL
+                )
+                """)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires REAL NOT NULL
+                )
+                """)
+
+
+def _log_error(future: "Future[Any]"):
+    error = future.exception()
+    if error is not None:
+        metrics.ERRORS.inc(stage="response_cache")
+        logger.error(f"Response cache disk operation failed: {error}")
@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+from src import metrics, time_utils
+
+logger = logging.getLogger(__name__)
+
+JobKey = tuple[str, int]  # (kind, id). Kind decides which handler runs the job
+
+
+# A job running every day at a local time of day in a time zone
+@dataclass(frozen=True)
+class DailyJob:
+    key: JobKey
+    time_zone: ZoneInfo
+    time_of_day: time
+
+    @property
+    def kind(self) -> str:
+        return self.key[0]
+
+
+JobBatchHandler = Callable[[list[DailyJob]], Awaitable[None]]
+
+
+# Runs daily jobs at their local time of day.
+# - Jobs are kept in a heap ordered by their next due time (UTC), i.e. O(log n) to add a job, and the loop only wakes up when a job is due
+# - Cancelled jobs are removed lazily when they reach the top of the heap
+# - All jobs due at the same time are run as a single batch per kind, such that handlers can share work between them
+# - When run, a job is rescheduled for its time of day the next day. The UTC time is recomputed from the local time, i.e. DST changes are respected
+class DailyScheduler:
+    MAX_SLEEP_SECONDS = (
+        60.0  # Wake up regularly, such that changes of the system clock are noticed
+    )
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[datetime, int, DailyJob]] = []
+        self._jobs: dict[JobKey, tuple[datetime, int]] = (
+            {}
+        )  # Current heap entry of each job
+        self._handlers: dict[str, JobBatchHandler] = {}
+        self._sequence = 0  # Tie breaker for jobs due at the same time
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._handler_tasks: set[asyncio.Task[None]] = set()
+
+    def register_handler(self, kind: str, handler: JobBatchHandler):
+        self._handlers[kind] = handler
+
+    # Adds the job, replacing any existing job with the same key
+    def add(self, job: DailyJob):
+        self._push(job, _next_occurrence(job, time_utils.utc_now()))
+
+    # Returns true if the job was scheduled
+    def cancel(self, key: JobKey) -> bool:
+        removed = self._jobs.pop(key, None) is not None
+        # Rebuild the heap if it mostly consists of cancelled jobs
+        if removed and len(self._heap) > 2 * len(self._jobs) + 64:
+            self._heap = [entry for entry in self._heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+        return removed
+
+    def get_next_due_time(self, key: JobKey) -> datetime | None:
+        entry = self._jobs.get(key)
+        return entry[0] if entry else None
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def start(self):
+        if self._task is None:
+            logger.info(f"Starting scheduler with {len(self._jobs)} jobs")
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _push(self, job: DailyJob, due_time: datetime):
+        self._sequence += 1
+        entry = (due_time, self._sequence, job)
+        self._jobs[job.key] = (due_time, self._sequence)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()  # New first job, sleep time changed
+
+    def _is_current(self, entry: tuple[datetime, int, DailyJob]) -> bool:
+        due_time, sequence, job = entry
+        return self._jobs.get(job.key) == (due_time, sequence)
+
+    async def _run(self):
+        while True:
+            # Drop cancelled (or replaced) jobs
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+
+            now = time_utils.utc_now()
+            if not self._heap or self._heap[0][0] > now:
+                sleep_seconds = (
+                    (self._heap[0][0] - now).total_seconds()
+                    if self._heap
+                    else self.MAX_SLEEP_SECONDS
+                )
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), min(sleep_seconds, self.MAX_SLEEP_SECONDS)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Run all jobs that are due
+            batch: list[DailyJob] = []
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if not self._is_current(entry):
+                    continue
+                _, _, job = entry
+                batch.append(job)
+                # From now, not from the due time, such that days missed (e.g. after a long stall or a suspend) are skipped instead of run in a burst
+                self._push(job, _next_occurrence(job, now))
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list[DailyJob]):
+        jobs_by_kind: dict[str, list[DailyJob]] = defaultdict(list)
+        for job in batch:
+            jobs_by_kind[job.kind].append(job)
+        for kind, jobs in jobs_by_kind.items():
+            handler = self._handlers.get(kind)
+            if handler is None:
+                logger.warning(f"No handler for {len(jobs)} scheduled '{kind}' jobs")
+                continue
+            logger.info(f"Running {len(jobs)} scheduled '{kind}' jobs")
+            task = asyncio.create_task(self._run_handler(kind, handler, jobs))
+            # Keep a reference until done, such that the task is not garbage collected
+            self._handler_tasks.add(task)
+            task.add_done_callback(self._handler_tasks.discard)
+
+    async def _run_handler(
+        self, kind: str, handler: JobBatchHandler, jobs: list[DailyJob]
+    ):
+        try:
+            await handler(jobs)
+        except Exception:
+            metrics.ERRORS.inc(stage="scheduler")
+            logger.exception(f"Scheduled '{kind}' jobs failed")
+
+
+# Returns the first time (UTC) after the given time where the local time of day of the job occurs
+def _next_occurrence(job: DailyJob, after: datetime) -> datetime:
+    local_date = time_utils.as_time_zone(after, job.time_zone).date()
+    due_time = _local_to_utc(job.time_zone, local_date, job.time_of_day)
+    while due_time <= after:
+        local_date += timedelta(days=1)
+        due_time = _local_to_utc(job.time_zone, local_date, job.time_of_day)
+    return due_time
+
+
+# Cached, as jobs in the same time zone with the same time of day share the UTC time each day
+@lru_cache(maxsize=4096)
+def _local_to_utc(time_zone: ZoneInfo, local_date: date, time_of_day: time) -> datetime:
+    return time_utils.as_utc(
+        datetime.combine(local_date, time_of_day, tzinfo=time_zone)
+    )
@@ -0,0 +1,121 @@
+import json
+import logging
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from src.models import Coordinates
+
+logger = logging.getLogger(__name__)
+
+
+# A rain alert sent to a channel, which is kept up to date when the forecast changes
+@dataclass(frozen=True)
+class SentAlert:
+    channel_id: int  # The channel of the message (the DM channel for direct messages)
+    guild_id: int | None  # The guild of the alert, i.e. the shard updating it
+    message_id: int
+    date: date  # Date of the forecast (in the time zone)
+    coordinates: Coordinates
+    time_zone: ZoneInfo
+    updated_at: datetime  # The last forecast compared with the message
+    # As shown by the message. Hour (epoch seconds) -> precipitation amount
+    rainy_hours: dict[int, float]
+
+    # A channel has one alert per date and location
+    @property
+    def key(self) -> tuple[int, str, float, float, str]:
+        return (
+            self.channel_id,
+            self.date.isoformat(),
+            self.coordinates.lat,
+            self.coordinates.lon,
+            self.time_zone.key,
+        )
+
+
+# Persists sent alerts in a sqlite db, such that alerts are still updated after a restart
+class SentAlertStore:
+    DB_PATH = "./data/sent_alerts.sqlite"
+
+    def __init__(self, db_path: str = DB_PATH) -> None:
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.row_factory = sqlite3.Row
+        self._create_tables()
+
+    # Adds the alert, or replaces the alert of the same channel, date and location
+    def set(self, alert: SentAlert):
+        with self._db:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO sent_alerts (channel_id, date, lat, lon, time_zone, guild_id, message_id, updated_at, rainy_hours)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    *alert.key,
+                    alert.guild_id,
+                    alert.message_id,
+                    alert.updated_at.timestamp(),
+                    json.dumps(alert.rainy_hours),
+                ),
+            )
+
+    def get_all(self) -> list[SentAlert]:
+        rows = self._db.execute("SELECT * FROM sent_alerts").fetchall()
+        return [_to_sent_alert(row) for row in rows]
+
+    def remove(self, alert: SentAlert):
+        with self._db:
+            self._db.execute(
+                """
+                DELETE FROM sent_alerts
+                WHERE channel_id = ? AND date = ? AND lat = ? AND lon = ? AND time_zone = ?
+                """,
+                alert.key,
+            )
+
+    def close(self):
+        self._db.close()
+
+    def _create_tables(self):
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS sent_alerts (
+                    channel_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    time_zone TEXT NOT NULL,
+                    guild_id INTEGER,
+                    message_id INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    rainy_hours TEXT NOT NULL,
+                    PRIMARY KEY (channel_id, date, lat, lon, time_zone)
+                )
+                """)
+            # Added for sharding. Alerts sent before have no guild, i.e. are updated by shard 0 (as direct messages)
+            columns = [
+                row["name"]
+                for row in self._db.execute("PRAGMA table_info(sent_alerts)")
+            ]
+            if "guild_id" not in columns:
+                self._db.execute("ALTER TABLE sent_alerts ADD COLUMN guild_id INTEGER")
+
+
+def _to_sent_alert(row: sqlite3.Row) -> SentAlert:
+    return SentAlert(
+        channel_id=row["channel_id"],
+        guild_id=row["guild_id"],
+        message_id=row["message_id"],
+        date=date.fromisoformat(row["date"]),
+        coordinates=Coordinates(row["lat"], row["lon"]),
+        time_zone=ZoneInfo(row["time_zone"]),
+        updated_at=datetime.fromtimestamp(row["updated_at"], tz=timezone.utc),
+        # JSON object keys are strings
+        rainy_hours={
+            int(hour): amount for hour, amount in json.loads(row["rainy_hours"]).items()
+        },
+    )
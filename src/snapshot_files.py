@@ -0,0 +1,145 @@
+import logging
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from src import time_utils
+from src.forecast_snapshot import ForecastSnapshot
+from src.forecast_table import ForecastTable
+from src.models import Coordinates
+
+logger = logging.getLogger(__name__)
+
+# Binary file format of a forecast snapshot (little endian):
+# - Header (see HEADER)
+# - Symbol codes of the table as utf-8, separated by newlines. Padded to 8 bytes
+# - Columns of the table in the order of COLUMNS, each with a value per row
+MAGIC = b"WBFS"
+VERSION = 2
+# magic, version, flags, rows, symbols size, lat, lon, updated_at, expires, fetched_at (epoch seconds)
+HEADER = struct.Struct("<4sHHIIddddd")
+FLAG_COMPLETE = 1
+# 8 byte columns first, such that all columns are aligned
+COLUMNS: tuple[tuple[str, type[np.generic]], ...] = (
+    ("times", np.int64),
+    ("precipitation_amount", np.float64),
+    ("precipitation_amount_min", np.float64),
+    ("precipitation_amount_max", np.float64),
+    ("probability_of_precipitation", np.float64),
+    ("precipitation_amount_6h", np.float64),
+    ("probability_of_precipitation_6h", np.float64),
+    ("symbol_codes_1h", np.int16),
+    ("symbol_codes_12h", np.int16),
+)
+
+
+# Persists forecast snapshots as binary files (one per location), such that parsed forecasts survive restarts.
+# Files are memory mapped when loaded, i.e. the columns of the table are read from the file on demand instead of being parsed
+class ForecastSnapshotFiles:
+    DIRECTORY = "./data/snapshots"
+    FILE_SUFFIX = ".forecast"
+    MAX_AGE = timedelta(
+        days=1
+    )  # Delete files expired longer than this, e.g. of locations no longer used
+
+    def __init__(self, directory: str = DIRECTORY) -> None:
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    def save(self, snapshot: ForecastSnapshot):
+        table = snapshot.table
+        symbols = "\n".join(table.symbols).encode()
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            FLAG_COMPLETE if snapshot.is_complete else 0,
+            len(table),
+            len(symbols),
+            snapshot.coordinates.lat,
+            snapshot.coordinates.lon,
+            snapshot.updated_at.timestamp(),
+            snapshot.expires.timestamp(),
+            snapshot.fetched_at.timestamp(),
+        )
+        path = self._get_path(snapshot.coordinates)
+        # Per process, as the directory may be shared by several processes (e.g. shards)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "wb") as file:
+            file.write(header)
+            file.write(symbols)
+            file.write(bytes(-len(symbols) % 8))
+            for name, dtype in COLUMNS:
+                file.write(np.ascontiguousarray(getattr(table, name), dtype).tobytes())
+        # Replace atomically, such that a crash never leaves a partially written snapshot
+        os.replace(temp_path, path)
+
+    # Loads all snapshots, including expired ones (which can still be revalidated). Invalid and old files are deleted
+    def load_all(self) -> list[ForecastSnapshot]:
+        snapshots: list[ForecastSnapshot] = []
+        delete_before = time_utils.utc_now() - self.MAX_AGE
+        for path in self._directory.glob(f"*{self.FILE_SUFFIX}"):
+            try:
+                snapshot = load(path)
+            except Exception as e:
+                logger.warning(f"Deleting invalid snapshot file '{path}': {e}")
+                path.unlink(missing_ok=True)
+                continue
+            if snapshot.expires < delete_before:
+                path.unlink(missing_ok=True)
+                continue
+            snapshots.append(snapshot)
+        return snapshots
+
+    def _get_path(self, coordinates: Coordinates) -> Path:
+        return (
+            self._directory / f"{coordinates.lat}_{coordinates.lon}{self.FILE_SUFFIX}"
+        )
+
+
+def load(path: Path) -> ForecastSnapshot:
+    with open(path, "rb") as file:
+        # The map stays open for as long as the columns of the table refer to it
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    (
+        magic,
+        version,
+        flags,
+        rows,
+        symbols_size,
+        lat,
+        lon,
+        updated_at,
+        expires,
+        fetched_at,
+    ) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise Exception("Not a forecast snapshot file")
+    if version != VERSION:
+        raise Exception(f"Unsupported version {version}")
+
+    offset = HEADER.size
+    symbols = buffer[offset : offset + symbols_size].decode()
+    offset += symbols_size + (-symbols_size % 8)
+    columns: dict[str, np.ndarray] = {}
+    for name, dtype in COLUMNS:
+        columns[name] = np.frombuffer(buffer, dtype, count=rows, offset=offset)
+        offset += rows * np.dtype(dtype).itemsize
+
+    return ForecastSnapshot(
+        coordinates=Coordinates(lat, lon),
+        updated_at=_from_timestamp(updated_at),
+        expires=_from_timestamp(expires),
+        fetched_at=_from_timestamp(fetched_at),
+        is_complete=bool(flags & FLAG_COMPLETE),
+        table=ForecastTable(
+            **columns, symbols=tuple(symbols.split("\n")) if symbols else ()
+        ),
+    )
+
+
+def _from_timestamp(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
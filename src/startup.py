@@ -1,18 +1,125 @@
 import logging
 import time
+from datetime import timedelta
 
 import colorlog
 
+from src.alert_updates import AlertUpdater
 from src.config import AppConfig
 from src.container import Container
-from src.weather_client import YrWeatherClient
+from src.forecast_worker import (
+    ForecastWorkerClient,
+    RemoteGeocoder,
+    RemoteWeatherService,
+)
+from src.geocoding import ReverseGeocoder
+from src.location_buckets import LocationBuckets
+from src.nowcast import NowcastService
+from src.nowcast_alerts import NowcastAlerter
+from src.outbound import OutboundQueue
+from src.prefetcher import ForecastPrefetcher
+from src.rain_alerts import RainAlertService
+from src.response_cache import ResponseCache
+from src.scheduler import DailyScheduler
+from src.sent_alerts import SentAlertStore
+from src.snapshot_files import ForecastSnapshotFiles
+from src.subscriptions import SubscriptionStore
+from src.weather_client import AsyncYrWeatherClient, YrWeatherClient
 from src.weather_service import WeatherService
 
 
 def resolve_deps(config: AppConfig) -> Container:
-    weather_client = YrWeatherClient()
-    weather_service = WeatherService(weather_client)
-    return Container(weather_service, weather_client, config)
+    weather_client: YrWeatherClient | None = None
+    async_weather_client: AsyncYrWeatherClient | None = None
+    response_cache: ResponseCache | None = None
+    forecast_worker: ForecastWorkerClient | None = None
+    weather_service: WeatherService | RemoteWeatherService
+    geocoder: ReverseGeocoder | RemoteGeocoder
+    buckets = LocationBuckets(config.forecast_geohash_precision)
+    if config.forecast_worker_sockets:
+        # Fetched, parsed and evaluated by the workers
+        forecast_worker = ForecastWorkerClient(config.forecast_worker_sockets, buckets)
+        weather_service = RemoteWeatherService(forecast_worker)
+        geocoder = RemoteGeocoder(forecast_worker)
+        if config.nowcast_interval_minutes:
+            # Nowcasts are small and only decoded when updated, i.e. cheap enough to poll from the bot process
+            async_weather_client = AsyncYrWeatherClient(
+                config.yr_base_url, nowcast_base_url=config.yr_nowcast_base_url
+            )
+    else:
+        weather_client = YrWeatherClient(config.yr_base_url)
+        response_cache = ResponseCache()
+        async_weather_client = AsyncYrWeatherClient(
+            config.yr_base_url,
+            cache=response_cache,
+            nowcast_base_url=config.yr_nowcast_base_url,
+        )
+        weather_service = WeatherService(
+            weather_client, async_weather_client, ForecastSnapshotFiles(), buckets
+        )
+        geocoder = ReverseGeocoder()
+    subscription_store = SubscriptionStore()
+    rain_alert_service = RainAlertService(weather_service, geocoder)
+    alert_updater = AlertUpdater(weather_service, geocoder, SentAlertStore())
+    scheduler = DailyScheduler()
+    prefetcher = ForecastPrefetcher(
+        weather_service,
+        scheduler,
+        lead_time=timedelta(minutes=config.prefetch_lead_minutes),
+    )
+    nowcast_alerter: NowcastAlerter | None = None
+    if config.nowcast_interval_minutes and async_weather_client:
+        nowcast_alerter = NowcastAlerter(
+            NowcastService(async_weather_client),
+            geocoder,
+            interval=timedelta(minutes=config.nowcast_interval_minutes),
+        )
+    return Container(
+        weather_service,
+        weather_client,
+        async_weather_client,
+        response_cache,
+        geocoder,
+        subscription_store,
+        rain_alert_service,
+        alert_updater,
+        OutboundQueue(),
+        scheduler,
+        prefetcher,
+        forecast_worker,
+        nowcast_alerter,
+        config,
+    )
+
+
+# Measures the time of each phase of the startup, e.g. imports, config, loading cogs, syncing commands
+class StartupProfiler:
+    def __init__(self, started_at: float | None = None) -> None:
+        self._started_at = started_at if started_at is not None else time.perf_counter()
+        self._last_mark = self._started_at
+        self.phases: list[tuple[str, float]] = []  # Name and duration in seconds
+
+    # Ends the current phase
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    # Time since start (until the last phase ended)
+    def total_seconds(self) -> float:
+        return self._last_mark - self._started_at
+
+    # Time since start until now
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self._started_at
+
+    def format(self) -> str:
+        lines = [f"{'phase':<16} {'time (ms)':>10}"]
+        lines += [
+            f"{phase:<16} {seconds * 1000:>10.1f}" for phase, seconds in self.phases
+        ]
+        lines.append(f"{'total':<16} {self.total_seconds() * 1000:>10.1f}")
+        return "\n".join(lines)
 
 
 def setup_logging(log_level: int = logging.INFO):
@@ -0,0 +1,189 @@
+import logging
+import sqlite3
+from dataclasses import dataclass
+from datetime import time
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from src.location_buckets import canonical_coordinates
+from src.models import Coordinates
+
+logger = logging.getLogger(__name__)
+
+
+# Subscription to a daily rainy forecast for a location. Sent to either a channel or a user (direct message)
+@dataclass(frozen=True)
+class Subscription:
+    id: int
+    guild_id: int | None
+    channel_id: int | None
+    user_id: int | None
+    coordinates: Coordinates
+    time_zone: ZoneInfo
+    notify_time: time  # Local time of day in the time zone
+    # Also alert when rain is about to start (see nowcast_alerts.py)
+    nowcast: bool = False
+
+    # The channel or user the alert is sent to
+    @property
+    def target_id(self) -> int:
+        target_id = self.channel_id or self.user_id
+        assert target_id is not None
+        return target_id
+
+    # Subscribers sharing this key get the same rainy forecast
+    @property
+    def location_key(self) -> tuple[Coordinates, str]:
+        return self.coordinates, self.time_zone.key
+
+
+# Persists subscriptions in a sqlite db
+class SubscriptionStore:
+    DB_PATH = "./data/subscriptions.sqlite"
+
+    def __init__(self, db_path: str = DB_PATH) -> None:
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.row_factory = sqlite3.Row
+        self._create_tables()
+
+    def add(
+        self,
+        coordinates: Coordinates,
+        time_zone: ZoneInfo,
+        notify_time: time,
+        guild_id: int | None = None,
+        channel_id: int | None = None,
+        user_id: int | None = None,
+        nowcast: bool = False,
+    ) -> Subscription:
+        if (channel_id is None) == (user_id is None):
+            raise ValueError("Subscription must have either a channel or a user")
+        # Rounded like the requests to YR, which also makes subscribers of the same place share the same location
+        coordinates = canonical_coordinates(coordinates)
+        notify_time = notify_time.replace(second=0, microsecond=0)
+        with self._db:
+            cursor = self._db.execute(
+                """
+                INSERT INTO subscriptions (guild_id, channel_id, user_id, lat, lon, time_zone, notify_time, nowcast)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    guild_id,
+                    channel_id,
+                    user_id,
+                    coordinates.lat,
+                    coordinates.lon,
+                    time_zone.key,
+                    _format_time(notify_time),
+                    nowcast,
+                ),
+            )
+        subscription_id = cursor.lastrowid
+        assert subscription_id is not None
+        logger.info(f"Subscription added (id: {subscription_id})")
+        return Subscription(
+            subscription_id,
+            guild_id,
+            channel_id,
+            user_id,
+            coordinates,
+            time_zone,
+            notify_time,
+            nowcast,
+        )
+
+    def get(self, subscription_id: int) -> Subscription | None:
+        row = self._db.execute(
+            "SELECT * FROM subscriptions WHERE id = ?", (subscription_id,)
+        ).fetchone()
+        return _to_subscription(row) if row else None
+
+    # Returns true if the subscription existed
+    def remove(self, subscription_id: int) -> bool:
+        with self._db:
+            cursor = self._db.execute(
+                "DELETE FROM subscriptions WHERE id = ?", (subscription_id,)
+            )
+        return cursor.rowcount > 0
+
+    def get_all(self) -> list[Subscription]:
+        rows = self._db.execute("SELECT * FROM subscriptions ORDER BY id").fetchall()
+        return [_to_subscription(row) for row in rows]
+
+    def get_for_channel(self, channel_id: int) -> list[Subscription]:
+        rows = self._db.execute(
+            "SELECT * FROM subscriptions WHERE channel_id = ? ORDER BY id",
+            (channel_id,),
+        ).fetchall()
+        return [_to_subscription(row) for row in rows]
+
+    def get_for_user(self, user_id: int) -> list[Subscription]:
+        rows = self._db.execute(
+            "SELECT * FROM subscriptions WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall()
+        return [_to_subscription(row) for row in rows]
+
+    def get_many(self, subscription_ids: list[int]) -> list[Subscription]:
+        subscriptions: list[Subscription] = []
+        # Query in chunks to stay below the max number of sqlite parameters
+        CHUNK_SIZE = 500
+        for i in range(0, len(subscription_ids), CHUNK_SIZE):
+            chunk = subscription_ids[i : i + CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self._db.execute(
+                f"SELECT * FROM subscriptions WHERE id IN ({placeholders})", chunk
+            ).fetchall()
+            subscriptions.extend(_to_subscription(row) for row in rows)
+        return subscriptions
+
+    def close(self):
+        self._db.close()
+
+    def _create_tables(self):
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guild_id INTEGER,
+                    channel_id INTEGER,
+                    user_id INTEGER,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    time_zone TEXT NOT NULL,
+                    notify_time TEXT NOT NULL,
+                    nowcast INTEGER NOT NULL DEFAULT 0
+                )
+                """)
+            # Added with nowcast alerts
+            columns = [
+                row["name"]
+                for row in self._db.execute("PRAGMA table_info(subscriptions)")
+            ]
+            if "nowcast" not in columns:
+                self._db.execute(
+                    "ALTER TABLE subscriptions ADD COLUMN nowcast INTEGER NOT NULL DEFAULT 0"
+                )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS ix_subscriptions_channel ON subscriptions (channel_id)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS ix_subscriptions_user ON subscriptions (user_id)"
+            )
+
+
+def _to_subscription(row: sqlite3.Row) -> Subscription:
+    return Subscription(
+        id=row["id"],
+        guild_id=row["guild_id"],
+        channel_id=row["channel_id"],
+        user_id=row["user_id"],
+        coordinates=Coordinates(row["lat"], row["lon"]),
+        time_zone=ZoneInfo(row["time_zone"]),
+        notify_time=time.fromisoformat(row["notify_time"]),
+        nowcast=bool(row["nowcast"]),
+    )
+
+
+def _format_time(t: time) -> str:
+    return t.strftime("%H:%M")
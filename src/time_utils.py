@@ -1,6 +1,5 @@
 import logging
 from datetime import date, datetime, time, timezone
-from multiprocessing import Value
 from zoneinfo import ZoneInfo
 
 logger = logging.getLogger(__name__)
@@ -1,7 +1,17 @@
 import logging
-from typing import Any
+from dataclasses import replace
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from json import loads
+from typing import TYPE_CHECKING, Any, Mapping
 
-from requests_cache import CachedSession
+import aiohttp
+
+from src import metrics, time_utils
+from src.response_cache import ResponseCache, YrResponse
+
+if TYPE_CHECKING:
+    from requests_cache import CachedSession
 
 logger = logging.getLogger(__name__)
 
@@ -15,21 +25,39 @@ class YrWeatherClient:
     BASE_URL = "https://api.met.no/weatherapi/locationforecast/2.0/"
     CACHE_PATH = "./data/http_cache.sqlite"
 
-    def __init__(self) -> None:
-        # Create a cached session
-        # Enable cache control to automatically set expiration based on "Expired" response header (usally lt 0.5 hour for YR)
-        # This caches all requests for the same weather location
-        self.session = CachedSession(
-            cache_control=True,
-            cache_name=self.CACHE_PATH,
+    def __init__(self, base_url: str = BASE_URL) -> None:
+        self._base_url = base_url
+        self._session: "CachedSession | None" = (
+            None  # Created on first request, as requests_cache is slow to import
         )
-        # Identification required by YR
-        self.session.headers = {"User-Agent": "WeatherBot/0.1"}
+
+    @property
+    def session(self) -> "CachedSession":
+        if self._session is None:
+            from requests_cache import CachedSession
+
+            # Create a cached session
+            # Enable cache control to automatically set expiration based on "Expired" response header (usally lt 0.5 hour for YR)
+            # This caches all requests for the same weather location
+            self._session = CachedSession(
+                cache_control=True,
+                cache_name=self.CACHE_PATH,
+            )
+            # Identification required by YR
+            self._session.headers = {"User-Agent": "WeatherBot/0.1"}
+        return self._session
 
     def get_complete_forecast(self, lat: float, lon: float) -> dict[str, Any]:
-        # data_endpoint = "compact"
         DATA_ENDPOINT = "complete"  # Endpoint providing most details
-        url = self.BASE_URL + DATA_ENDPOINT
+        return self._get_forecast(DATA_ENDPOINT, lat, lon)
+
+    # Same as the complete forecast, but without the uncertainty of the forecast (min, max, percentiles and probabilities). Smaller and faster to parse
+    def get_compact_forecast(self, lat: float, lon: float) -> dict[str, Any]:
+        DATA_ENDPOINT = "compact"
+        return self._get_forecast(DATA_ENDPOINT, lat, lon)
+
+    def _get_forecast(self, endpoint: str, lat: float, lon: float) -> dict[str, Any]:
+        url = self._base_url + endpoint
         location_query = {"lat": lat, "lon": lon}
 
         response = self.session.get(url, params=location_query)  # type: ignore
@@ -40,3 +68,188 @@ class YrWeatherClient:
         # Get json and convert to DTO
         json: dict[str, Any] = response.json()
         return json
+
+
+# Async version of YrWeatherClient to be used from coroutines, i.e. without blocking the discord.py event loop
+# - A single long-lived session is used, such that connections to YR are pooled and kept alive between requests
+# - Responses are cached (see ResponseCache) and reused until the "Expires" response header has passed
+# - Expired responses are revalidated with "If-Modified-Since". A 304 refreshes the cached response without downloading the body again
+class AsyncYrWeatherClient:
+    BASE_URL = "https://api.met.no/weatherapi/locationforecast/2.0/"
+    NOWCAST_BASE_URL = "https://api.met.no/weatherapi/nowcast/2.0/"
+    USER_AGENT = "WeatherBot/0.1"  # Identification required by YR
+    DEFAULT_TIMEOUT_SECONDS = 10.0
+    MAX_CONNECTIONS = 10
+
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        cache: ResponseCache | None = None,  # Default: Memory only
+        nowcast_base_url: str = NOWCAST_BASE_URL,
+    ) -> None:
+        self._base_url = base_url
+        self._nowcast_base_url = nowcast_base_url
+        self._timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        # Session must be created from within the event loop, so it is created on first request
+        self._session: aiohttp.ClientSession | None = None
+        self._cache = cache or ResponseCache(db_path=None)
+
+    async def get_complete_forecast(
+        self, lat: float, lon: float, timeout_seconds: float | None = None
+    ) -> YrResponse:
+        DATA_ENDPOINT = "complete"  # Endpoint providing most details
+        return await self._get_forecast(
+            self._base_url, DATA_ENDPOINT, lat, lon, timeout_seconds
+        )
+
+    # Same as the complete forecast, but without the uncertainty of the forecast (min, max, percentiles and probabilities). Smaller and faster to parse
+    async def get_compact_forecast(
+        self, lat: float, lon: float, timeout_seconds: float | None = None
+    ) -> YrResponse:
+        DATA_ENDPOINT = "compact"
+        return await self._get_forecast(
+            self._base_url, DATA_ENDPOINT, lat, lon, timeout_seconds
+        )
+
+    # Precipitation in 5 minute time steps for the next 2 hours, based on radar (https://api.met.no/weatherapi/nowcast/2.0/documentation).
+    # Updated every 5 minutes, and only available for the Nordic countries
+    async def get_nowcast(
+        self, lat: float, lon: float, timeout_seconds: float | None = None
+    ) -> YrResponse:
+        DATA_ENDPOINT = "complete"  # The only endpoint of the nowcast
+        return await self._get_forecast(
+            self._nowcast_base_url,
+            DATA_ENDPOINT,
+            lat,
+            lon,
+            timeout_seconds,
+            metrics_endpoint="nowcast",
+        )
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def _get_forecast(
+        self,
+        base_url: str,
+        endpoint: str,
+        lat: float,
+        lon: float,
+        timeout_seconds: float | None,
+        metrics_endpoint: str | None = None,  # Default: The endpoint
+    ) -> YrResponse:
+        url = base_url + endpoint
+        metrics_endpoint = metrics_endpoint or endpoint
+        location_query = {"lat": str(lat), "lon": str(lon)}
+        cache_key = f"{url}?lat={lat}&lon={lon}"
+
+        cached = await self._cache.get(cache_key)
+        if cached and time_utils.utc_now() < cached.expires:
+            logger.info(f"YR API response retrieved from cache: True")
+            metrics.YR_REQUESTS.inc(endpoint=metrics_endpoint, result="cache_hit")
+            return replace(cached, from_cache=True)
+
+        # Processes sharing the cache (e.g. shards) take turns, such that the response is only requested once
+        if not await self._cache.acquire_lease(cache_key):
+            logger.info(f"YR API response is being fetched by another process")
+            cached = await self._cache.wait_for_lease(cache_key)
+            if cached and time_utils.utc_now() < cached.expires:
+                metrics.YR_REQUESTS.inc(endpoint=metrics_endpoint, result="shared")
+                return replace(cached, from_cache=True)
+
+        try:
+            try:
+                with metrics.YR_FETCH_SECONDS.time(endpoint=metrics_endpoint):
+                    response_entry, body = await self._request(
+                        url, location_query, cached, timeout_seconds
+                    )
+            except Exception:
+                metrics.YR_REQUESTS.inc(endpoint=metrics_endpoint, result="error")
+                raise
+            metrics.YR_REQUESTS.inc(
+                endpoint=metrics_endpoint,
+                result="not_modified" if response_entry.from_cache else "downloaded",
+            )
+
+            if response_entry.from_cache:
+                self._cache.refresh(
+                    cache_key, response_entry.expires, response_entry.last_modified
+                )
+            else:
+                self._cache.set(cache_key, response_entry, body)
+            return response_entry
+        finally:
+            self._cache.release_lease(cache_key)
+
+    async def _request(
+        self,
+        url: str,
+        location_query: dict[str, str],
+        cached: YrResponse | None,
+        timeout_seconds: float | None,
+    ) -> tuple[YrResponse, bytes | None]:
+        headers: dict[str, str] = {}
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        session = self._get_session()
+        async with session.get(
+            url,
+            params=location_query,
+            headers=headers,
+            timeout=self._get_timeout(timeout_seconds),
+        ) as response:
+            if response.status == 304 and cached:
+                # Not modified: Reuse cached body, but with the new expiration
+                response_entry = replace(
+                    cached,
+                    expires=_parse_expires(response.headers),
+                    last_modified=response.headers.get(
+                        "Last-Modified", cached.last_modified
+                    ),
+                    from_cache=True,
+                )
+                logger.info(f"YR API response revalidated (304 Not Modified)")
+                return response_entry, None
+            else:
+                response.raise_for_status()
+                body = await response.read()
+                json: dict[str, Any] = loads(body)
+                response_entry = YrResponse(
+                    data=json,
+                    expires=_parse_expires(response.headers),
+                    last_modified=response.headers.get("Last-Modified"),
+                    from_cache=False,
+                )
+                logger.info(f"YR API response retrieved from cache: False")
+                return response_entry, body
+
+    def _get_timeout(self, timeout_seconds: float | None) -> aiohttp.ClientTimeout:
+        if timeout_seconds is None:
+            return self._timeout
+        return aiohttp.ClientTimeout(total=timeout_seconds)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.MAX_CONNECTIONS, ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self._timeout,
+                headers={"User-Agent": self.USER_AGENT},
+            )
+        return self._session
+
+
+# Returns the time the response expires. If header is missing or invalid, the response is considered expired right away
+def _parse_expires(headers: Mapping[str, str]) -> datetime:
+    expires_header = headers.get("Expires")
+    if expires_header:
+        try:
+            return time_utils.as_utc(parsedate_to_datetime(expires_header))
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid 'Expires' header in YR response: {expires_header}")
+    return time_utils.utc_now()
@@ -1,47 +1,85 @@
+import asyncio
 import logging
-from datetime import datetime
-from typing import Iterator
+import math
+from dataclasses import replace
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from zoneinfo import ZoneInfo
 
-from src.dtos.yr_complete_response import (
-    ForecastTimeStep,
-    Next1_Hours,
-    YrCompleteResponse,
-)
+import numpy as np
+
+from src import daily_forecast, metrics, time_utils
+from src.dtos.yr_compact_decoder import decode_compact_response
+from src.dtos.yr_complete_decoder import decode_complete_response, parse_timestamp
+from src.forecast_snapshot import ForecastInfo, ForecastSnapshot, ForecastSnapshotStore
+from src.forecast_table import ForecastTable
+from src.location_buckets import LocationBuckets
 from src.models import (
     Coordinates,
+    DailyForecastPeriod,
     RainyForecastHour,
     RainyForecastPeriod,
     RainyForecastPeriodQuery,
     TimePeriod,
 )
-from src.weather_client import YrWeatherClient
+from src.snapshot_files import ForecastSnapshotFiles
+from src.weather_client import AsyncYrWeatherClient, YrWeatherClient
 
 logger = logging.getLogger(__name__)
 
 
-# TODO: Implement specification pattern for filtering forecasts
-# class Specification(ABC):
-#     @abstractmethod
-#     def is_satisfied_by(self, forecast: ForecastTimeStep) -> bool:
-#         pass
-
-# class RainyForecastSpecification(Specification):
-#     @override
-#     def is_satisfied_by(self, forecast: ForecastTimeStep) -> bool:
-#         return True
+# Canonical coordinates of the location bucket (see LocationBuckets) and whether the complete forecast is fetched
+FetchKey = tuple[float, float, bool]
 
 
 class WeatherService:
-    def __init__(self, weather_client: YrWeatherClient) -> None:
+    # Time to fail without requesting YR again after a failed fetch
+    FAILURE_CACHE_DURATION = timedelta(seconds=10)
+
+    def __init__(
+        self,
+        weather_client: YrWeatherClient,
+        async_weather_client: AsyncYrWeatherClient,
+        snapshot_files: ForecastSnapshotFiles | None = None,  # None: Not persisted
+        buckets: LocationBuckets | None = None,  # Default: By the precision of YR
+    ) -> None:
         self._client = weather_client
+        self._async_client = async_weather_client
+        self._buckets = buckets or LocationBuckets()
+        self._snapshots = ForecastSnapshotStore()
+        self._snapshot_files = snapshot_files
+        self._fetches: dict[FetchKey, asyncio.Task[ForecastSnapshot]] = {}
+        self._failures: dict[FetchKey, tuple[datetime, BaseException]] = {}
+
+    # Loads the snapshots persisted by a previous run, such that the forecasts are served without requesting YR until they expire.
+    # Expired snapshots are loaded too, as they are reused if the forecast has not been updated since. Returns the number of loaded snapshots
+    def load_snapshots(self) -> int:
+        if self._snapshot_files is None:
+            return 0
+        snapshots = self._snapshot_files.load_all()
+        for snapshot in snapshots:
+            self._snapshots.set(snapshot)
+        valid_count = sum(not snapshot.is_expired() for snapshot in snapshots)
+        logger.info(
+            f"Loaded {len(snapshots)} forecast snapshots ({valid_count} not expired)"
+        )
+        return len(snapshots)
 
     # Get forecast symbol code that represents the weather for the next 12 hours from a given time.
     def get_forecast_symbol_code(self, from_time: datetime, coordinates: Coordinates):
         logger.info(f"Getting forecast symbol code for {coordinates} at {from_time}")
-        json = self._client.get_complete_forecast(coordinates.lat, coordinates.lon)
-        dto = YrCompleteResponse.from_dict(json)
-        forecast = self._get_forecast_at_time(from_time, dto.properties.timeseries)
-        return forecast.data.next_12__hours.summary.symbol_code  # type: ignore
+        bucket = self._buckets.canonical(coordinates)
+        json = self._client.get_compact_forecast(bucket.lat, bucket.lon)
+        table = ForecastTable.from_response(decode_compact_response(json))
+        return self._get_symbol_code(from_time, table)
+
+    # Async version of get_forecast_symbol_code. Does not block the event loop while waiting for YR
+    async def get_forecast_symbol_code_async(
+        self, from_time: datetime, coordinates: Coordinates
+    ):
+        logger.info(f"Getting forecast symbol code for {coordinates} at {from_time}")
+        snapshot = await self.get_snapshot(coordinates)
+        return self._get_symbol_code(from_time, snapshot.table)
 
     # Get forecast with rainy hours only
     def get_rainy_forecast(
@@ -49,26 +87,280 @@ class WeatherService:
     ) -> RainyForecastPeriod | None:
         logger.info(f"Getting rainy forecast for {query}")
 
-        json = self._client.get_complete_forecast(
-            query.coordinates.lat, query.coordinates.lon
-        )
-        dto = YrCompleteResponse.from_dict(json)
+        bucket = self._buckets.canonical(query.coordinates)
+        # Only get the complete forecast if the uncertainty is needed
+        if query.include_uncertainty:
+            dto = decode_complete_response(
+                self._client.get_complete_forecast(bucket.lat, bucket.lon)
+            )
+        else:
+            dto = decode_compact_response(
+                self._client.get_compact_forecast(bucket.lat, bucket.lon)
+            )
+        table = ForecastTable.from_response(dto)
 
         # Convert to domain
-        model = self._dto_to_model(query, dto)
+        model = self._table_to_model(query, table, dto.properties.meta.updated_at)
 
         return model if model else None
 
-    def _dto_to_model(
-        self, query: RainyForecastPeriodQuery, weather_data: YrCompleteResponse
+    # Async version of get_rainy_forecast. Does not block the event loop while waiting for YR
+    async def get_rainy_forecast_async(
+        self, query: RainyForecastPeriodQuery
     ) -> RainyForecastPeriod | None:
-        rainy_forecast_hours = self._get_rainy_forecast_hours(
-            query.time_period, weather_data
+        logger.info(f"Getting rainy forecast for {query}")
+
+        snapshot = await self.get_snapshot(
+            query.coordinates, complete=query.include_uncertainty
         )
-        if not rainy_forecast_hours:
+
+        # Convert to domain
+        model = self._table_to_model(query, snapshot.table, snapshot.updated_at)
+
+        return model if model else None
+
+    # Get rainy forecast for tomorrow in the given time zone, together with the symbol code that best describes the weather of the day.
+    # 'today' is the day the forecast is for the day after, e.g. the day an alert is due when prefetched before midnight
+    async def get_rainy_forecast_tomorrow(
+        self,
+        coordinates: Coordinates,
+        time_zone: ZoneInfo,
+        today: date | None = None,  # Default: Today in the time zone
+    ) -> tuple[RainyForecastPeriod, str] | tuple[None, None]:
+        user_current_time = (
+            datetime.combine(today, time(12), tzinfo=time_zone)
+            if today
+            else time_utils.now(time_zone)
+        )
+        snapshot = await self.get_snapshot(coordinates)
+
+        # Reuse result if already evaluated for this forecast, e.g. when prefetched.
+        # Per location, as the snapshot is shared by the locations of its bucket
+        evaluation_key = (
+            "rainy_forecast_tomorrow",
+            coordinates,
+            time_zone.key,
+            user_current_time.date(),
+        )
+        if evaluation_key in snapshot.evaluations:
+            metrics.RAIN_EVALUATIONS.inc(result="hit")
+            return snapshot.evaluations[evaluation_key]
+        metrics.RAIN_EVALUATIONS.inc(result="evaluated")
+
+        time_period = TimePeriod.from_full_days(
+            current_time=user_current_time + timedelta(days=1), num_days=1
+        )
+        time_period = time_period.as_utc()
+
+        query = RainyForecastPeriodQuery(
+            time_period=time_period,
+            coordinates=coordinates,
+        )
+        forecast = self._table_to_model(query, snapshot.table, snapshot.updated_at)
+
+        symbol_time = time_utils.as_utc(
+            time_utils.at_hour(8, user_current_time)
+        ) + timedelta(days=1)
+
+        # Get forecast symbol as of 8am tomorrow (user time) to best describe the weather of the day
+        forecast_symbol = (
+            self._get_symbol_code(symbol_time, snapshot.table) if forecast else None
+        )
+
+        result = (
+            (forecast, forecast_symbol)
+            if forecast and forecast_symbol
+            else (None, None)
+        )
+        snapshot.evaluations[evaluation_key] = result
+        return result
+
+    # Get the forecast of each day from today (in the given time zone), up to 'num_days' days as far as the forecast goes
+    async def get_daily_forecast(
+        self, coordinates: Coordinates, time_zone: ZoneInfo, num_days: int
+    ) -> DailyForecastPeriod:
+        # The complete forecast, as it has the probability of precipitation
+        snapshot = await self.get_snapshot(coordinates, complete=True)
+        today = time_utils.now(time_zone).date()
+
+        evaluation_key = ("daily_forecast", coordinates, time_zone.key, today, num_days)
+        if evaluation_key not in snapshot.evaluations:
+            snapshot.evaluations[evaluation_key] = DailyForecastPeriod(
+                snapshot.updated_at,
+                coordinates,
+                daily_forecast.aggregate_days(
+                    snapshot.table, time_zone, today, num_days
+                ),
+            )
+        return snapshot.evaluations[evaluation_key]
+
+    # Time since the forecast for the location was fetched from YR, or None if not fetched
+    def get_forecast_age(self, coordinates: Coordinates) -> timedelta | None:
+        snapshot = self._snapshots.get_latest(self._buckets.canonical(coordinates))
+        return snapshot.age() if snapshot else None
+
+    # Returns the info of the latest forecast for the location (even if expired) without fetching
+    def get_latest_forecast_info(self, coordinates: Coordinates) -> ForecastInfo | None:
+        # Fetched for the bucket, i.e. possibly by another location of the bucket
+        snapshot = self._snapshots.get_latest(self._buckets.canonical(coordinates))
+        return replace(snapshot.info(), coordinates=coordinates) if snapshot else None
+
+    # Returns the info of the current forecast for the location, fetching the forecast if expired
+    async def get_forecast_info(self, coordinates: Coordinates) -> ForecastInfo:
+        return (await self.get_snapshot(coordinates)).info()
+
+    # Get the parsed forecast for a location.
+    # YR is only requested when the current snapshot has expired, and the response is only parsed if the forecast has been updated since.
+    # The compact forecast is requested, unless the complete forecast (with the uncertainty of the forecast) is needed. A complete snapshot is used for both.
+    # The forecast is fetched for the bucket of the location (see LocationBuckets), i.e. locations of the same bucket share the snapshot.
+    # Concurrent calls for the same bucket share a single fetch (and its failure, which is also returned to calls shortly after)
+    async def get_snapshot(
+        self, coordinates: Coordinates, complete: bool = False
+    ) -> ForecastSnapshot:
+        resolution = self._buckets.resolution
+        snapshot = self._get_valid_snapshot(coordinates, complete)
+        if snapshot:
+            metrics.FORECAST_SNAPSHOTS.inc(result="hit")
+            metrics.FORECAST_BUCKET_LOOKUPS.inc(resolution=resolution, result="hit")
+            return snapshot
+
+        bucket = self._buckets.canonical(coordinates)
+        shared_snapshot = self._get_valid_snapshot(bucket, complete)
+        if shared_snapshot:
+            # Fetched for another location of the bucket
+            metrics.FORECAST_SNAPSHOTS.inc(result="hit")
+            metrics.FORECAST_BUCKET_LOOKUPS.inc(resolution=resolution, result="shared")
+            snapshot = replace(shared_snapshot, coordinates=coordinates)
+            self._snapshots.set(snapshot)
+            return snapshot
+        metrics.FORECAST_BUCKET_LOOKUPS.inc(resolution=resolution, result="miss")
+
+        key = (bucket.lat, bucket.lon, complete)
+        failure = self._failures.get(key)
+        if failure is not None:
+            failed_until, error = failure
+            if time_utils.utc_now() < failed_until:
+                metrics.FORECAST_FETCHES.inc(result="failure_cached")
+                raise Exception(
+                    f"Getting forecast for {coordinates} recently failed: {error}"
+                ) from error
+            del self._failures[key]
+
+        # A complete fetch can be used for the compact forecast too
+        fetch = self._fetches.get(key) or (
+            None if complete else self._fetches.get((bucket.lat, bucket.lon, True))
+        )
+        if fetch is None:
+            metrics.FORECAST_FETCHES.inc(result="fetched")
+            fetch = asyncio.create_task(self._fetch_snapshot(bucket, complete))
+            self._fetches[key] = fetch
+            fetch.add_done_callback(partial(self._on_fetch_done, key))
+        else:
+            metrics.FORECAST_FETCHES.inc(result="coalesced")
+
+        # Shielded, such that a cancelled caller does not cancel the fetch of the other callers
+        snapshot = await asyncio.shield(fetch)
+        if snapshot.coordinates != coordinates:
+            # Fetched for the canonical coordinates of the bucket
+            snapshot = replace(snapshot, coordinates=coordinates)
+            self._snapshots.set(snapshot)
+        return snapshot
+
+    async def _fetch_snapshot(
+        self, coordinates: Coordinates, complete: bool
+    ) -> ForecastSnapshot:
+        if complete:
+            response = await self._async_client.get_complete_forecast(
+                coordinates.lat, coordinates.lon
+            )
+        else:
+            response = await self._async_client.get_compact_forecast(
+                coordinates.lat, coordinates.lon
+            )
+        updated_at = parse_timestamp(response.data["properties"]["meta"]["updated_at"])
+
+        fetched_at = time_utils.utc_now()
+        latest_snapshot = self._snapshots.get_latest(coordinates)
+        if (
+            latest_snapshot
+            and latest_snapshot.updated_at == updated_at
+            and (latest_snapshot.is_complete or not complete)
+        ):
+            # Forecast not updated, reuse the parsed forecast (and evaluations)
+            metrics.FORECAST_SNAPSHOTS.inc(result="revalidated")
+            snapshot = replace(
+                latest_snapshot, expires=response.expires, fetched_at=fetched_at
+            )
+        else:
+            logger.info(f"Parsing forecast for {coordinates} updated at {updated_at}")
+            metrics.FORECAST_SNAPSHOTS.inc(result="parsed")
+            with metrics.FORECAST_PARSE_SECONDS.time():
+                table = ForecastTable.from_response(
+                    decode_complete_response(response.data)
+                    if complete
+                    else decode_compact_response(response.data)
+                )
+            snapshot = ForecastSnapshot(
+                coordinates=coordinates,
+                updated_at=updated_at,
+                expires=response.expires,
+                fetched_at=fetched_at,
+                is_complete=complete,
+                table=table,
+            )
+
+        self._snapshots.set(snapshot)
+        if self._snapshot_files is not None:
+            await self._save_snapshot(snapshot)
+        return snapshot
+
+    async def _save_snapshot(self, snapshot: ForecastSnapshot):
+        assert self._snapshot_files is not None
+        try:
+            await asyncio.to_thread(self._snapshot_files.save, snapshot)
+        except Exception:
+            # Not critical, the forecast is fetched again after a restart
+            metrics.ERRORS.inc(stage="snapshot_files")
+            logger.exception(
+                f"Failed to save forecast snapshot for {snapshot.coordinates}"
+            )
+
+    def _on_fetch_done(self, key: FetchKey, fetch: "asyncio.Task[ForecastSnapshot]"):
+        del self._fetches[key]
+        if fetch.cancelled():
+            return
+        error = fetch.exception()
+        if error is not None:
+            metrics.ERRORS.inc(stage="fetch")
+            self._failures[key] = (
+                time_utils.utc_now() + self.FAILURE_CACHE_DURATION,
+                error,
+            )
+
+    # Returns the current snapshot if not expired and detailed enough for the query
+    def _get_valid_snapshot(
+        self, coordinates: Coordinates, complete: bool
+    ) -> ForecastSnapshot | None:
+        snapshot = self._snapshots.get(coordinates)
+        if snapshot is None or (complete and not snapshot.is_complete):
             return None
+        return snapshot
 
-        forecast_updated_at_utc = weather_data.properties.meta.updated_at
+    def _get_symbol_code(self, from_time: datetime, table: ForecastTable):
+        return table.symbol_code_12h(table.index_at(from_time))
+
+    def _table_to_model(
+        self,
+        query: RainyForecastPeriodQuery,
+        table: ForecastTable,
+        forecast_updated_at_utc: datetime,
+    ) -> RainyForecastPeriod | None:
+        with metrics.RAIN_EVALUATION_SECONDS.time():
+            rainy_forecast_hours = self._get_rainy_forecast_hours(
+                query.time_period, table
+            )
+        if not rainy_forecast_hours:
+            return None
 
         return RainyForecastPeriod(
             forecast_updated_at_utc,
@@ -78,32 +370,26 @@ class WeatherService:
 
     # Get rainy hours for a given time period
     def _get_rainy_forecast_hours(
-        self, time_period: TimePeriod, weather_data: YrCompleteResponse
+        self, time_period: TimePeriod, table: ForecastTable
     ) -> list[RainyForecastHour] | None:
-        rainy_forecasts: list[RainyForecastHour] = []
-        for forecast_hour_dto in self._forecasts_within_period(
-            weather_data,
-            time_period,
-        ):
-            next_hour_forecast = forecast_hour_dto.data.next_1__hours
-            if not (
-                next_hour_forecast
-                and self._is_rainy_forecast_estimated(next_hour_forecast)
-            ):
-                # Not a valid forecast, skip
-                continue
-
-            forecast_hour_model = RainyForecastHour(
-                forecast_hour_dto.time,
-                next_hour_forecast.summary.symbol_code,
-                next_hour_forecast.details.precipitation_amount,  # type: ignore
-                next_hour_forecast.details.precipitation_amount_min,
-                next_hour_forecast.details.precipitation_amount_max,
-                next_hour_forecast.details.probability_of_precipitation,
-            )
+        logger.info(
+            f"Returning forecasts between period_start: {time_period.start}, and period_end: {time_period.end}"
+        )
+        rows = table.window(time_period)
+        # Rainy if there is a probability of rain in the best estimate
+        rainy_indices = np.flatnonzero(table.estimated_mask(rows)) + rows.start
 
-            # Forecast is rainy, add to list
-            rainy_forecasts.append(forecast_hour_model)
+        rainy_forecasts = [
+            RainyForecastHour(
+                table.time_at(index),
+                table.symbol_code_1h(index),  # type: ignore # Always set when there is a next hour forecast
+                float(table.precipitation_amount[index]),
+                _none_if_nan(float(table.precipitation_amount_min[index])),
+                _none_if_nan(float(table.precipitation_amount_max[index])),
+                _none_if_nan(float(table.probability_of_precipitation[index])),
+            )
+            for index in rainy_indices.tolist()
+        ]
 
         if not rainy_forecasts:
             logger.info("No rainy forecast found")
@@ -111,61 +397,6 @@ class WeatherService:
         logger.info(f"Found {len(rainy_forecasts)} rainy forecast hours")
         return rainy_forecasts
 
-    def _get_forecast_at_time(
-        self,
-        time: datetime,
-        forecasts: list[ForecastTimeStep],
-    ):
-        symbol_forecast = next(
-            (forecast for forecast in forecasts if forecast.time >= time)
-        )
-        return symbol_forecast
-
-    def _forecasts_within_period(
-        self,
-        weather_data: YrCompleteResponse,
-        time_period: TimePeriod,
-    ) -> Iterator[ForecastTimeStep]:
-        logger.info(
-            f"Returning forecasts between period_start: {time_period.start}, and period_end: {time_period.end}"
-        )
-        for forecast_hour_entry in weather_data.properties.timeseries:
-            if self._is_within_period(forecast_hour_entry, time_period):
-                yield forecast_hour_entry
-
-    def _is_within_period(
-        self,
-        forecast: ForecastTimeStep,
-        time_period: TimePeriod,
-    ) -> bool:
-        return time_period.start <= forecast.time <= time_period.end
-
-    # Returns too if there is a high probability of rain.
-    def _is_rainy_forecast_high_prob(self, next_hour_forecast: Next1_Hours) -> bool:
-        # XXX: Requires some testing.
-        # XXX: Other possible values are "light_rain" and "heavy_rain" etc. Or set threshold for precipitation_amount?
-        return "rain" in next_hour_forecast.summary.symbol_code
-
-    # Returns true if there is a probability of rain in the best estimate
-    def _is_rainy_forecast_estimated(self, next_hour_forecast: Next1_Hours) -> bool:
-        # precipitation_amount represents the best estimate of the precipitation amount
-        if (
-            next_hour_forecast.details.precipitation_amount
-        ):  # Can be None if not available
-            return next_hour_forecast.details.precipitation_amount > 0
-        return False
-
-    # Returns true for any amount of rain, even if low probability
-    def _is_rainy_forecast_any_amount(self, next_hour_forecast: Next1_Hours) -> bool:
-        # precipitation_amount_max is not always available in the forecast, then use precipitation_amount instead
-        # else we assume that the forecast is not rainy
-        if (
-            next_hour_forecast.details.precipitation_amount_max
-        ):  # Can be None if not available
-            return next_hour_forecast.details.precipitation_amount_max > 0
-        if (
-            next_hour_forecast.details.precipitation_amount
-        ):  # Can be None if not available
-            return next_hour_forecast.details.precipitation_amount > 0
 
-        return False
+def _none_if_nan(value: float) -> float | None:
+    return None if math.isnan(value) else value